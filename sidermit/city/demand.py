@@ -30,6 +30,28 @@ class Demand:
         # initialization of matriz with zero trips in all OD pairs
         self.__build_default_matrix()
 
+    def __getstate__(self):
+        """
+        to pickle demand, dictionaries built with lambda functions can not be pickled. OD matrix is saved as plain
+        dictionaries
+        :return: dictionary with attributes of demand
+        """
+        state = self.__dict__.copy()
+        state["_Demand__matrix"] = {origin: dict(self.__matrix[origin]) for origin in self.__matrix}
+        return state
+
+    def __setstate__(self, state):
+        """
+        to unpickle demand
+        :param state: dictionary with attributes of demand, see __getstate__
+        :return:
+        """
+        matrix = defaultdict(lambda: defaultdict(float))
+        for origin in state["_Demand__matrix"]:
+            matrix[origin].update(state["_Demand__matrix"][origin])
+        state["_Demand__matrix"] = matrix
+        self.__dict__.update(state)
+
     def get_total_trips(self) -> float:
         """
         to get total trips in all OD pair
@@ -97,6 +119,26 @@ class Demand:
         """
         return self.__matrix
 
+    def get_transposed_matrix(self) -> defaultdict2_float:
+        """
+        Get last OD matrix saved grouped by destination
+        :return: dic[destination_id][origin_id] = vij
+        """
+        return self.transpose_matrix(self.__matrix)
+
+    @staticmethod
+    def transpose_matrix(matrix: defaultdict2_float) -> defaultdict2_float:
+        """
+        to transpose a OD matrix, it is useful to process all origins of a destination together
+        :param matrix: dic[origin_id][destination_id] = vij
+        :return: dic[destination_id][origin_id] = vij
+        """
+        transposed_matrix = defaultdict(lambda: defaultdict(float))
+        for origin_id in matrix:
+            for destination_id in matrix[origin_id]:
+                transposed_matrix[destination_id][origin_id] = matrix[origin_id][destination_id]
+        return transposed_matrix
+
     @staticmethod
     def parameters_validator(y: float, a: float, alpha: float, beta: float) -> bool:
         """
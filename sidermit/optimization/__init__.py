@@ -1,7 +1,11 @@
 from .operators_cost import OperatorsCost
+from .network_precomputation import NetworkPrecomputation
 from .infrastructure_cost import InfrastructureCost
 from .constrains import Constrains
 from .users_cost import UsersCost
+from .evaluator import Evaluator, Evaluation
 from .optimizer import Optimizer
+from .multi_start import MultiStartOptimizer
 
-__all__ = ['OperatorsCost', 'Constrains', 'InfrastructureCost', 'UsersCost', 'Optimizer']
\ No newline at end of file
+__all__ = ['OperatorsCost', 'NetworkPrecomputation', 'Constrains', 'InfrastructureCost', 'UsersCost', 'Evaluator',
+           'Evaluation', 'Optimizer', 'MultiStartOptimizer']
\ No newline at end of file
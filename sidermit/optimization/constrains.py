@@ -1,6 +1,9 @@
 from collections import defaultdict
 from typing import List
 
+import numpy as np
+from scipy.sparse import csr_matrix
+
 from sidermit.city import Graph
 from sidermit.publictransportsystem import Route, TransportMode
 
@@ -29,42 +32,57 @@ class Constrains:
         return ineq_constrains
 
     @staticmethod
-    def fmax_constrains(graph_obj: Graph, routes: List[Route], list_mode: List[TransportMode], f: defaultdict_float) -> \
-            List[float]:
+    def fmax_constrains(graph_obj: Graph, routes: List[Route], list_mode: List[TransportMode], f: defaultdict_float,
+                        matrix_fmax: (csr_matrix, np.ndarray) = None) -> np.ndarray:
         """
         to get constrains about fmax in each edge in the network with respect to capacity in stop of the each mode
         :param graph_obj: Graph object
         :param routes: list of Route object
         :param list_mode: list TransportMode object
         :param f: dict with frequency for each route_id
-        :return: list with constrains
+        :param matrix_fmax: (matrix, fmax) given by fmax_constrains_matrix with the same graph_obj, routes and
+        list_mode, to evaluate several frequencies without building it again. Default value is None to build it
+        :return: np.ndarray with constrains, for each edge in graph_obj.get_edges() a constrain for each mode
         """
+        if matrix_fmax is None:
+            matrix_fmax = Constrains.fmax_constrains_matrix(graph_obj, routes, list_mode)
+        matrix, fmax = matrix_fmax
+        f_routes = np.array([f[route.id] for route in routes], dtype=float)
 
-        ineq_constrain = []
-
-        edges = graph_obj.get_edges()
+        return matrix @ f_routes - fmax
 
-        for edge in edges:
-            nodei = edge.node1.id
-            nodej = edge.node2.id
+    @staticmethod
+    def fmax_constrains_matrix(graph_obj: Graph, routes: List[Route], list_mode: List[TransportMode]) -> \
+            (csr_matrix, np.ndarray):
+        """
+        to get fmax constrains as a linear function of frequencies, fmax_constrains = matrix @ f - fmax with f in the
+        order of routes and constrains in the order of fmax_constrains
+        :param graph_obj: Graph object
+        :param routes: list of Route object
+        :param list_mode: list TransportMode object
+        :return: (sparse matrix with the times that each route uses each edge divided by d of its mode, np.ndarray with
+        fmax/d of the mode of each constrain)
+        """
+        # number of times that each route goes through each edge
+        edge_routes = defaultdict(lambda: defaultdict(int))
+        for n, route in enumerate(routes):
+            for node_sequence in (route.nodes_sequence_i, route.nodes_sequence_r):
+                for i in range(len(node_sequence) - 1):
+                    edge_routes[(str(node_sequence[i]), str(node_sequence[i + 1]))][n] += 1
+
+        rows = []
+        columns = []
+        values = []
+        fmax = []
+        for edge in graph_obj.get_edges():
+            routes_edge = edge_routes.get((str(edge.node1.id), str(edge.node2.id)), {})
             for mode in list_mode:
-                fmax = mode.fmax / mode.d
-                sum_f = 0
-                for route in routes:
-                    if route.mode == mode:
-                        if f[route.id] != 0:
-                            node_sequence_i = route.nodes_sequence_i
-                            node_sequence_r = route.nodes_sequence_r
-
-                            for i in range(len(node_sequence_i) - 1):
-                                j = i + 1
-                                if str(nodei) == str(node_sequence_i[i]) and str(nodej) == str(node_sequence_i[j]):
-                                    sum_f += f[route.id] / mode.d
-
-                            for i in range(len(node_sequence_r) - 1):
-                                j = i + 1
-                                if str(nodei) == str(node_sequence_r[i]) and str(nodej) == str(node_sequence_r[j]):
-                                    sum_f += f[route.id] / mode.d
-                ineq_constrain.append(sum_f - fmax)
-
-        return ineq_constrain
+                for n, times in routes_edge.items():
+                    if routes[n].mode == mode:
+                        rows.append(len(fmax))
+                        columns.append(n)
+                        values.append(times / mode.d)
+                fmax.append(mode.fmax / mode.d)
+
+        matrix = csr_matrix((values, (rows, columns)), shape=(len(fmax), len(routes)))
+        return matrix, np.array(fmax)
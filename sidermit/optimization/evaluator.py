@@ -0,0 +1,478 @@
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from sidermit.city import Graph
+from sidermit.optimization.network_precomputation import NetworkPrecomputation
+from sidermit.optimization.preoptimization import AssignmentOperator, ExtendedGraph, CityNode, \
+    StopNode, RouteNode, ExtendedNode, ExtendedEdge
+from sidermit.publictransportsystem import Passenger, TransportNetwork
+
+defaultdict_float = defaultdict(float)
+list_elemental_path = List[ExtendedNode]
+
+dic_hyperpaths = defaultdict(lambda: defaultdict(lambda: defaultdict(List[list_elemental_path])))
+dic_successors = defaultdict(lambda: defaultdict(lambda: defaultdict(List[ExtendedEdge])))
+dic_Vij = defaultdict(lambda: defaultdict(float))
+dic_assigment = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+
+
+class Evaluation:
+
+    def __init__(self, f: defaultdict_float, z: np.ndarray, v: np.ndarray, loaded_section: np.ndarray,
+                 k: defaultdict_float, ta: float, te: float, tv: float, t: float, CO: float, CI: float, CU: float,
+                 ineq_k: List[float], ineq_f: List[float], gradient: np.ndarray = None,
+                 ineq_k_jacobian: csr_matrix = None):
+        """
+        breakdown of VRC and constrains for a frequency of routes
+        :param f: dic[route_id] = frequency [veh/hr]
+        :param z: boarding of each slot of the AssignmentOperator [pax/veh]
+        :param v: alighting of each slot of the AssignmentOperator [pax/veh]
+        :param loaded_section: load of each slot of the AssignmentOperator [pax/veh]
+        :param k: dic[route_id] = most loaded section [pax/veh]
+        :param ta: access time of users
+        :param te: waiting time of users
+        :param tv: time on board of users
+        :param t: numbers of transfers of users
+        :param CO: operators cost
+        :param CI: infrastructure cost
+        :param CU: users cost
+        :param ineq_k: constrains of most loaded section for each route
+        :param ineq_f: constrains of fmax for each edge and mode
+        :param gradient: derivative of VRC with respect to frequency of each route in the order of
+        TransportNetwork.get_routes(). Default value is None if it was not requested
+        :param ineq_k_jacobian: sparse matrix with derivative of each constrain of most loaded section with respect to
+        frequency of each route. Default value is None if it was not requested
+        """
+        self.f = f
+        self.z = z
+        self.v = v
+        self.loaded_section = loaded_section
+        self.k = k
+        self.ta = ta
+        self.te = te
+        self.tv = tv
+        self.t = t
+        self.CO = CO
+        self.CI = CI
+        self.CU = CU
+        self.VRC = CO + CI + CU
+        self.ineq_k = ineq_k
+        self.ineq_f = ineq_f
+        self.constrains = ineq_k + ineq_f
+        self.gradient = gradient
+        self.ineq_k_jacobian = ineq_k_jacobian
+
+
+class Evaluator:
+
+    def __init__(self, graph_obj: Graph, network_obj: TransportNetwork, passenger_obj: Passenger,
+                 extended_graph_obj: ExtendedGraph, hyperpaths: dic_hyperpaths, Vij: dic_Vij,
+                 assignment: dic_assigment, successors: dic_successors, assignment_operator: AssignmentOperator,
+                 network_precomputation: NetworkPrecomputation = None):
+        """
+        to get operators cost, infrastructure cost, users cost and constrains of a frequency of routes with a single
+        propagation of passengers in hyperpaths. Terms of UsersCost.resources_consumer are saved for each edge of the
+        AssignmentOperator, so users cost only needs passengers of edges and boarding and alighting of slots
+        :param graph_obj: Graph object
+        :param network_obj: TransportNetwork object
+        :param passenger_obj: Passenger object
+        :param extended_graph_obj: ExtendedGraph object
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
+        :param Vij: dic[origin: CityNode][destination: CityNode] = vij [pax/hr]
+        :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
+        :param successors: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge]
+        :param assignment_operator: AssignmentOperator object of hyperpaths and assignment
+        :param network_precomputation: NetworkPrecomputation object of graph_obj and network_obj. Default value is None
+        to build it
+        """
+        self.graph_obj = graph_obj
+        self.network_obj = network_obj
+        self.passenger_obj = passenger_obj
+        self.assignment_operator = assignment_operator
+        if network_precomputation is None:
+            network_precomputation = NetworkPrecomputation(graph_obj, network_obj)
+        self.network_precomputation = network_precomputation
+
+        operator = assignment_operator
+        self.routes = network_precomputation.routes
+        route_position = network_precomputation.route_position
+
+        # position in routes of each route of the operator and of the route of each slot
+        self.__operator_route = np.array([route_position[route_id] for route_id in operator.route_ids],
+                                         dtype=np.int64)
+        self.__slot_route = self.__operator_route[operator.slot_route]
+
+        # operators cost
+        self.__line_travel_time = network_precomputation.travel_time
+        self.__t = network_precomputation.t
+        self.__c0 = network_precomputation.co
+        self.__c1 = network_precomputation.c1
+        self.__kmax = network_precomputation.kmax
+        bya = network_precomputation.bya
+        # boarding and alighting are sequential or simultaneous in each slot
+        self.__slot_sequential = bya[self.__slot_route] == 0
+        self.__slot_simultaneous = bya[self.__slot_route] == 1
+
+        # users cost, access time does not depend on frequencies
+        vp = passenger_obj.va
+        ta = 0
+        for origin in hyperpaths:
+            for destination in hyperpaths[origin]:
+                vod = Vij[origin][destination]
+                for stop in hyperpaths[origin][destination]:
+                    vod_s = vod * assignment[origin][destination][stop] / 100
+                    if vod_s == 0:
+                        continue
+                    # ta inicial (lateral y tecnologico)
+                    ta += vod_s * (stop.mode.tat / 60 + assignment[origin][destination][
+                        stop] / 100 * origin.graph_node.width / (4 * vp * stop.mode.d))
+
+        edges_paths = operator.get_edges_paths()
+
+        # waiting time of boarding edges in the order of boarding_edges
+        self.__theta = np.zeros(len(operator.boarding_edges))
+        self.__d = np.ones(len(operator.boarding_edges))
+        boarding_position = {edge: n for n, edge in enumerate(operator.boarding_edges.tolist())}
+
+        # time on board of route edges
+        tv_edges = np.zeros(len(operator.edges))
+        # alighting edges, passengers that wait alighting of other passengers
+        alighting_edges = []
+        alighting_slot = []
+        alighting_tb = []
+        transfer_edges = []
+        # route edges followed by route edges, passengers that wait boarding and alighting in the next stop
+        route_edges = []
+        route_slot = []
+        route_tb = []
+        route_bya = []
+
+        for n, (origin, destination, edge) in enumerate(operator.edges):
+            nodei = edge.nodei
+            nodej = edge.nodej
+
+            # te
+            if isinstance(nodei, StopNode) and isinstance(nodej, RouteNode):
+                self.__theta[boarding_position[n]] = nodei.mode.theta
+                self.__d[boarding_position[n]] = nodej.route.mode.d
+
+            # tv, edges of successors are route edges of the extended graph
+            if isinstance(nodei, RouteNode) and isinstance(nodej, RouteNode):
+                tv_edges[n] = edge.t
+
+            # transbordos y tv de bajada
+            if isinstance(nodei, RouteNode) and isinstance(nodej, StopNode):
+                if nodej.city_node != destination:
+                    transfer_edges.append(n)
+
+                direction = nodei.prev_route_node.get_direction(nodei)
+                alighting_edges.append(n)
+                alighting_slot.append(operator.get_slot_position(nodei.route.id, direction, nodej))
+                alighting_tb.append(0.5 * nodei.route.mode.t / 3600)
+
+            # ta
+            if isinstance(nodei, StopNode) and isinstance(nodej, CityNode):
+                ta += edges_paths[n] * nodei.mode.tat / 60
+            if isinstance(nodei, CityNode) and isinstance(nodej, StopNode):
+                ta += edges_paths[n] * nodej.mode.tat / 60
+
+            # tv por la espera de los que suben y bajan en paraderos cuando el pasajero sigue en ruta
+            if isinstance(nodei, RouteNode) and isinstance(nodej, RouteNode):
+                for suc in successors[origin][destination][nodej]:
+                    if not isinstance(suc.nodej, RouteNode):
+                        continue
+                    direction = nodei.get_direction(nodej)
+                    route_edges.append(n)
+                    route_slot.append(operator.get_slot_position(nodei.route.id, direction, nodej.stop_node))
+                    route_tb.append(nodei.route.mode.t / 3600)
+                    route_bya.append(nodei.route.mode.bya)
+
+        self.__ta = ta
+        self.__tv_edges = tv_edges
+        self.__transfer_edges = np.array(transfer_edges, dtype=np.int64)
+        self.__alighting_edges = np.array(alighting_edges, dtype=np.int64)
+        self.__alighting_slot = np.array(alighting_slot, dtype=np.int64)
+        self.__alighting_tb = np.array(alighting_tb)
+        self.__route_edges = np.array(route_edges, dtype=np.int64)
+        self.__route_slot = np.array(route_slot, dtype=np.int64)
+        self.__route_tb = np.array(route_tb)
+        self.__route_sequential = np.array(route_bya) == 0
+        self.__route_simultaneous = np.array(route_bya) == 1
+
+    def evaluate(self, f: defaultdict_float, gradient: bool = False) -> Evaluation:
+        """
+        to get VRC and constrains with a frequency of routes
+        :param f: dic[route_id] = frequency [veh/hr]
+        :param gradient: True to get derivative of VRC and jacobian of most loaded section constrains with respect to
+        frequency of each route. Default value is False
+        :return: Evaluation object
+        """
+        operator = self.assignment_operator
+        passenger_obj = self.passenger_obj
+
+        f_operator = operator.get_frequencies(f)
+        factor, f_acum = operator.get_edges_factor(f_operator)
+        nodes_pax = operator.get_nodes_pax(factor)
+        edges_pax = operator.get_edges_pax(factor, nodes_pax=nodes_pax)
+        z, v, loaded_section = operator.get_slots_values(edges_pax, f_operator)
+
+        # slots without boarding or alighting have position -1, they take the last value of arrays
+        z_ext = np.append(z, 0)
+        v_ext = np.append(v, 0)
+
+        # costo de operadores
+        f_routes = np.array([f[route.id] for route in self.routes], dtype=float)
+        n_routes = len(self.routes)
+
+        k_routes = np.zeros(n_routes)
+        np.maximum.at(k_routes, self.__slot_route, loaded_section)
+
+        pax_stop = np.where(self.__slot_sequential, z + v, 0) + np.where(self.__slot_simultaneous,
+                                                                        np.maximum(z, v), 0)
+        cycle_time = self.__line_travel_time + self.__t * np.bincount(self.__slot_route, weights=pax_stop,
+                                                                      minlength=n_routes)
+        operating = f_routes != 0
+        CO = float(np.sum(((self.__c0 + self.__c1 * k_routes) * f_routes * cycle_time)[operating]))
+
+        # costo de infraestructura
+        CI = self.network_precomputation.get_infrastructure_cost(f_routes)
+
+        # costo de usuarios
+        boarding_pax = edges_pax[operator.boarding_edges]
+        te = float(np.sum(boarding_pax * self.__theta / (f_acum / self.__d)))
+
+        route_pax = edges_pax[self.__route_edges]
+        z_route = z_ext[self.__route_slot]
+        v_route = v_ext[self.__route_slot]
+        pax_stop_route = np.where(self.__route_sequential, z_route + v_route, 0) + np.where(
+            self.__route_simultaneous, np.maximum(z_route, v_route), 0)
+
+        tv = float(np.dot(edges_pax, self.__tv_edges))
+        tv += float(np.sum(v_ext[self.__alighting_slot] * self.__alighting_tb * edges_pax[self.__alighting_edges]))
+        tv += float(np.sum(pax_stop_route * self.__route_tb * route_pax))
+        t = float(np.sum(edges_pax[self.__transfer_edges]))
+        ta = self.__ta
+
+        CU = ta * passenger_obj.spa + te * passenger_obj.spw + tv * passenger_obj.spv + \
+            t * passenger_obj.spt / 60 * passenger_obj.spv
+
+        # restricciones
+        k = defaultdict(float)
+        for route, k_route in zip(self.routes, k_routes.tolist()):
+            k[route.id] = k_route
+        ineq_k = (k_routes - self.__kmax).tolist()
+        ineq_f = (self.network_precomputation.fmax_matrix @ f_routes - self.network_precomputation.fmax).tolist()
+
+        vrc_gradient = None
+        ineq_k_jacobian = None
+        if gradient:
+            vrc_gradient = self.get_gradient(f_operator, factor, f_acum, nodes_pax, edges_pax, z, v, loaded_section,
+                                             f_routes, k_routes, cycle_time)
+            ineq_k_jacobian = self.get_most_loaded_section_jacobian(f_operator, factor, f_acum, nodes_pax, z, v,
+                                                                    loaded_section, k_routes)
+
+        return Evaluation(f, z, v, loaded_section, k, ta, te, tv, t, CO, CI, CU, ineq_k, ineq_f, vrc_gradient,
+                          ineq_k_jacobian)
+
+    def evaluate_batch(self, f_batch: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        to get VRC of several frequencies of routes at once, each row is a set of frequencies and all of them are
+        propagated together in hyperpaths
+        :param f_batch: np.ndarray (batch x routes) with frequency [veh/hr] of each route in the order of
+        TransportNetwork.get_routes()
+        :return: (VRC, CO, CI, CU), np.ndarray with a value for each row of f_batch
+        """
+        operator = self.assignment_operator
+        passenger_obj = self.passenger_obj
+
+        f_routes = np.asarray(f_batch, dtype=float).reshape(-1, len(self.routes)).T
+        n_batch = f_routes.shape[1]
+        f_operator = f_routes[self.__operator_route]
+        factor, f_acum = operator.get_edges_factor(f_operator)
+        edges_pax = operator.get_edges_pax(factor)
+        z, v, loaded_section = operator.get_slots_values(edges_pax, f_operator)
+
+        z_ext = np.vstack((z, np.zeros((1, n_batch))))
+        v_ext = np.vstack((v, np.zeros((1, n_batch))))
+
+        # costo de operadores
+        n_routes = len(self.routes)
+        k_routes = np.zeros((n_routes, n_batch))
+        np.maximum.at(k_routes, self.__slot_route, loaded_section)
+
+        pax_stop = np.where(self.__slot_sequential[:, np.newaxis], z + v, 0) + np.where(
+            self.__slot_simultaneous[:, np.newaxis], np.maximum(z, v), 0)
+        pax_stop_routes = np.zeros((n_routes, n_batch))
+        np.add.at(pax_stop_routes, self.__slot_route, pax_stop)
+        cycle_time = self.__line_travel_time[:, np.newaxis] + self.__t[:, np.newaxis] * pax_stop_routes
+        operating = f_routes != 0
+        CO = np.sum(np.where(operating, (self.__c0[:, np.newaxis] + self.__c1[:, np.newaxis] * k_routes) *
+                             f_routes * cycle_time, 0), axis=0)
+
+        # costo de infraestructura, solo depende de las rutas que operan
+        CI = np.array([self.network_precomputation.get_infrastructure_cost(f_routes[:, n]) for n in range(n_batch)])
+
+        # costo de usuarios
+        boarding_pax = edges_pax[operator.boarding_edges]
+        te = np.sum(boarding_pax * self.__theta[:, np.newaxis] / (f_acum / self.__d[:, np.newaxis]), axis=0)
+
+        route_pax = edges_pax[self.__route_edges]
+        z_route = z_ext[self.__route_slot]
+        v_route = v_ext[self.__route_slot]
+        pax_stop_route = np.where(self.__route_sequential[:, np.newaxis], z_route + v_route, 0) + np.where(
+            self.__route_simultaneous[:, np.newaxis], np.maximum(z_route, v_route), 0)
+
+        tv = self.__tv_edges @ edges_pax
+        tv += np.sum(v_ext[self.__alighting_slot] * self.__alighting_tb[:, np.newaxis] *
+                     edges_pax[self.__alighting_edges], axis=0)
+        tv += np.sum(pax_stop_route * self.__route_tb[:, np.newaxis] * route_pax, axis=0)
+        t = np.sum(edges_pax[self.__transfer_edges], axis=0)
+
+        CU = self.__ta * passenger_obj.spa + te * passenger_obj.spw + tv * passenger_obj.spv + \
+            t * passenger_obj.spt / 60 * passenger_obj.spv
+
+        return CO + CI + CU, CO, CI, CU
+
+    def get_most_loaded_slots(self, loaded_section: np.ndarray, k_routes: np.ndarray) -> np.ndarray:
+        """
+        to get the first slot with the most loaded section of each route with passengers
+        :param loaded_section: load of each slot [pax/veh]
+        :param k_routes: most loaded section of routes in the order of TransportNetwork.get_routes()
+        :return: np.ndarray with position of slots
+        """
+        k_slots = k_routes[self.__slot_route]
+        most_loaded = np.flatnonzero((loaded_section == k_slots) & (k_slots > 0))
+        _, first = np.unique(self.__slot_route[most_loaded], return_index=True)
+        return most_loaded[first]
+
+    def get_most_loaded_section_jacobian(self, f_operator: np.ndarray, factor: np.ndarray, f_acum: np.ndarray,
+                                         nodes_pax: np.ndarray, z: np.ndarray, v: np.ndarray,
+                                         loaded_section: np.ndarray, k_routes: np.ndarray) -> csr_matrix:
+        """
+        to get derivative of most loaded section constrains with respect to frequency of each route. Derivatives of
+        all routes are carried to frequencies together by the AssignmentOperator, one column for each route with
+        passengers
+        :param f_operator: frequency of routes in the order of the AssignmentOperator
+        :param factor: proportion of passengers of each edge
+        :param f_acum: sum of frequencies of each boarding edge
+        :param nodes_pax: pax [pax/hr] of each node of the AssignmentOperator
+        :param z: boarding of each slot [pax/veh]
+        :param v: alighting of each slot [pax/veh]
+        :param loaded_section: load of each slot [pax/veh]
+        :param k_routes: most loaded section of routes in the order of TransportNetwork.get_routes()
+        :return: sparse matrix with a row for each constrain and a column for each route
+        """
+        operator = self.assignment_operator
+        n_routes = len(self.routes)
+
+        most_loaded = self.get_most_loaded_slots(loaded_section, k_routes)
+        n_columns = len(most_loaded)
+        if n_columns == 0:
+            return csr_matrix((n_routes, n_routes))
+
+        load_gradient = np.zeros((len(loaded_section), n_columns))
+        load_gradient[most_loaded, np.arange(n_columns)] = 1
+        zeros = np.zeros(load_gradient.shape)
+
+        edges_gradient, operator_gradient = operator.get_slots_values_gradient(z, v, loaded_section, f_operator,
+                                                                               zeros, zeros, load_gradient)
+        operator_gradient += operator.get_frequencies_gradient(f_operator, factor, f_acum, nodes_pax, edges_gradient)
+
+        rows, columns = np.nonzero(operator_gradient.T)
+        return csr_matrix((operator_gradient.T[rows, columns],
+                           (self.__slot_route[most_loaded][rows], self.__operator_route[columns])),
+                          shape=(n_routes, n_routes))
+
+    def get_gradient(self, f_operator: np.ndarray, factor: np.ndarray, f_acum: np.ndarray, nodes_pax: np.ndarray,
+                     edges_pax: np.ndarray, z: np.ndarray, v: np.ndarray, loaded_section: np.ndarray,
+                     f_routes: np.ndarray, k_routes: np.ndarray, cycle_time: np.ndarray) -> np.ndarray:
+        """
+        to get derivative of VRC with respect to frequency of each route. Derivatives of costs are taken with respect to
+        pax of edges and boarding, alighting and load of slots, then they are carried to frequencies by the
+        AssignmentOperator. Infrastructure cost only changes when a route starts or stops operating, so its derivative
+        is zero. In max functions the derivative follows the selected value
+        :param f_operator: frequency of routes in the order of the AssignmentOperator
+        :param factor: proportion of passengers of each edge
+        :param f_acum: sum of frequencies of each boarding edge
+        :param nodes_pax: pax [pax/hr] of each node of the AssignmentOperator
+        :param edges_pax: pax [pax/hr] of each edge of the AssignmentOperator
+        :param z: boarding of each slot [pax/veh]
+        :param v: alighting of each slot [pax/veh]
+        :param loaded_section: load of each slot [pax/veh]
+        :param f_routes: frequency of routes in the order of TransportNetwork.get_routes()
+        :param k_routes: most loaded section of routes in the order of TransportNetwork.get_routes()
+        :param cycle_time: cycle time of routes in the order of TransportNetwork.get_routes()
+        :return: np.ndarray with derivative of VRC in the order of TransportNetwork.get_routes()
+        """
+        operator = self.assignment_operator
+        passenger_obj = self.passenger_obj
+        spv = passenger_obj.spv
+        n_slots = len(z)
+
+        # costo de operadores
+        operating = f_routes != 0
+        cost_k = self.__c0 + self.__c1 * k_routes
+        gradient = np.where(operating, cost_k * cycle_time, 0)
+
+        # derivada de pasajeros en cada parada del ciclo
+        pax_stop_gradient = np.where(operating, cost_k * f_routes * self.__t, 0)[self.__slot_route]
+        z_selected = z >= v
+        z_gradient = np.where(self.__slot_sequential | (self.__slot_simultaneous & z_selected), pax_stop_gradient, 0)
+        v_gradient = np.where(self.__slot_sequential | (self.__slot_simultaneous & ~z_selected), pax_stop_gradient, 0)
+
+        # derivada de la carga en el primer tramo mas cargado de cada ruta
+        load_gradient = np.zeros(n_slots)
+        k_gradient = np.where(operating, self.__c1 * f_routes * cycle_time, 0)
+        most_loaded = self.get_most_loaded_slots(loaded_section, k_routes)
+        load_gradient[most_loaded] = k_gradient[self.__slot_route[most_loaded]]
+
+        # costo de usuarios, te
+        edges_gradient = np.zeros(len(edges_pax))
+        boarding_pax = edges_pax[operator.boarding_edges]
+        edges_gradient[operator.boarding_edges] += passenger_obj.spw * self.__theta * self.__d / f_acum
+        f_acum_gradient = -passenger_obj.spw * boarding_pax * self.__theta * self.__d / f_acum ** 2
+
+        # tv en ruta
+        edges_gradient += spv * self.__tv_edges
+
+        # tv de bajada, slots without alighting take the last value of arrays
+        z_ext_gradient = np.zeros(n_slots + 1)
+        v_ext_gradient = np.zeros(n_slots + 1)
+        v_ext = np.append(v, 0)
+        z_ext = np.append(z, 0)
+        np.add.at(edges_gradient, self.__alighting_edges, spv * v_ext[self.__alighting_slot] * self.__alighting_tb)
+        np.add.at(v_ext_gradient, self.__alighting_slot,
+                  spv * self.__alighting_tb * edges_pax[self.__alighting_edges])
+
+        # tv por la espera de los que suben y bajan cuando el pasajero sigue en ruta
+        z_route = z_ext[self.__route_slot]
+        v_route = v_ext[self.__route_slot]
+        pax_stop_route = np.where(self.__route_sequential, z_route + v_route, 0) + np.where(
+            self.__route_simultaneous, np.maximum(z_route, v_route), 0)
+        np.add.at(edges_gradient, self.__route_edges, spv * pax_stop_route * self.__route_tb)
+        route_gradient = spv * self.__route_tb * edges_pax[self.__route_edges]
+        z_route_selected = z_route >= v_route
+        np.add.at(z_ext_gradient, self.__route_slot,
+                  np.where(self.__route_sequential | (self.__route_simultaneous & z_route_selected),
+                           route_gradient, 0))
+        np.add.at(v_ext_gradient, self.__route_slot,
+                  np.where(self.__route_sequential | (self.__route_simultaneous & ~z_route_selected),
+                           route_gradient, 0))
+        z_gradient += z_ext_gradient[:n_slots]
+        v_gradient += v_ext_gradient[:n_slots]
+
+        # transbordos
+        np.add.at(edges_gradient, self.__transfer_edges, passenger_obj.spt / 60 * spv)
+
+        # derivadas de boarding, alighting y carga de slots
+        slots_edges_gradient, operator_gradient = operator.get_slots_values_gradient(
+            z, v, loaded_section, f_operator, z_gradient, v_gradient, load_gradient)
+        edges_gradient += slots_edges_gradient
+        operator_gradient += operator.get_frequencies_gradient(f_operator, factor, f_acum, nodes_pax, edges_gradient,
+                                                               f_acum_gradient)
+
+        gradient += np.bincount(self.__operator_route, weights=operator_gradient, minlength=len(self.routes))
+        return gradient
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 from sidermit.city import Graph
+from sidermit.optimization.network_precomputation import NetworkPrecomputation
 from sidermit.publictransportsystem import TransportNetwork
 
 defaultdict_float = defaultdict(float)
@@ -62,17 +63,22 @@ class InfrastructureCost:
         return mode_distance
 
     @staticmethod
-    def get_infrastruture_cost(graph_obj: Graph, network_obj: TransportNetwork, f: defaultdict_float) -> float:
+    def get_infrastruture_cost(graph_obj: Graph, network_obj: TransportNetwork, f: defaultdict_float,
+                               network_precomputation: NetworkPrecomputation = None) -> float:
         """
         to get infrastruture cost
         :param network_obj: TransportNetwork object
         :param graph_obj: Graph object
         :param f: dict with frequency for each route_id
+        :param network_precomputation: NetworkPrecomputation object of graph_obj and network_obj to use the incidence of
+        edges and routes of each mode computed before. Default value is None
         :return: infrastruture cost
         """
 
-        infrastruture_cost_obj = InfrastructureCost()
+        if network_precomputation is not None:
+            return network_precomputation.get_infrastructure_cost(network_precomputation.get_frequencies(f))
 
+        infrastruture_cost_obj = InfrastructureCost()
         mode_distance = infrastruture_cost_obj.get_mode_network_distance(graph_obj, network_obj, f)
 
         CI = 0
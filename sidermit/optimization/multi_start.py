@@ -0,0 +1,187 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from sidermit.city import Graph, Demand
+from sidermit.exceptions import *
+from sidermit.optimization.optimizer import Optimizer
+from sidermit.publictransportsystem import Passenger, TransportNetwork
+
+logger = logging.getLogger(__name__)
+
+defaultdict_float = defaultdict(float)
+
+
+class MultiStartOptimizer:
+
+    @staticmethod
+    def latin_hypercube(n_starts: int, n_dimensions: int, seed: int = None) -> np.ndarray:
+        """
+        to get a latin hypercube sample in [0, 1), each dimension has one sample in each of n_starts intervals
+        :param n_starts: number of samples
+        :param n_dimensions: number of dimensions
+        :param seed: seed of random numbers. Default value is None
+        :return: np.ndarray with a sample in each row
+        """
+        rng = np.random.default_rng(seed)
+        sample = np.zeros((n_starts, n_dimensions))
+        for dimension in range(n_dimensions):
+            sample[:, dimension] = (rng.permutation(n_starts) + rng.random(n_starts)) / n_starts
+        return sample
+
+    @staticmethod
+    def get_starting_frequencies(network_obj: TransportNetwork, n_starts: int, method: str = "lhs",
+                                 scale: Tuple[float, float] = (0.5, 2.0), seed: int = None) -> List[defaultdict_float]:
+        """
+        to get frequencies to start optimizations, as fini of the mode of each route scaled by a factor in scale
+        :param network_obj: TransportNetwork object
+        :param n_starts: number of starting frequencies
+        :param method: "lhs" to sample a factor for each route or "mode" to sample a factor for each transport mode,
+        both with a latin hypercube. Default value is "lhs"
+        :param scale: (min factor, max factor) of fini. Default value is (0.5, 2.0)
+        :param seed: seed of random numbers. Default value is None
+        :return: List[dic[route_id] = frequency [veh/hr]]
+        """
+        routes = network_obj.get_routes()
+        modes = network_obj.get_modes()
+
+        if method == "lhs":
+            position = [n for n in range(len(routes))]
+            n_dimensions = len(routes)
+        elif method == "mode":
+            position = [modes.index(route.mode) for route in routes]
+            n_dimensions = len(modes)
+        else:
+            raise OptimizerException("method to get starting frequencies must be 'lhs' or 'mode'")
+
+        min_scale, max_scale = scale
+        factors = min_scale + (max_scale - min_scale) * MultiStartOptimizer.latin_hypercube(n_starts, n_dimensions,
+                                                                                             seed)
+
+        list_f = []
+        for row in factors.tolist():
+            f = defaultdict(float)
+            for route, n in zip(routes, position):
+                f[route.id] = route.mode.fini * row[n]
+            list_f.append(f)
+
+        return list_f
+
+    @staticmethod
+    def run_start(graph_obj: Graph, demand_obj: Demand, passenger_obj: Passenger, network_obj: TransportNetwork,
+                  f: defaultdict_float, tolerance: float = 0.01,
+                  max_number_of_iteration: int = None, max_workers: int = 1,
+                  destination_rooted: bool = False) -> Tuple:
+        """
+        to do an external optimization that starts in f, hyperpaths of the first iteration and the first internal
+        optimization are computed with f instead of fini of each mode
+        :param graph_obj: Graph object
+        :param demand_obj: Demand object
+        :param passenger_obj: Passenger object
+        :param network_obj: TransportNetwork object
+        :param f: dict with frequency [veh/hr] for each route_id, dic[route_id] = frequency
+        :param tolerance: float, tolerance to external optimization
+        :param max_number_of_iteration: int, max. number of iterations. Default value is infinity
+        :param max_workers: number of processes to build hyperpaths, see Hyperpath.get_all_hyperpaths. Default value
+        is 1
+        :param destination_rooted: True to build hyperpaths once for each destination, see
+        Hyperpath.get_all_hyperpaths. Default value is False
+        :return: (f, (fopt, success, status, message, constr_violation, vrc) or None if it fails,
+        List[(fopt, success, status, message, constr_violation, vrc)] of each iteration, error message or None)
+        """
+        opt_obj = None
+        better_res = None
+        error = None
+        # un inicio invalido o sin solucion no detiene a los demas, se guarda en error. Otros errores son de
+        # programacion y se propagan
+        try:
+            opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f, f_start=f,
+                                max_workers=max_workers, destination_rooted=destination_rooted)
+            better_res = opt_obj.external_optimization(graph_obj, demand_obj, passenger_obj, network_obj, f,
+                                                       tolerance, number_of_iteration=max_number_of_iteration,
+                                                       opt_obj=opt_obj)
+        except (SIDERMITException, ZeroDivisionError, ValueError) as e:
+            error = "{}: {}".format(type(e).__name__, e)
+
+        external_results = opt_obj.external_results if opt_obj is not None else []
+        return f, better_res, external_results, error
+
+    @staticmethod
+    def multi_start_optimization(graph_obj: Graph, demand_obj: Demand, passenger_obj: Passenger,
+                                 network_obj: TransportNetwork, list_f: List[defaultdict_float] = None,
+                                 n_starts: int = 4, method: str = "lhs", scale: Tuple[float, float] = (0.5, 2.0),
+                                 seed: int = None, workers: int = None, tolerance: float = 0.01,
+                                 max_number_of_iteration: int = None, max_workers: int = 1,
+                                 destination_rooted: bool = False) -> Optimizer:
+        """
+        to do external optimizations from several starting frequencies in parallel processes and keep the better valid
+        result, see Optimizer.get_better_result
+        :param graph_obj: Graph object
+        :param demand_obj: Demand object
+        :param passenger_obj: Passenger object
+        :param network_obj: TransportNetwork object
+        :param list_f: List[dic[route_id] = frequency [veh/hr]] to start optimizations. Default value is None to get
+        n_starts starting frequencies with get_starting_frequencies
+        :param n_starts: number of starting frequencies if list_f is None. Default value is 4
+        :param method: "lhs" or "mode", see get_starting_frequencies. Default value is "lhs"
+        :param scale: (min factor, max factor) of fini, see get_starting_frequencies. Default value is (0.5, 2.0)
+        :param seed: seed of random numbers. Default value is None
+        :param workers: max. number of processes. Default value is None to use the number of processors, with 1 all
+        optimizations are done in this process
+        :param tolerance: float, tolerance to external optimization
+        :param max_number_of_iteration: int, max. number of iterations of each external optimization. Default value is
+        infinity
+        :param max_workers: number of processes to build hyperpaths in each start, see Hyperpath.get_all_hyperpaths.
+        Default value is 1
+        :param destination_rooted: True to build hyperpaths once for each destination, see
+        Hyperpath.get_all_hyperpaths. Default value is False
+        :return: Optimizer object built with frequencies of the better result, with the better result in better_res,
+        its position in list_f in better_start and results of each start in multi_start_results as
+        List[(f, better_res, external_results, error)], see run_start
+        """
+        if list_f is None:
+            list_f = MultiStartOptimizer.get_starting_frequencies(network_obj, n_starts, method, scale, seed)
+
+        n = len(list_f)
+        parameters = ([graph_obj] * n, [demand_obj] * n, [passenger_obj] * n, [network_obj] * n, list_f,
+                      [tolerance] * n, [max_number_of_iteration] * n, [max_workers] * n,
+                      [destination_rooted] * n)
+
+        if workers == 1:
+            multi_start_results = list(map(MultiStartOptimizer.run_start, *parameters))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                multi_start_results = list(executor.map(MultiStartOptimizer.run_start, *parameters))
+
+        # mejor resultado valido de todos los inicios, con las reglas de get_better_result
+        better_start = None
+        better_res = None
+        for start, (f, res, external_results, error) in enumerate(multi_start_results):
+            if res is None:
+                logger.info("Start {} without solution: {}".format(start, error))
+                continue
+            valid_res = Optimizer.get_better_result([res])
+            if valid_res is not None and (better_res is None or valid_res[5] < better_res[5]):
+                better_start = start
+                better_res = valid_res
+
+        Optimizer.status_optimization(better_res)
+
+        # el optimizador entregado tiene hiperrutas y asignacion de la solucion
+        fopt, _, _, _, _, _ = better_res
+        f = defaultdict(float)
+        for route, f_route in zip(network_obj.get_routes(), fopt):
+            f[route.id] = f_route
+
+        opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f, max_workers=max_workers,
+                            destination_rooted=destination_rooted)
+        opt_obj.better_res = better_res
+        opt_obj.better_start = better_start
+        opt_obj.multi_start_results = multi_start_results
+
+        logger.info(opt_obj.string_network_optimization(opt_obj.better_res))
+
+        return opt_obj
@@ -0,0 +1,183 @@
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from sidermit.city import Graph
+from sidermit.optimization.constrains import Constrains
+from sidermit.optimization.operators_cost import OperatorsCost
+from sidermit.publictransportsystem import TransportNetwork, TransportMode
+
+defaultdict_float = defaultdict(float)
+
+
+class NetworkPrecomputation:
+
+    def __init__(self, graph_obj: Graph, network_obj: TransportNetwork):
+        """
+        values of the city graph and the transport network that do not depend on frequencies. They are computed once
+        for each (Graph, TransportNetwork) and arrays of routes are in the order of TransportNetwork.get_routes()
+        :param graph_obj: Graph object
+        :param network_obj: TransportNetwork object
+        """
+        self.graph_obj = graph_obj
+        self.network_obj = network_obj
+
+        self.routes = network_obj.get_routes()
+        self.modes = network_obj.get_modes()
+        # dic[route_id] = position in routes
+        self.route_position = {route.id: n for n, route in enumerate(self.routes)}
+
+        # dic[nodei_id][nodej_id] = distance [m]
+        self.edges_distance = graph_obj.get_edges_distance()
+        # dic[route_id] = time on board [hr] of vehicle
+        self.line_travel_time = OperatorsCost.lines_travel_time(self.routes, self.edges_distance)
+        self.travel_time = np.array([self.line_travel_time[route.id] for route in self.routes], dtype=float)
+
+        # parametros de cada ruta
+        self.co = np.array([route.mode.co for route in self.routes], dtype=float)
+        self.c1 = np.array([route.mode.c1 for route in self.routes], dtype=float)
+        self.c2 = np.array([route.mode.c2 for route in self.routes], dtype=float)
+        self.t = np.array([route.mode.t / 3600 for route in self.routes], dtype=float)
+        self.bya = np.array([route.mode.bya for route in self.routes], dtype=int)
+        self.d = np.array([route.mode.d for route in self.routes], dtype=float)
+        self.kmax = np.array([route.mode.kmax for route in self.routes], dtype=float)
+
+        # incidencia arco-ruta-modo de las restricciones de fmax
+        self.fmax_matrix, self.fmax = Constrains.fmax_constrains_matrix(graph_obj, self.routes, self.modes)
+
+        # arcos de cada modo: dic[mode] = List[(nodei_id, nodej_id, distance [m], positions of routes of the mode that
+        # go through the edge)], in the order of Graph.get_edges()
+        self.mode_edges = self.build_mode_edges(graph_obj, self.routes, self.modes, self.edges_distance)
+
+        # incidencia modo-arco-ruta del costo de infraestructura, cada fila es un arco sin sentido de un modo. Se
+        # construye la distancia del primer sentido del arco en Graph.get_edges() que tenga una ruta operando
+        rows_mode = []
+        first_rows, first_routes, first_distance = [], [], []
+        second_rows, second_routes, second_distance = [], [], []
+        for m, mode in enumerate(self.modes):
+            # dic[(nodei_id, nodej_id)] = row
+            edge_row = dict()
+            for nodei_id, nodej_id, distance, routes_edge in self.mode_edges[mode]:
+                row = edge_row.get((nodej_id, nodei_id))
+                if row is None:
+                    row = len(rows_mode)
+                    edge_row[(nodei_id, nodej_id)] = row
+                    rows_mode.append(m)
+                    first_distance.append(distance)
+                    second_distance.append(0)
+                    first_rows.extend([row] * len(routes_edge))
+                    first_routes.extend(routes_edge.tolist())
+                else:
+                    second_distance[row] = distance
+                    second_rows.extend([row] * len(routes_edge))
+                    second_routes.extend(routes_edge.tolist())
+
+        n_rows = len(rows_mode)
+        self.__infrastructure_first = csr_matrix((np.ones(len(first_rows)), (first_rows, first_routes)),
+                                                 shape=(n_rows, len(self.routes)))
+        self.__infrastructure_second = csr_matrix((np.ones(len(second_rows)), (second_rows, second_routes)),
+                                                  shape=(n_rows, len(self.routes)))
+        self.__infrastructure_first_distance = np.array(first_distance, dtype=float)
+        self.__infrastructure_second_distance = np.array(second_distance, dtype=float)
+        self.__infrastructure_mode = np.array(rows_mode, dtype=np.int64)
+        self.__modes_d = np.array([mode.d for mode in self.modes], dtype=float)
+
+        # dic[bytes of routes that operate] = (mode_distance, infrastructure cost), the set of routes that operate
+        # rarely changes in an optimization
+        self.__infrastructure_cache = dict()
+
+    @staticmethod
+    def build_mode_edges(graph_obj: Graph, routes: List, modes: List[TransportMode],
+                         edges_distance: defaultdict) -> dict:
+        """
+        to build edges of the city graph where routes of each mode travel
+        :param graph_obj: Graph object
+        :param routes: list of Route object
+        :param modes: list of TransportMode object
+        :param edges_distance: dic[nodei_id][nodej_id] = distance [m]
+        :return: dic[mode] = List[(nodei_id, nodej_id, distance [m], np.ndarray with positions of routes)]
+        """
+        # rutas que recorren cada arco en algun sentido
+        edge_routes = defaultdict(list)
+        for n, route in enumerate(routes):
+            for node_sequence in (route.nodes_sequence_i, route.nodes_sequence_r):
+                for i in range(len(node_sequence) - 1):
+                    edge = (node_sequence[i], node_sequence[i + 1])
+                    if n not in edge_routes[edge]:
+                        edge_routes[edge].append(n)
+
+        mode_edges = dict()
+        for mode in modes:
+            mode_edges[mode] = []
+            for edge in graph_obj.get_edges():
+                nodei_id = edge.node1.id
+                nodej_id = edge.node2.id
+                routes_edge = [n for n in edge_routes.get((nodei_id, nodej_id), []) if routes[n].mode == mode]
+                if routes_edge:
+                    mode_edges[mode].append((nodei_id, nodej_id, edges_distance[nodei_id][nodej_id],
+                                             np.array(routes_edge, dtype=np.int64)))
+        return mode_edges
+
+    def get_frequencies(self, f: defaultdict_float) -> np.ndarray:
+        """
+        to get frequencies in the order of routes
+        :param f: dic[route_id] = frequency [veh/hr]
+        :return: np.ndarray with frequency [veh/hr] of each route
+        """
+        return np.array([f[route.id] for route in self.routes], dtype=float)
+
+    def get_infrastructure(self, f_routes: np.ndarray) -> (defaultdict_float, float):
+        """
+        to get total distance builded in each transport mode and infrastructure cost. Both only depend on routes that
+        operate, so they are saved for each set of routes that operate
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies
+        :return: (dic[mode] = distance, infrastructure cost)
+        """
+        operating = np.asarray(f_routes) != 0
+        key = np.packbits(operating).tobytes()
+        infrastructure = self.__infrastructure_cache.get(key)
+        if infrastructure is not None:
+            return infrastructure
+
+        operating = operating.astype(float)
+        first = self.__infrastructure_first @ operating > 0
+        second = self.__infrastructure_second @ operating > 0
+        distance = np.where(first, self.__infrastructure_first_distance,
+                            np.where(second, self.__infrastructure_second_distance, 0))
+        built = first | second
+
+        mode_distance = defaultdict(float)
+        distances = np.bincount(self.__infrastructure_mode, weights=distance,
+                                minlength=len(self.modes)) * self.__modes_d
+        built_modes = np.bincount(self.__infrastructure_mode, weights=built, minlength=len(self.modes)) > 0
+        for mode, mode_built, mode_distance_value in zip(self.modes, built_modes.tolist(), distances.tolist()):
+            if mode_built:
+                mode_distance[mode] = mode_distance_value
+
+        CI = 0
+        for mode in mode_distance:
+            CI += mode.c2 * mode_distance[mode]
+
+        infrastructure = (mode_distance, CI)
+        self.__infrastructure_cache[key] = infrastructure
+        return infrastructure
+
+    def get_mode_network_distance(self, f: defaultdict_float) -> defaultdict_float:
+        """
+        to get total distance builded in each transport mode, see InfrastructureCost.get_mode_network_distance
+        :param f: dic[route_id] = frequency [veh/hr]
+        :return: ddict with total distance for each mode in transport network
+        """
+        mode_distance, _ = self.get_infrastructure(self.get_frequencies(f))
+        return defaultdict(float, mode_distance)
+
+    def get_infrastructure_cost(self, f_routes: np.ndarray) -> float:
+        """
+        to get infrastructure cost, see InfrastructureCost.get_infrastruture_cost
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies
+        :return: infrastructure cost
+        """
+        _, CI = self.get_infrastructure(f_routes)
+        return CI
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 import logging
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from typing import List, Tuple
 
 import numpy as np
-from scipy.optimize import minimize, NonlinearConstraint, Bounds, OptimizeResult
+from scipy.optimize import minimize, NonlinearConstraint, LinearConstraint, Bounds, OptimizeResult
+from scipy.sparse import csr_matrix
 
 from sidermit.city import Graph, Demand
 from sidermit.exceptions import *
 from sidermit.optimization import Constrains
-from sidermit.optimization import InfrastructureCost, UsersCost, OperatorsCost
-from sidermit.optimization.preoptimization import Assignment, Hyperpath, ExtendedGraph, ExtendedNode, ExtendedEdge
+from sidermit.optimization import InfrastructureCost, UsersCost, OperatorsCost, Evaluator, Evaluation, \
+    NetworkPrecomputation
+from sidermit.optimization.preoptimization import Assignment, AssignmentOperator, Hyperpath, ExtendedGraph, \
+    ExtendedNode, ExtendedEdge
 from sidermit.publictransportsystem import Passenger
 from sidermit.publictransportsystem import TransportNetwork, RouteType
 
@@ -42,7 +45,13 @@ defaultdict_str = defaultdict(str)
 
 class Optimizer:
     def __init__(self, graph_obj: Graph, demand_obj: Demand, passenger_obj: Passenger, network_obj: TransportNetwork,
-                 f: defaultdict_float = None):
+                 f: defaultdict_float = None, extended_graph_obj: ExtendedGraph = None,
+                 evaluation_cache_size: int = 64, network_precomputation: NetworkPrecomputation = None,
+                 f_start: defaultdict_float = None, max_workers: int = 1, destination_rooted: bool = False):
+
+        # procesos y modo para construir hiperrutas, ver Hyperpath.get_all_hyperpaths
+        self.max_workers = max_workers
+        self.destination_rooted = destination_rooted
 
         # definimos ciudad
         self.graph_obj = graph_obj
@@ -59,30 +68,85 @@ class Optimizer:
 
         # definimos red de transporte
         self.network_obj = network_obj
+        # valores de la ciudad y la red que no dependen de las frecuencias, si viene de una iteración previa se reusan
+        if network_precomputation is None:
+            network_precomputation = NetworkPrecomputation(self.graph_obj, self.network_obj)
+        self.network_precomputation = network_precomputation
 
         # definimos frecuencia
-        self.f, self.f_opt, self.lines_position = self.f0(f)
+        self.f, self.f_opt, self.lines_position = self.f0(f, f_start)
 
-        self.extended_graph_obj = ExtendedGraph(self.graph_obj, self.network_obj.get_routes(), self.TP, self.f)
+        # definimos grafo extendido, si viene de una iteración previa solo se actualizan las frecuencias de los arcos
+        # de subida
+        if extended_graph_obj is None:
+            self.extended_graph_obj = ExtendedGraph(self.graph_obj, self.network_obj.get_routes(), self.TP, self.f)
+        else:
+            self.extended_graph_obj = extended_graph_obj
+            self.extended_graph_obj.update_frequencies(self.f)
         self.hyperpath_obj = Hyperpath(self.extended_graph_obj, self.passenger_obj)
 
+        # VRC y restricciones de una frecuencia se calculan juntos y se guardan en un cache LRU, el optimizador las
+        # pide por separado y varias veces en el mismo punto
+        self.evaluation_cache = OrderedDict()  # dic[fopt as bytes] = Evaluation
+        self.evaluation_cache_size = evaluation_cache_size
+        self.evaluation_cache_hits = 0
+        self.evaluation_cache_misses = 0
+
+        self.update_hyperpaths()
+
+        self.len_var = len(self.f_opt)
+        # restricciones de fmax son lineales en f
+        self.fmax_matrix = self.network_precomputation.fmax_matrix
+        self.fmax = self.network_precomputation.fmax
+
+        # ultimo resultado de la optimizacion interna, para partir la siguiente desde su estado
+        self.last_internal_res = None  # OptimizeResult
+
+        self.better_res = None  # (fopt, success, status, message, constr_violation, vrc)
+        # resultados de cada iteracion de la ultima optimizacion externa hecha con este objeto
+        self.external_results = []  # List[(fopt, success, status, message, constr_violation, vrc)]
+
+    def update_hyperpaths(self) -> None:
+        """
+        to compute hyperpaths, assignment and its evaluator with frequencies of the extended graph, that is to say
+        everything that depends on self.f
+        :return:
+        """
         # en este punto se debería levantar exception de que la red tiene mas de dos modos defnidos
         # o que existe un par OD con viaje y sin conexion
         self.hyperpaths, self.labels, self.successors, self.frequency, self.Vij = self.hyperpath_obj.get_all_hyperpaths(
-            self.demand_obj.get_matrix())
+            self.demand_obj.get_matrix(), destination_rooted=self.destination_rooted, max_workers=self.max_workers)
 
         self.assignment = Assignment.get_assignment(self.hyperpaths, self.labels, self.p, self.vp, self.pa,
                                                     self.pv)
 
-        self.len_constrains = len(self.get_constrains(self.f_opt))
-        self.len_var = len(self.f_opt)
+        # los hiperrutas y la asignacion no cambian en la optimizacion interna, se compila la distribucion de pasajeros
+        self.assignment_operator = AssignmentOperator(self.Vij, self.hyperpaths, self.successors, self.assignment)
+        self.evaluator = Evaluator(self.graph_obj, self.network_obj, self.passenger_obj, self.extended_graph_obj,
+                                   self.hyperpaths, self.Vij, self.assignment, self.successors,
+                                   self.assignment_operator, self.network_precomputation)
+        # evaluaciones de hiperrutas previas ya no son validas
+        self.evaluation_cache.clear()
 
-        self.better_res = None  # (fopt, success, status, message, constr_violation, vrc)
+    def update_frequencies(self, f: defaultdict_float) -> None:
+        """
+        to start a new external iteration with frequencies f. City, demand, transport network and extended graph are
+        kept, only frequencies of boarding edges, hyperpaths and assignment are computed again
+        :param f: dict with frequency [veh/hr] for each route_id, dic[route_id] = frequency
+        :return:
+        """
+        self.f, _, _ = self.f0(f)
+        self.extended_graph_obj.update_frequencies(self.f)
+        self.hyperpath_obj.update_frequencies()
+        self.update_hyperpaths()
 
-    def f0(self, f: defaultdict_float = None) -> (defaultdict_float, List[float], defaultdict_str):
+    def f0(self, f: defaultdict_float = None, f_start: defaultdict_float = None) -> (defaultdict_float, List[float],
+                                                                                      defaultdict_str):
         """
         to get a relation between f as a dictionary and f_opt as a list to the optimizer
         :param f: dic[route_id] = frequency [veh/hr] for all D lines
+        :param f_start: dic[route_id] = frequency [veh/hr] where internal optimization starts. Default value is None to
+        start from fini of the mode of each route
         :return: dic[route_id] = frequency [veh/hr] for all D lines, List[frequency], dic[position] = route_id
         """
         fini = defaultdict(float)
@@ -102,6 +166,9 @@ class Optimizer:
                 lines_position[n] = route.id
                 n += 1
 
+        if f_start is not None:
+            fopt = [f_start[route.id] for route in self.network_obj.get_routes()]
+
         return fini, fopt, lines_position
 
     def fopt_to_f(self, fopt: List[float]) -> defaultdict_float:
@@ -141,9 +208,8 @@ class Optimizer:
         """
         operators_cost_obj = OperatorsCost()
 
-        edge_distance = self.graph_obj.get_edges_distance()
         routes = self.network_obj.get_routes()
-        line_travel_time = operators_cost_obj.lines_travel_time(routes, edge_distance)
+        line_travel_time = self.network_precomputation.line_travel_time
 
         cycle_time = operators_cost_obj.get_cycle_time(z, v, routes, line_travel_time)
         cost = operators_cost_obj.get_operators_cost(routes, cycle_time, f, k)
@@ -156,7 +222,8 @@ class Optimizer:
         :return: float, infrastructure cost
         """
         infrastructure_cost_obj = InfrastructureCost()
-        cost = infrastructure_cost_obj.get_infrastruture_cost(self.graph_obj, self.network_obj, f)
+        cost = infrastructure_cost_obj.get_infrastruture_cost(self.graph_obj, self.network_obj, f,
+                                                              self.network_precomputation)
         return cost
 
     def user_cost(self, hyperpaths: dic_hyperpaths, Vij: dic_Vij, assignment: dic_assigment,
@@ -164,7 +231,7 @@ class Optimizer:
                   z: defaultdict3_float, v: defaultdict3_float) -> float:
         """
         to get users cost
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
         :param Vij: dic[origin: CityNode][destination: CityNode] = vij
         :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
         :param successors: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge]
@@ -180,7 +247,7 @@ class Optimizer:
         return cost
 
     def constrains(self, loaded_section_route: defaultdict3_float, f: defaultdict_float) -> (
-            List[float], List[float]):
+            List[float], np.ndarray):
         """
         to get k constrains and f constrains
         :param loaded_section_route: dic[route_id][direction][stop: StopNode] = pax [pax/veh]
@@ -193,30 +260,82 @@ class Optimizer:
         constrains_obj = Constrains()
 
         ineq_k = constrains_obj.most_loaded_section_constrains(self.network_obj.get_routes(), most_loaded_section)
-        ineq_f = constrains_obj.fmax_constrains(self.graph_obj, self.network_obj.get_routes(),
-                                                self.network_obj.get_modes(), f)
+        # restricciones de fmax con la incidencia arco-ruta-modo construida una vez
+        ineq_f = self.fmax_matrix @ self.network_precomputation.get_frequencies(f) - self.fmax
 
         return ineq_k, ineq_f
 
+    def get_evaluation(self, fopt: List[float], gradient: bool = False) -> Evaluation:
+        """
+        to get VRC and constrains of a frequency in a single evaluation. Evaluations are saved in a LRU cache with the
+        exact bytes of fopt as key, so VRC, get_constrains and queries about results share one evaluation per point
+        :param fopt: variable to optimize
+        :param gradient: True if the evaluation must have the gradient of VRC. Default value is False
+        :return: Evaluation object with costs and constrains
+        """
+        key = np.asarray(fopt, dtype=float).tobytes()
+        evaluation = self.evaluation_cache.get(key)
+        if evaluation is not None and (not gradient or evaluation.gradient is not None):
+            self.evaluation_cache_hits += 1
+            self.evaluation_cache.move_to_end(key)
+            return evaluation
+
+        self.evaluation_cache_misses += 1
+        evaluation = self.evaluator.evaluate(self.fopt_to_f(fopt), gradient)
+        if self.evaluation_cache_size > 0:
+            self.evaluation_cache[key] = evaluation
+            self.evaluation_cache.move_to_end(key)
+            # se elimina la evaluacion usada hace mas tiempo
+            if len(self.evaluation_cache) > self.evaluation_cache_size:
+                self.evaluation_cache.popitem(last=False)
+        return evaluation
+
+    def get_evaluation_cache_info(self) -> Tuple[int, int, int]:
+        """
+        to get information about the cache of evaluations
+        :return: (hits, misses, number of saved evaluations)
+        """
+        return self.evaluation_cache_hits, self.evaluation_cache_misses, len(self.evaluation_cache)
+
     def VRC(self, fopt: List[float]) -> float:
         """
         to get VRC objective function to minime in optimizer
         :param fopt: variable to optimize
         :return: float, VRC value function
         """
+        return self.get_evaluation(fopt).VRC
 
-        f = self.fopt_to_f(fopt)
+    def VRC_batch(self, fopt_batch: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        to get VRC of several variables to optimize at once, evaluations are not saved in the cache
+        :param fopt_batch: np.ndarray (batch x len(fopt)), each row is a variable to optimize
+        :return: (VRC, CO, CI, CU), np.ndarray with a value for each row of fopt_batch
+        """
+        return self.evaluator.evaluate_batch(fopt_batch)
 
-        z, v, loaded_section_route = Assignment.get_alighting_and_boarding(self.Vij, self.hyperpaths, self.successors,
-                                                                           self.assignment, f)
-        k = self.get_k(loaded_section_route)
+    def VRC_gradient(self, fopt: List[float]) -> np.ndarray:
+        """
+        to get gradient of VRC objective function with fixed hyperpaths
+        :param fopt: variable to optimize
+        :return: np.ndarray with derivative of VRC with respect to each frequency of fopt
+        """
+        return self.get_evaluation(fopt, gradient=True).gradient
 
-        CO = self.operators_cost(z, v, f, k)
-        CI = self.infrastructure_cost(f)
-        CU = self.user_cost(self.hyperpaths, self.Vij, self.assignment, self.successors, self.extended_graph_obj, f, z,
-                            v)
+    def get_most_loaded_section_constrains(self, fopt: List[float]) -> np.ndarray:
+        """
+        to get constrains of most loaded section
+        :param fopt: variable to optimize
+        :return: np.ndarray with a constrain for each route
+        """
+        return np.array(self.get_evaluation(fopt).ineq_k)
 
-        return CO + CI + CU
+    def get_most_loaded_section_jacobian(self, fopt: List[float]) -> csr_matrix:
+        """
+        to get jacobian of constrains of most loaded section with fixed hyperpaths
+        :param fopt: variable to optimize
+        :return: sparse matrix with derivative of each constrain with respect to each frequency of fopt
+        """
+        return self.get_evaluation(fopt, gradient=True).ineq_k_jacobian
 
     def get_constrains(self, fopt: List[float]) -> List[float]:
         """
@@ -224,29 +343,13 @@ class Optimizer:
         :param fopt: variable to optimize
         :return: all constrains as a List[float]
         """
+        return list(self.get_evaluation(fopt).constrains)
 
-        f = self.fopt_to_f(fopt)
-
-        z, v, loaded_section_route = Assignment.get_alighting_and_boarding(self.Vij, self.hyperpaths, self.successors,
-                                                                           self.assignment, f)
-
-        most_loaded_section = Assignment.most_loaded_section(loaded_section_route)
-        constrain_obj = Constrains()
-        ineq_k = constrain_obj.most_loaded_section_constrains(self.network_obj.get_routes(), most_loaded_section)
-        ineq_f = constrain_obj.fmax_constrains(self.graph_obj, self.network_obj.get_routes(),
-                                               self.network_obj.get_modes(), f)
-
-        con = []
-        for c in ineq_k:
-            con.append(c)
-        for c in ineq_f:
-            con.append(c)
-
-        return con
-
-    def internal_optimization(self) -> OptimizeResult:
+    def internal_optimization(self, warm_start: bool = False) -> OptimizeResult:
         """
         method to do internal optimization process, with a hyperpath setted you can get a optimization of the network
+        :param warm_start: True to start from the solution of the last internal optimization instead of f_opt, routes
+        that do not operate in that solution start from f_opt. Default value is False
         :return:     res : OptimizeResult
         The optimization result represented as a ``OptimizeResult`` object.
         Important attributes are: ``x`` the solution array, ``success`` a
@@ -255,21 +358,44 @@ class Optimizer:
         `OptimizeResult` for a description of other attributes.
         """
 
-        constr_func = lambda fopt: np.array(self.get_constrains(fopt))
+        lb = [-1 * np.inf] * self.len_var
+        ub = [0] * self.len_var
+        nonlin_con = NonlinearConstraint(self.get_most_loaded_section_constrains, lb=lb, ub=ub,
+                                         jac=self.get_most_loaded_section_jacobian)
+        constraints = [nonlin_con]
 
-        lb = [-1 * np.inf] * self.len_constrains
-        ub = [0] * self.len_constrains
-        nonlin_con = NonlinearConstraint(constr_func, lb=lb, ub=ub)
+        if self.fmax_matrix.shape[0] > 0:
+            lb = [-1 * np.inf] * self.fmax_matrix.shape[0]
+            lin_con = LinearConstraint(self.fmax_matrix, lb=lb, ub=self.fmax)
+            constraints.append(lin_con)
 
         lb = [0] * self.len_var
         ub = [np.inf] * self.len_var
 
         bounds = Bounds(lb=lb, ub=ub)
-        res = minimize(self.VRC, self.f_opt, method='trust-constr', constraints=nonlin_con, tol=0.01, bounds=bounds)
+
+        res = minimize(self.VRC, self.get_initial_point(warm_start), method='trust-constr', jac=self.VRC_gradient,
+                       constraints=constraints, tol=0.01, bounds=bounds)
+        self.last_internal_res = res
         logger.info(self.string_information_internal_optimization(res))
 
         return res
 
+    def get_initial_point(self, warm_start: bool = False) -> List[float]:
+        """
+        to get the point where internal optimization starts
+        :param warm_start: True to start from the solution of the last internal optimization, routes with less than
+        1/24 [veh/hr] in that solution start from f_opt. Default value is False to start from f_opt
+        :return: List[frequency]
+        """
+        if not warm_start or self.last_internal_res is None:
+            return self.f_opt
+
+        # trust-constr no recibe multiplicadores de Lagrange ni hessiano inicial, y el radio de region de confianza
+        # final es del orden de xtol, por lo que solo se parte desde la solucion previa. Rutas que no operan parten
+        # desde f_opt para no quedar en el borde
+        return np.where(np.asarray(self.last_internal_res.x) < 1 / 24, self.f_opt, self.last_internal_res.x).tolist()
+
     @staticmethod
     def string_information_internal_optimization(res: OptimizeResult) -> str:
         """
@@ -351,7 +477,8 @@ class Optimizer:
     def external_optimization(graph_obj: Graph, demand_obj: Demand, passenger_obj: Passenger,
                               network_obj: TransportNetwork,
                               f: defaultdict_float = None, tolerance: float = 0.01,
-                              number_of_iteration: int = None) -> Tuple:
+                              number_of_iteration: int = None, opt_obj: Optimizer = None,
+                              max_workers: int = 1, destination_rooted: bool = False) -> Tuple:
         """
         method to do external optimization process, several iterations of internal optimization with fixed
         hyperpaths in each
@@ -364,12 +491,22 @@ class Optimizer:
         :param number_of_iteration: int, max. number of iterations. Default value is infinity.
         it is recommended to set this value in a small number of iterations (e.x. 5) in the beginning to know if it
         converges
+        :param opt_obj: Optimizer object built with the same parameters, it is used in all iterations and it keeps the
+        state of the last one and results of each iteration in external_results. Default value is None to build a new
+        one
+        :param max_workers: number of processes to build hyperpaths if opt_obj is None, see
+        Hyperpath.get_all_hyperpaths. Default value is 1
+        :param destination_rooted: True to build hyperpaths once for each destination if opt_obj is None, see
+        Hyperpath.get_all_hyperpaths. Default value is False
         :return: (fopt, success, status, message, constr_violation, vrc)
         """
 
         list_res = []
 
-        opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f)
+        if opt_obj is None:
+            opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f, max_workers=max_workers,
+                                destination_rooted=destination_rooted)
+        opt_obj.external_results = list_res
         # inicialización
         list_res.append((opt_obj.f_opt, "initialization", -1, "initialization", -1, -1))
 
@@ -388,8 +525,9 @@ class Optimizer:
                     break
             pre_f = new_f
             dic_new_f = opt_obj.fopt_to_f(new_f)
-            opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, dic_new_f)
-            res = opt_obj.internal_optimization()
+            # solo se actualiza lo que depende de las frecuencias y se parte desde la solucion previa
+            opt_obj.update_frequencies(dic_new_f)
+            res = opt_obj.internal_optimization(warm_start=True)
             list_res.append((res.x, res.success, res.status, res.message, res.constr_violation, res.fun))
             new_f = res.x
             iteration += 1
@@ -436,7 +574,8 @@ class Optimizer:
     def network_optimization(graph_obj: Graph, demand_obj: Demand, passenger_obj: Passenger,
                              network_obj: TransportNetwork,
                              f: defaultdict_float = None, tolerance: float = 0.01,
-                             max_number_of_iteration: int = None) -> Optimizer:
+                             max_number_of_iteration: int = None, max_workers: int = 1,
+                             destination_rooted: bool = False) -> Optimizer:
         """
         obtain optimal frequency for the defined network if possible or raise exceptions in case of not being able
         :param graph_obj: Graph object
@@ -449,12 +588,18 @@ class Optimizer:
         :param max_number_of_iteration: int, max. number of iterations. Default value is infinity.
         it is recommended to set this value in a small number of iterations (e.x. 5) in the beginning to know if it
         converges
+        :param max_workers: number of processes to build hyperpaths, see Hyperpath.get_all_hyperpaths. Default value
+        is 1
+        :param destination_rooted: True to build hyperpaths once for each destination, see
+        Hyperpath.get_all_hyperpaths. Default value is False
         :return: opt_obj
         """
 
-        opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f)
+        opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, f, max_workers=max_workers,
+                            destination_rooted=destination_rooted)
         opt_obj.better_res = opt_obj.external_optimization(graph_obj, demand_obj, passenger_obj, network_obj, f,
-                                                           tolerance, number_of_iteration=max_number_of_iteration)
+                                                           tolerance, number_of_iteration=max_number_of_iteration,
+                                                           opt_obj=opt_obj)
 
         logger.info(opt_obj.string_network_optimization(opt_obj.better_res))
 
@@ -498,7 +643,10 @@ class Optimizer:
         fopt, success, status, message, constr_violation, vrc = res
 
         f = self.fopt_to_f(fopt)
-        final_optimizer = Optimizer(self.graph_obj, self.demand_obj, self.passenger_obj, self.network_obj, f)
+        # los valores que no dependen de las frecuencias se reusan, solo se rehacen grafo extendido e hiperrutas
+        final_optimizer = Optimizer(self.graph_obj, self.demand_obj, self.passenger_obj, self.network_obj, f,
+                                    network_precomputation=self.network_precomputation, max_workers=self.max_workers,
+                                    destination_rooted=self.destination_rooted)
         z, v, loaded_section_route = Assignment.get_alighting_and_boarding(final_optimizer.Vij,
                                                                            final_optimizer.hyperpaths,
                                                                            final_optimizer.successors,
@@ -526,8 +674,7 @@ class Optimizer:
         f = self.fopt_to_f(fopt)
 
         # resultados de modos
-        travel_time_line = OperatorsCost.lines_travel_time(final_optimizer.network_obj.get_routes(),
-                                                           final_optimizer.graph_obj.get_edges_distance())
+        travel_time_line = final_optimizer.network_precomputation.line_travel_time
         cycle_time_line = OperatorsCost.get_cycle_time(z, v, final_optimizer.network_obj.get_routes(), travel_time_line)
 
         for route in final_optimizer.network_obj.get_routes():
@@ -787,8 +934,7 @@ class Optimizer:
                                                      final_optimizer.passenger_obj.va, f, z, v)
 
         # resultados de modos
-        travel_time_line = OperatorsCost.lines_travel_time(final_optimizer.network_obj.get_routes(),
-                                                           final_optimizer.graph_obj.get_edges_distance())
+        travel_time_line = final_optimizer.network_precomputation.line_travel_time
         cycle_time_line = OperatorsCost.get_cycle_time(z, v, final_optimizer.network_obj.get_routes(), travel_time_line)
 
         B = defaultdict(float)
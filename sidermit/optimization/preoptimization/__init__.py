@@ -1,6 +1,10 @@
-from .extended_graph import CityNode, StopNode, RouteNode, ExtendedGraph, ExtendedEdgesType, ExtendedEdge, ExtendedNode
-from .hyper_path import Hyperpath
+from .extended_graph import CityNode, StopNode, RouteNode, ExtendedGraph, ExtendedEdgesType, ExtendedEdge, ExtendedNode, \
+    ExtendedNodesType, CompiledExtendedGraph
+from .hyperpaths_store import HyperpathsStore
+from .hyper_path import Hyperpath, ElementalPaths
 from .assignment import Assignment
+from .assignment_operator import AssignmentOperator
 
-__all__ = ['Assignment', 'ExtendedGraph', 'ExtendedEdgesType', 'Hyperpath', 'CityNode', 'StopNode', 'RouteNode',
-           'ExtendedEdge', 'ExtendedNode']
+__all__ = ['Assignment', 'AssignmentOperator', 'ExtendedGraph', 'ExtendedEdgesType', 'Hyperpath', 'CityNode', 'StopNode', 'RouteNode',
+           'ExtendedEdge', 'ExtendedNode', 'ExtendedNodesType', 'CompiledExtendedGraph',
+           'ElementalPaths', 'HyperpathsStore']
@@ -1,8 +1,10 @@
 from collections import defaultdict
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
 
 from sidermit.optimization.preoptimization import ExtendedEdge, ExtendedNode
-from sidermit.optimization.preoptimization import StopNode, RouteNode
+from sidermit.optimization.preoptimization import CityNode, StopNode, RouteNode
 
 defaultdict2_float = defaultdict(lambda: defaultdict(float))
 defaultdict3_float = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
@@ -33,25 +35,30 @@ class Assignment:
         pass
 
     @staticmethod
-    def get_assignment(hyperpaths: dic_hyperpaths, labels: dic_labels, p: float, vp: float, spa: float,
-                       spv: float) -> dic_assigment:
+    def get_assignment_matrix(hyperpaths: dic_hyperpaths, labels: dic_labels, p: float, vp: float, spa: float,
+                              spv: float) -> (List[Tuple[CityNode, CityNode]], List[Tuple[StopNode, StopNode]],
+                                              np.ndarray):
         """
-        to distribute trips of all OD pair in each StopNode of the Origin
+        to distribute trips of all OD pair between two StopNodes of the Origin, stop1 is a StopNode with d = 1 and
+        stop2 is the other StopNode. Both splits are computed for all OD pairs at once with positions of stops of
+        stop2 in closed form
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths.
+        :param labels: dic[origin: CityNode][destination: CityNode][ExtendedNode] = Label
+        :param p: width [m] of all CityNode
         :param vp: Walking speed [km/h]
-        :param spv: Subjetive value of in-vehicle time savings [US$/h]
         :param spa: Subjetive value of access time savings [US$/h]
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]].
-        Each List[ExtendedNodes] represent a elemental path.
-        :param labels: dic[origin: CityNode][destination: CityNode][ExtendedNode] = Label [
-        :param p: width [m] of all CityNode
-        :return: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
+        :param spv: Subjetive value of in-vehicle time savings [US$/h]
+        :return: (List[(origin, destination)], List[(stop1, stop2)] with None if OD pair does not have the StopNode,
+        np.ndarray (OD x 2) with %V_OD of stop1 and stop2)
         """
-
-        assignment = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        od_pairs = []
+        stops = []
+        label1 = []
+        label2 = []
+        d2 = []
 
         for origin in hyperpaths:
             for destination in hyperpaths[origin]:
-
                 # paradero de d = 1
                 stop1 = None
                 # otro paradero ( su d puede ser o no 1)
@@ -67,65 +74,98 @@ class Assignment:
                     else:
                         stop2 = stop
 
-                # solo tiene una parada
-                if stop1 is None or stop2 is None:
-                    if stop1 is not None:
-                        assignment[origin][destination][stop1] = 100
-                    if stop2 is not None:
-                        assignment[origin][destination][stop2] = 100
-                # existen ambas paradas
-                else:
-                    # paradero con d = 1 es de etiqueta minima
-                    if labels[origin][destination][stop1] <= labels[origin][destination][stop2]:
-                        # calculamos caminata de indiferencia
-                        d = vp * (labels[origin][destination][stop2] - labels[origin][destination][stop1]) / (spa / spv)
+                od_pairs.append((origin, destination))
+                stops.append((stop1, stop2))
+                label1.append(labels[origin][destination][stop1] if stop1 is not None else 0)
+                label2.append(labels[origin][destination][stop2] if stop2 is not None else 0)
+                d2.append(stop2.mode.d if stop2 is not None else 1)
+
+        has1 = np.array([stop1 is not None for stop1, _ in stops], dtype=bool)
+        has2 = np.array([stop2 is not None for _, stop2 in stops], dtype=bool)
+        label1 = np.array(label1, dtype=float)
+        label2 = np.array(label2, dtype=float)
+        d2 = np.array(d2, dtype=float)
+
+        share1 = np.zeros(len(od_pairs))
+        share2 = np.zeros(len(od_pairs))
+
+        # solo tiene una parada
+        share1[has1 & ~has2] = 100
+        share2[has2 & ~has1] = 100
+
+        both = has1 & has2
+        # zona de influencia de stop2
+        zona_stop_2 = p / d2
+
+        # paradero con d = 1 es de etiqueta minima
+        first = both & (label1 <= label2)
+        # caminata de indiferencia
+        d = vp * (label2 - label1) / (spa / spv)
+        # caminata de indiferencia es mayor a la zona de influencia de stop1
+        share1[first & (d >= p / 2)] = 100
+
+        # paraderos de stop2 a la derecha de stop1 estan en zona_stop_2 * (i + 0.5), i < int(d2 / 2), se busca el
+        # primero ubicado mas lejos que la distancia de indiferencia
+        closer = first & (d < p / 2)
+        n_positions = np.floor(d2 / 2)
+        i = np.maximum(np.floor(d / zona_stop_2 - 0.5) + 1, 0)
+        position = zona_stop_2 / 2 + i * zona_stop_2
+        # corrige redondeo de la forma cerrada
+        i = np.where(position <= d, i + 1, i)
+        i = np.where((i > 0) & (zona_stop_2 / 2 + (i - 1) * zona_stop_2 > d), i - 1, i)
+        position = zona_stop_2 / 2 + i * zona_stop_2
+
+        found = closer & (i < n_positions)
+        share1[found] = ((2 * d + (position - d)) / p * 100)[found]
+        share2[found] = 100 - share1[found]
+
+        # si no se encontro paradero mas lejos a la distancia de indiferencia asignar todo a stop1
+        last_position = np.where(n_positions > 0, zona_stop_2 / 2 + (n_positions - 1) * zona_stop_2, 0)
+        share1[closer & ~found & (last_position < d)] = 100
+
+        # stop2 es de etiqueta minima
+        second = both & (label1 > label2)
+        # si parametro d de stop2 es impar
+        odd = second & (d2 % 2 == 1)
+        share2[odd] = 100
+
+        even = second & ~odd
+        # caminata de indiferencia
+        d = vp * (label1 - label2) / (spa / spv)
+        # posicion del primer paradero stop2 a la derecha del centro
+        position = zona_stop_2 * 0.5
+        share2[even & (d >= position)] = 100
+        split = even & (d < position)
+        share1[split] = ((position - d) / p * 100)[split]
+        share2[split] = 100 - share1[split]
+
+        return od_pairs, stops, np.column_stack((share1, share2))
+
+    @staticmethod
+    def get_assignment(hyperpaths: dic_hyperpaths, labels: dic_labels, p: float, vp: float, spa: float,
+                       spv: float) -> dic_assigment:
+        """
+        to distribute trips of all OD pair in each StopNode of the Origin, see get_assignment_matrix
+        :param vp: Walking speed [km/h]
+        :param spv: Subjetive value of in-vehicle time savings [US$/h]
+        :param spa: Subjetive value of access time savings [US$/h]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths.
+        Each List[ExtendedNodes] represent a elemental path.
+        :param labels: dic[origin: CityNode][destination: CityNode][ExtendedNode] = Label [
+        :param p: width [m] of all CityNode
+        :return: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
+        """
 
-                        # caminata de indiferencia es mayor a la zona de influencia de stop1
-                        if d >= p / 2:
-                            assignment[origin][destination][stop1] = 100
+        assignment = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
 
-                        # caminata de indiferencia es menor a la zona de influencia de stop1
-                        else:
+        od_pairs, stops, shares = Assignment.get_assignment_matrix(hyperpaths, labels, p, vp, spa, spv)
 
-                            # zona de influencia de stop_2
-                            zona_stop_2 = p / stop2.mode.d
-
-                            # encontraremos linea de stop 2
-                            position = 0
-                            # reconoceremos posición de todos los paraderos ubicado a la derecha de stop1
-                            for i in range(int(stop2.mode.d / 2)):
-                                if i == 0:
-                                    position = zona_stop_2 / 2
-                                else:
-                                    position = position + zona_stop_2
-                                # encontramos un paradero de stop2 que esta ubicado mas lejos que la distancia de
-                                # indiferencia
-                                if position > d:
-                                    assignment[origin][destination][stop1] = (2 * d + (position - d)) / p * 100
-                                    assignment[origin][destination][stop2] = 100 - assignment[origin][destination][
-                                        stop1]
-                                    break
-                            # si no se encontro paradero mas lejos a la distancia de indiferencia asignar to do a stop1
-                            if position < d:
-                                assignment[origin][destination][stop1] = 100
-                    else:
-                        # si parametro d de stop2 es impar
-                        if stop2.mode.d % 2 == 1:
-                            assignment[origin][destination][stop2] = 100
-                        else:
-                            # calculamos caminata de indiferencia
-                            d = vp * (labels[origin][destination][stop1] - labels[origin][destination][stop2]) / (
-                                    spa / spv)
-
-                            # necesitamos posicion del primer paradero stop2 a la derecha del centro
-                            position = (p / stop2.mode.d) * 0.5
-
-                            if d >= position:
-                                assignment[origin][destination][stop2] = 100
-                            else:
-                                assignment[origin][destination][stop1] = (position - d) / p * 100
-                                assignment[origin][destination][stop2] = 100 - assignment[origin][destination][
-                                    stop1]
+        for (origin, destination), (stop1, stop2), (share1, share2) in zip(od_pairs, stops, shares.tolist()):
+            # solo se guardan paraderos con viajes
+            if share1 != 0:
+                assignment[origin][destination][stop1] = share1
+            if share2 != 0:
+                assignment[origin][destination][stop2] = share2
         return assignment
 
     @staticmethod
@@ -136,7 +176,7 @@ class Assignment:
          :param successors: dic[origin: CityNode][destination: CityNode] [ExtendedNode] = List[ExtendedEdge],
         List[ExtendedEdge] represent all successors edge for each ExtendedNode in a OD pair.
         :param Vij: dic[origin: CityNode][destination: CityNode] = vij [pax/hr]
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]].
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths.
         Each List[ExtendedNodes] represent a elemental path to connect a origin and destination
         :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] =%V_OD
         :param f: dic[route_id] = frequency [veh/hr]
@@ -156,6 +196,10 @@ class Assignment:
             for destination in hyperpaths[origin]:
                 # viajes del par OD
                 vod = Vij[origin][destination]
+                successors_od = successors[origin][destination]
+
+                # pasajeros que llegan a cada nodo
+                pax = defaultdict(float)
                 for stop in hyperpaths[origin][destination]:
                     # viajes de todas las rutas elementales que salen de esta parada
                     vod_s = vod * assignment[origin][destination][stop] / 100
@@ -163,29 +207,33 @@ class Assignment:
                     if vod_s == 0:
                         continue
 
-                    # cosntruye las rutas elementales del par OD que surgen de la parada
-                    paths = []
-                    # constituida de tuplas, noodei, nodoj, vij
-                    for suc in successors[origin][destination][stop]:
-                        nodej = suc.nodej
-                        paths.append((stop, nodej, vod_s))
+                    pax[stop] += vod_s
+
+                # los nodos se recorren una vez, despues de todos sus predecesores
+                for nodei in Assignment.get_topological_order(destination, list(pax), successors_od):
+                    # no se agregan arcos, los pasajeros llegaron a destino
+                    if isinstance(nodei, StopNode) and nodei.city_node == destination:
+                        continue
 
-                    while len(paths) != 0:
-                        nodei, nodej, pax = paths.pop(0)
+                    successors_i = successors_od[nodei]
+
+                    f_acum = 0
+                    if isinstance(nodei, StopNode):
+                        for suc in successors_i:
+                            if isinstance(suc.nodej, RouteNode):
+                                f_acum += f[suc.nodej.route.id]
+
+                    for suc in successors_i:
+                        nodej = suc.nodej
 
-                        dis_pax = pax
+                        dis_pax = pax[nodei]
 
                         # arco de subida
                         if isinstance(nodei, StopNode):
                             if isinstance(nodej, RouteNode):
                                 # cambia la distribucion de pasajeros
                                 # aumentan las subidas
-                                f_acum = 0
-
-                                for suc in successors[origin][destination][nodei]:
-                                    f_acum += f[suc.nodej.route.id]
-
-                                dis_pax = pax * (f[nodej.route.id] / f_acum)
+                                dis_pax = dis_pax * (f[nodej.route.id] / f_acum)
 
                                 z[nodej.route.id][nodej.direction][nodei] += dis_pax
 
@@ -200,13 +248,7 @@ class Assignment:
                                 # aumentan las cargas por tramo
                                 loaded_section_route[nodei.route.id][nodei.direction][nodei.stop_node] += dis_pax
 
-                        # agregar nuevos elementos a paths, salvo que hayan llegado a destino
-                        if isinstance(nodej, StopNode) and nodej.city_node == destination:
-                            continue
-
-                        else:
-                            for suc in successors[origin][destination][nodej]:
-                                paths.append((nodej, suc.nodej, dis_pax))
+                        pax[nodej] += dis_pax
 
         for route_id in z:
             for direction in z[route_id]:
@@ -236,6 +278,41 @@ class Assignment:
 
         return z, v, loaded_section_route
 
+    @staticmethod
+    def get_topological_order(destination: CityNode, stops: List[StopNode], successors_od: list_suc) -> List[
+            ExtendedNode]:
+        """
+        to get nodes of the hyperpath of a OD pair in topological order, each node is after all nodes with an edge to
+        it. Nodes are reached from stops through successors, except successors of StopNodes in destination
+        :param destination: CityNode destination
+        :param stops: StopNodes in origin with trips
+        :param successors_od: dic[ExtendedNode] = List[ExtendedEdge] of the OD pair
+        :return: List[ExtendedNode]
+        """
+        order = []
+        visited = set()
+        for stop in stops:
+            if stop in visited:
+                continue
+            visited.add(stop)
+            stack = [(stop, iter(successors_od[stop]))]
+            while stack:
+                node, node_successors = stack[-1]
+                for suc in node_successors:
+                    nodej = suc.nodej
+                    if nodej not in visited:
+                        visited.add(nodej)
+                        if isinstance(nodej, StopNode) and nodej.city_node == destination:
+                            stack.append((nodej, iter([])))
+                        else:
+                            stack.append((nodej, iter(successors_od[nodej])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        order.reverse()
+        return order
+
     @staticmethod
     def str_boarding_alighting(z: dic_boarding, v: dic_alighting) -> str:
         """
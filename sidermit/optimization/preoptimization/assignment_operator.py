@@ -0,0 +1,477 @@
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from sidermit.optimization.preoptimization.extended_graph import ExtendedEdge, ExtendedNode, StopNode, RouteNode
+
+list_elemental_path = List[ExtendedNode]
+
+dic_hyperpaths = defaultdict(lambda: defaultdict(lambda: defaultdict(List[list_elemental_path])))
+dic_successors = defaultdict(lambda: defaultdict(lambda: defaultdict(List[ExtendedEdge])))
+dic_Vij = defaultdict(lambda: defaultdict(float))
+dic_assigment = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+dic_f = defaultdict(float)
+
+dic_boarding = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+dic_alighting = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+dic_load = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+
+
+class AssignmentOperator:
+
+    def __init__(self, Vij: dic_Vij, hyperpaths: dic_hyperpaths, successors: dic_successors,
+                 assignment: dic_assigment):
+        """
+        compiled form of Assignment.get_alighting_and_boarding for a fixed set of hyperpaths and assignment. Each node
+        of the hyperpath of a OD pair is a position in flat arrays and each (route_id, direction, stop) a slot of the
+        boarding, alighting and load arrays. Passengers are propagated by levels of the hyperpaths, where nodes of a
+        level only have predecessors in previous levels, so each evaluation is a few vectorized operations
+        :param Vij: dic[origin: CityNode][destination: CityNode] = vij [pax/hr]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
+        :param successors: dic[origin: CityNode][destination: CityNode] [ExtendedNode] = List[ExtendedEdge]
+        :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] =%V_OD
+        """
+        # List[(route_id, direction, stop: StopNode)] with a slot for each position of boarding, alighting and load
+        self.slots = []
+        slot_position = dict()
+        self.__slot_position = slot_position
+        # routes that give frequencies to the operator
+        self.route_ids = []
+        route_position = dict()
+
+        def get_slot(route_id, direction, stop_node):
+            key = (route_id, direction, stop_node)
+            position = slot_position.get(key)
+            if position is None:
+                position = len(self.slots)
+                slot_position[key] = position
+                self.slots.append(key)
+                if route_id not in route_position:
+                    route_position[route_id] = len(self.route_ids)
+                    self.route_ids.append(route_id)
+            return position
+
+        # passengers and elemental paths that enter to each node and level of the node in the hyperpath of its OD pair
+        injection = []
+        injection_paths = []
+        node_level = []
+        # List[(origin: CityNode, destination: CityNode, ExtendedEdge)] with edges between nodes of the hyperpath of
+        # each OD pair
+        self.edges = []
+        edge_nodei = []
+        edge_nodej = []
+        # slots of boarding, alighting and route edges, -1 in others edges
+        edge_boarding = []
+        edge_alighting = []
+        edge_route = []
+
+        for origin in hyperpaths:
+            for destination in hyperpaths[origin]:
+                # viajes del par OD
+                vod = Vij[origin][destination]
+                successors_od = successors[origin][destination]
+
+                # dic[ExtendedNode] = position of node
+                position = dict()
+                # edges of the OD pair, they are used to get levels of nodes
+                first_edge = len(edge_nodei)
+
+                for stop in hyperpaths[origin][destination]:
+                    # viajes de todas las rutas elementales que salen de esta parada
+                    vod_s = vod * assignment[origin][destination][stop] / 100
+
+                    if vod_s == 0:
+                        continue
+
+                    if stop in position:
+                        injection[position[stop]] += vod_s
+                        injection_paths[position[stop]] += 1
+                        continue
+
+                    position[stop] = len(injection)
+                    injection.append(vod_s)
+                    injection_paths.append(1)
+                    node_level.append(0)
+
+                    queue = [stop]
+                    while queue:
+                        nodei = queue.pop()
+
+                        # no se agregan arcos, los pasajeros llegaron a destino
+                        if isinstance(nodei, StopNode) and nodei.city_node == destination:
+                            continue
+
+                        for suc in successors_od[nodei]:
+                            nodej = suc.nodej
+                            if nodej not in position:
+                                position[nodej] = len(injection)
+                                injection.append(0)
+                                injection_paths.append(0)
+                                node_level.append(0)
+                                queue.append(nodej)
+
+                            boarding = alighting = route = -1
+                            # arco de subida
+                            if isinstance(nodei, StopNode) and isinstance(nodej, RouteNode):
+                                boarding = get_slot(nodej.route.id, nodej.direction, nodei)
+                            # arco de bajada
+                            if isinstance(nodei, RouteNode) and isinstance(nodej, StopNode):
+                                alighting = get_slot(nodei.route.id, nodei.direction, nodej)
+                            # arco de ruta
+                            if isinstance(nodei, RouteNode) and isinstance(nodej, RouteNode):
+                                route = get_slot(nodei.route.id, nodei.direction, nodei.stop_node)
+
+                            self.edges.append((origin, destination, suc))
+                            edge_nodei.append(position[nodei])
+                            edge_nodej.append(position[nodej])
+                            edge_boarding.append(boarding)
+                            edge_alighting.append(alighting)
+                            edge_route.append(route)
+
+                # level of a node is the longest number of edges from a node with passengers of the OD pair
+                in_degree = defaultdict(int)
+                out_edges = defaultdict(list)
+                for edge in range(first_edge, len(edge_nodei)):
+                    in_degree[edge_nodej[edge]] += 1
+                    out_edges[edge_nodei[edge]].append(edge)
+                queue = [node for node in position.values() if in_degree[node] == 0]
+                while queue:
+                    node = queue.pop()
+                    for edge in out_edges[node]:
+                        nodej = edge_nodej[edge]
+                        node_level[nodej] = max(node_level[nodej], node_level[node] + 1)
+                        in_degree[nodej] -= 1
+                        if in_degree[nodej] == 0:
+                            queue.append(nodej)
+
+        n_nodes = len(injection)
+        n_levels = max(node_level) + 1 if node_level else 0
+
+        # nodes are sorted by level, so each level is a range of positions
+        order = np.argsort(np.array(node_level, dtype=np.int64), kind="stable")
+        new_position = np.empty(n_nodes, dtype=np.int64)
+        new_position[order] = np.arange(n_nodes, dtype=np.int64)
+        self.__level_offsets = np.searchsorted(np.array(node_level, dtype=np.int64)[order],
+                                               np.arange(n_levels + 1)).tolist()
+        self.__injection = np.array(injection, dtype=float)[order]
+        self.__injection_paths = np.array(injection_paths, dtype=float)[order]
+
+        self.__edge_nodei = new_position[np.array(edge_nodei, dtype=np.int64)]
+        edge_nodej = new_position[np.array(edge_nodej, dtype=np.int64)]
+        self.__edge_nodej = edge_nodej
+
+        # edges that end in each level with the position of their last node in the level
+        self.__level_edges = []
+        self.__level_nodej = []
+        # sum of values of these edges in their last node, it is used with several frequencies at once
+        self.__level_matrix = []
+        for level in range(1, n_levels):
+            start = self.__level_offsets[level]
+            end = self.__level_offsets[level + 1]
+            edges = np.flatnonzero((edge_nodej >= start) & (edge_nodej < end))
+            self.__level_edges.append(edges)
+            self.__level_nodej.append(edge_nodej[edges] - start)
+            self.__level_matrix.append(csr_matrix(
+                (np.ones(len(edges)), (edge_nodej[edges] - start, np.arange(len(edges)))),
+                shape=(end - start, len(edges))))
+
+        # edges that start in each level and the sum of values of these edges in their first node, they are used to
+        # get derivatives from the last level to the first one
+        self.__level_out_edges = []
+        self.__level_out_matrix = []
+        for level in range(n_levels):
+            start = self.__level_offsets[level]
+            end = self.__level_offsets[level + 1]
+            edges = np.flatnonzero((self.__edge_nodei >= start) & (self.__edge_nodei < end))
+            self.__level_out_edges.append(edges)
+            self.__level_out_matrix.append(csr_matrix(
+                (np.ones(len(edges)), (self.__edge_nodei[edges] - start, np.arange(len(edges)))),
+                shape=(end - start, len(edges))))
+
+        # position in route_ids of the route of each slot
+        slot_route = np.array([route_position[route_id] for route_id, _, _ in self.slots], dtype=np.int64)
+        self.slot_route = slot_route
+
+        # boarding edges change the distribution of passengers with frequencies of routes in the same StopNode
+        edge_boarding = np.array(edge_boarding, dtype=np.int64)
+        self.boarding_edges = np.flatnonzero(edge_boarding != -1)
+        self.__boarding_slot = edge_boarding[self.boarding_edges]
+        self.__boarding_route = slot_route[self.__boarding_slot]
+        _, self.__boarding_stop = np.unique(self.__edge_nodei[self.boarding_edges], return_inverse=True)
+        self.__boarding_stop = self.__boarding_stop.reshape(-1)
+        n_boarding = len(self.boarding_edges)
+        # sum of values of boarding edges in each route and in each StopNode
+        self.__boarding_route_matrix = csr_matrix(
+            (np.ones(n_boarding), (self.__boarding_route, np.arange(n_boarding))),
+            shape=(len(self.route_ids), n_boarding))
+        n_stops = int(self.__boarding_stop.max()) + 1 if n_boarding else 0
+        self.__boarding_stop_matrix = csr_matrix(
+            (np.ones(n_boarding), (self.__boarding_stop, np.arange(n_boarding))), shape=(n_stops, n_boarding))
+
+        edge_alighting = np.array(edge_alighting, dtype=np.int64)
+        self.alighting_edges = np.flatnonzero(edge_alighting != -1)
+        self.__alighting_slot = edge_alighting[self.alighting_edges]
+
+        edge_route = np.array(edge_route, dtype=np.int64)
+        self.route_edges = np.flatnonzero(edge_route != -1)
+        self.__route_slot = edge_route[self.route_edges]
+
+        # sum of values of boarding, alighting and route edges in each slot
+        n_slots = len(self.slots)
+        self.__boarding_slot_matrix = csr_matrix(
+            (np.ones(n_boarding), (self.__boarding_slot, np.arange(n_boarding))), shape=(n_slots, n_boarding))
+        self.__alighting_slot_matrix = csr_matrix(
+            (np.ones(len(self.alighting_edges)), (self.__alighting_slot, np.arange(len(self.alighting_edges)))),
+            shape=(n_slots, len(self.alighting_edges)))
+        self.__route_slot_matrix = csr_matrix(
+            (np.ones(len(self.route_edges)), (self.__route_slot, np.arange(len(self.route_edges)))),
+            shape=(n_slots, len(self.route_edges)))
+
+        # slots with boarding, alighting and load in the order in which they are found
+        self.__z_slots = list(dict.fromkeys(self.__boarding_slot.tolist()))
+        self.__v_slots = list(dict.fromkeys(self.__alighting_slot.tolist()))
+        self.__load_slots = list(dict.fromkeys(self.__route_slot.tolist()))
+
+    def get_slot_position(self, route_id: str, direction: str, stop_node: StopNode) -> int:
+        """
+        to get position of a slot
+        :param route_id: route_id
+        :param direction: direction "I" or "R"
+        :param stop_node: StopNode
+        :return: position of the slot, -1 if nobody boards, alights or travels in the slot
+        """
+        return self.__slot_position.get((route_id, direction, stop_node), -1)
+
+    def get_frequencies(self, f: dic_f) -> np.ndarray:
+        """
+        to get frequencies of routes in the order of route_ids
+        :param f: dic[route_id] = frequency [veh/hr]
+        :return: np.ndarray with frequency [veh/hr] of each route
+        """
+        return np.array([f[route_id] for route_id in self.route_ids], dtype=float)
+
+    def get_edges_factor(self, f_routes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        to get proportion of passengers of the first node of each edge that use the edge. It is 1 except in boarding
+        edges, where passengers are distributed with frequencies of routes
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies. It can have a column for
+        each set of frequencies, then results have the same columns
+        :return: (np.ndarray with the proportion of each edge, np.ndarray with the sum of frequencies [veh/hr] of
+        routes in the StopNode of each boarding edge, in the order of boarding_edges)
+        """
+        f_boarding = f_routes[self.__boarding_route]
+        if f_routes.ndim == 1:
+            f_acum = np.bincount(self.__boarding_stop, weights=f_boarding)[self.__boarding_stop]
+        else:
+            f_acum = (self.__boarding_stop_matrix @ f_boarding)[self.__boarding_stop]
+        if not np.all(f_acum):
+            raise ZeroDivisionError("float division by zero, all routes of a stop in a hyperpath have frequency 0")
+
+        factor = np.ones((len(self.__edge_nodei),) + f_routes.shape[1:])
+        factor[self.boarding_edges] = f_boarding / f_acum
+        return factor, f_acum
+
+    def get_edges_paths(self) -> np.ndarray:
+        """
+        to get number of elemental paths that use each edge, it does not depend on frequencies
+        :return: np.ndarray with number of elemental paths of each edge
+        """
+        return self.get_edges_pax(np.ones(len(self.__edge_nodei)), self.__injection_paths)
+
+    def get_nodes_pax(self, factor: np.ndarray, injection: np.ndarray = None) -> np.ndarray:
+        """
+        to get passengers of each node
+        :param factor: np.ndarray with the proportion of passengers of each edge, see get_edges_factor. It can have a
+        column for each set of frequencies, then results have the same columns
+        :param injection: np.ndarray with passengers that enter to each node. Default value is None to use trips of
+        StopNodes in origin
+        :return: np.ndarray with pax [pax/hr] of each node
+        """
+        if injection is None:
+            injection = self.__injection
+        if factor.ndim == 1:
+            pax = injection.copy()
+            for level, (edges, nodej) in enumerate(zip(self.__level_edges, self.__level_nodej), 1):
+                start = self.__level_offsets[level]
+                end = self.__level_offsets[level + 1]
+                pax[start:end] += np.bincount(nodej, weights=factor[edges] * pax[self.__edge_nodei[edges]],
+                                              minlength=end - start)
+            return pax
+
+        pax = np.repeat(injection[:, np.newaxis], factor.shape[1], axis=1)
+        for level, (edges, matrix) in enumerate(zip(self.__level_edges, self.__level_matrix), 1):
+            start = self.__level_offsets[level]
+            end = self.__level_offsets[level + 1]
+            pax[start:end] += matrix @ (factor[edges] * pax[self.__edge_nodei[edges]])
+        return pax
+
+    def get_edges_pax(self, factor: np.ndarray, injection: np.ndarray = None,
+                      nodes_pax: np.ndarray = None) -> np.ndarray:
+        """
+        to get passengers of each edge
+        :param factor: np.ndarray with the proportion of passengers of each edge, see get_edges_factor
+        :param injection: np.ndarray with passengers that enter to each node. Default value is None to use trips of
+        StopNodes in origin
+        :param nodes_pax: np.ndarray with pax [pax/hr] of each node. Default value is None to get them with
+        get_nodes_pax
+        :return: np.ndarray with pax [pax/hr] of each edge
+        """
+        if nodes_pax is None:
+            nodes_pax = self.get_nodes_pax(factor, injection)
+        return factor * nodes_pax[self.__edge_nodei]
+
+    def get_frequencies_gradient(self, f_routes: np.ndarray, factor: np.ndarray, f_acum: np.ndarray,
+                                 nodes_pax: np.ndarray, edges_gradient: np.ndarray,
+                                 f_acum_gradient: np.ndarray = None) -> np.ndarray:
+        """
+        to get derivatives of a function of passengers of edges with respect to frequency of routes. Derivatives are
+        accumulated from the last level to the first one, so each edge also gets derivatives of edges that follow it
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies
+        :param factor: np.ndarray with the proportion of passengers of each edge, see get_edges_factor
+        :param f_acum: np.ndarray with the sum of frequencies of each boarding edge, see get_edges_factor
+        :param nodes_pax: np.ndarray with pax [pax/hr] of each node, see get_nodes_pax
+        :param edges_gradient: np.ndarray with derivative of the function with respect to pax of each edge. It can have
+        a column for each function to get derivatives of several functions at once
+        :param f_acum_gradient: np.ndarray with derivative of the function with respect to f_acum of each boarding
+        edge, with the same columns of edges_gradient. Default value is None if the function only depends on f_acum
+        through passengers
+        :return: np.ndarray with derivative of the function with respect to frequency of each route, with a column for
+        each function if edges_gradient has columns
+        """
+        columns = edges_gradient.ndim == 2
+        if not columns:
+            edges_gradient = edges_gradient[:, np.newaxis]
+            if f_acum_gradient is not None:
+                f_acum_gradient = f_acum_gradient[:, np.newaxis]
+
+        # derivative with respect to passengers of each node
+        nodes_gradient = np.zeros((len(nodes_pax), edges_gradient.shape[1]))
+        for level in range(len(self.__level_out_edges) - 1, -1, -1):
+            edges = self.__level_out_edges[level]
+            start = self.__level_offsets[level]
+            end = self.__level_offsets[level + 1]
+            nodes_gradient[start:end] += self.__level_out_matrix[level] @ (
+                    factor[edges][:, np.newaxis] * (edges_gradient[edges] + nodes_gradient[self.__edge_nodej[edges]]))
+
+        # boarding edges distribute passengers with factor = f_route / f_acum
+        boarding = self.boarding_edges
+        factor_gradient = nodes_pax[self.__edge_nodei[boarding]][:, np.newaxis] * (
+                edges_gradient[boarding] + nodes_gradient[self.__edge_nodej[boarding]])
+        f_boarding = f_routes[self.__boarding_route]
+        stop_gradient = -factor_gradient * (f_boarding / f_acum ** 2)[:, np.newaxis]
+        if f_acum_gradient is not None:
+            stop_gradient = stop_gradient + f_acum_gradient
+
+        gradient = self.__boarding_route_matrix @ (factor_gradient / f_acum[:, np.newaxis])
+        # f_acum is the sum of frequencies of all routes in the StopNode
+        stop_gradient = (self.__boarding_stop_matrix @ stop_gradient)[self.__boarding_stop]
+        gradient += self.__boarding_route_matrix @ stop_gradient
+
+        if not columns:
+            return gradient[:, 0]
+        return gradient
+
+    def get_flows(self, f: dic_f) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        to get boarding, alighting and load of each slot
+        :param f: dic[route_id] = frequency [veh/hr]
+        :return: (z, v, load) as np.ndarray with pax [pax/veh] for each slot, see slots. Values of routes with
+        frequency 0 are given in [pax/hr]
+        """
+        f_routes = self.get_frequencies(f)
+        factor, _ = self.get_edges_factor(f_routes)
+        return self.get_slots_values(self.get_edges_pax(factor), f_routes)
+
+    def get_slots_values(self, edges_pax: np.ndarray, f_routes: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        to get boarding, alighting and load of each slot from passengers of edges
+        :param edges_pax: np.ndarray with pax [pax/hr] of each edge, see get_edges_pax
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies. Both can have a column
+        for each set of frequencies, then results have the same columns
+        :return: (z, v, load), see get_flows
+        """
+        if edges_pax.ndim == 1:
+            n_slots = len(self.slots)
+            z = np.bincount(self.__boarding_slot, weights=edges_pax[self.boarding_edges], minlength=n_slots)
+            v = np.bincount(self.__alighting_slot, weights=edges_pax[self.alighting_edges], minlength=n_slots)
+            load = np.bincount(self.__route_slot, weights=edges_pax[self.route_edges], minlength=n_slots)
+        else:
+            z = self.__boarding_slot_matrix @ edges_pax[self.boarding_edges]
+            v = self.__alighting_slot_matrix @ edges_pax[self.alighting_edges]
+            load = self.__route_slot_matrix @ edges_pax[self.route_edges]
+
+        # pasajeros por vehiculo
+        f_slots = f_routes[self.slot_route]
+        not_zero = f_slots != 0
+        for values in (z, v, load):
+            values[not_zero] /= f_slots[not_zero]
+
+        return z, v, load
+
+    def get_slots_values_gradient(self, z: np.ndarray, v: np.ndarray, load: np.ndarray, f_routes: np.ndarray,
+                                  z_gradient: np.ndarray, v_gradient: np.ndarray,
+                                  load_gradient: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        to get derivatives of a function of boarding, alighting and load of slots with respect to pax of each edge and
+        frequency of routes, see get_slots_values
+        :param z: boarding of each slot [pax/veh]
+        :param v: alighting of each slot [pax/veh]
+        :param load: load of each slot [pax/veh]
+        :param f_routes: np.ndarray with frequency [veh/hr] of each route, see get_frequencies
+        :param z_gradient: derivative of the function with respect to boarding of each slot
+        :param v_gradient: derivative of the function with respect to alighting of each slot
+        :param load_gradient: derivative of the function with respect to load of each slot
+        :return: (derivative with respect to pax of each edge, derivative with respect to frequency of each route
+        because values of slots are divided by frequency). Derivatives of slots can have a column for each function,
+        then results have the same columns
+        """
+        columns = z_gradient.shape[1:]
+        f_slots = f_routes[self.slot_route]
+        not_zero = (f_slots != 0).reshape((-1,) + (1,) * len(columns))
+        divisor = np.where(not_zero, f_slots.reshape(not_zero.shape), 1)
+        z = z.reshape(not_zero.shape)
+        v = v.reshape(not_zero.shape)
+        load = load.reshape(not_zero.shape)
+
+        edges_gradient = np.zeros((len(self.__edge_nodei),) + columns)
+        edges_gradient[self.boarding_edges] += (z_gradient / divisor)[self.__boarding_slot]
+        edges_gradient[self.alighting_edges] += (v_gradient / divisor)[self.__alighting_slot]
+        edges_gradient[self.route_edges] += (load_gradient / divisor)[self.__route_slot]
+
+        slots_gradient = np.where(not_zero, -(z_gradient * z + v_gradient * v + load_gradient * load) / divisor, 0)
+        routes_gradient = np.zeros((len(self.route_ids),) + columns)
+        np.add.at(routes_gradient, self.slot_route, slots_gradient)
+        return edges_gradient, routes_gradient
+
+    def get_alighting_and_boarding(self, f: dic_f) -> (dic_boarding, dic_alighting, dic_load):
+        """
+        to get alighting and boarding for vehicle in each stop of all routes, see
+        Assignment.get_alighting_and_boarding
+        :param f: dic[route_id] = frequency [veh/hr]
+        :return: (z,v,loaded_section_route)
+        z = dic[route_id][direction][stop: StopNode] = pax [pax/veh],
+        v = dic[route_id][direction][stop: StopNode] = pax [pax/veh],
+        loaded_section_route = dic[route_id][direction][stop: StopNode] = pax [pax/veh]
+        """
+        z, v, load = self.get_flows(f)
+        return self.to_dict(z, self.__z_slots), self.to_dict(v, self.__v_slots), self.to_dict(load,
+                                                                                             self.__load_slots)
+
+    def to_dict(self, values: np.ndarray, slots: List[int] = None) -> defaultdict:
+        """
+        to get values of slots as a dictionary
+        :param values: np.ndarray with a value for each slot
+        :param slots: positions of slots to save. Default value is None to save all slots
+        :return: dic[route_id][direction][stop: StopNode] = value
+        """
+        if slots is None:
+            slots = range(len(self.slots))
+
+        values = values.tolist()
+        dic = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        for position in slots:
+            route_id, direction, stop_node = self.slots[position]
+            dic[route_id][direction][stop_node] = values[position]
+        return dic
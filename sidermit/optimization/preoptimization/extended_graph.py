@@ -2,6 +2,8 @@ from collections import defaultdict
 from enum import Enum
 from typing import List
 
+import numpy as np
+
 from sidermit.city import Graph, Node
 from sidermit.publictransportsystem import TransportMode, Route
 from sidermit.publictransportsystem.network import RouteType
@@ -60,7 +62,8 @@ class StopNode(ExtendedNode):
 
 
 class RouteNode(ExtendedNode):
-    def __init__(self, route_node_id, route_obj: Route, direction: str, stop_node: StopNode, previous=None):
+    def __init__(self, route_node_id, route_obj: Route, direction: str, stop_node: StopNode, previous=None,
+                 position: int = 0):
         """
         extended node with route information
         :param route_node_id: node id
@@ -68,12 +71,25 @@ class RouteNode(ExtendedNode):
         :param direction: "I" if RouteNode represents forward direction, "R" if RouteNode represents return direction
         :param stop_node: StopNode object associated
         :param previous: previous RouteNode in stop sequences of the route associated
+        :param position: position of the stop in stops_sequence_i of the route, see Route.stops_position_i. Default
+        value is 0
         """
         ExtendedNode.__init__(self, route_node_id)
         self.route = route_obj
         self.direction = direction
         self.stop_node = stop_node
         self.prev_route_node = previous
+        self.position = position
+
+    def get_direction(self, route_node) -> str:
+        """
+        to get direction of the route from this RouteNode to other RouteNode of the same route
+        :param route_node: RouteNode
+        :return: "I" if this RouteNode is before route_node in stops_sequence_i of the route, else "R"
+        """
+        if self.position < route_node.position:
+            return "I"
+        return "R"
 
 
 class ExtendedEdge:
@@ -107,9 +123,90 @@ class ExtendedEdgesType(Enum):
     ROUTE = 4
 
 
+class ExtendedNodesType(Enum):
+    """
+    extended nodes type. CITY to CityNode, STOP to StopNode and ROUTE to RouteNode
+    """
+    CITY = 1
+    STOP = 2
+    ROUTE = 3
+
+
 defaultdict_float = defaultdict(float)
 defaultdict2_route_node = defaultdict(lambda: defaultdict(List[RouteNode]))
 defaultdict2_route_direction = defaultdict(lambda: defaultdict(List[Route, str]))
+defaultdict2_edge_type = defaultdict(lambda: defaultdict(List[ExtendedEdge]))
+defaultdict_list_edge = defaultdict(List[ExtendedEdge])
+
+
+class CompiledExtendedGraph:
+
+    def __init__(self, extended_graph_nodes: defaultdict2_route_node, extended_graph_edges: List[ExtendedEdge]):
+        """
+        compiled form of the extended graph to run hyperpath and assignment kernels on arrays. Nodes and edges are
+        identified by integer ids, nodes are numbered in the order of extended graph nodes (each CityNode followed
+        by its StopNodes and their RouteNodes) and edges in the order of extended graph edges
+        :param extended_graph_nodes: dictionary: dic[CityNode][StopNode] = List[RouteNode]
+        :param extended_graph_edges: List[ExtendedEdge]
+        """
+        # id -> ExtendedNode and ExtendedNode -> id
+        self.nodes = []
+        self.node_id = dict()
+        # id of the CityNode associated to each node
+        node_city = []
+        node_type = []
+        for city_node in extended_graph_nodes:
+            city_node_id = len(self.nodes)
+            self.node_id[city_node] = city_node_id
+            self.nodes.append(city_node)
+            node_city.append(city_node_id)
+            node_type.append(ExtendedNodesType.CITY.value)
+            for stop_node in extended_graph_nodes[city_node]:
+                self.node_id[stop_node] = len(self.nodes)
+                self.nodes.append(stop_node)
+                node_city.append(city_node_id)
+                node_type.append(ExtendedNodesType.STOP.value)
+                for route_node in extended_graph_nodes[city_node][stop_node]:
+                    self.node_id[route_node] = len(self.nodes)
+                    self.nodes.append(route_node)
+                    node_city.append(city_node_id)
+                    node_type.append(ExtendedNodesType.ROUTE.value)
+
+        self.node_type = np.array(node_type, dtype=np.int8)
+        self.node_city = np.array(node_city, dtype=np.int64)
+
+        # id -> ExtendedEdge and ExtendedEdge -> id
+        self.edges = list(extended_graph_edges)
+        self.edge_id = dict()
+        for edge in self.edges:
+            self.edge_id[edge] = len(self.edge_id)
+
+        self.edge_nodei = np.array([self.node_id[edge.nodei] for edge in self.edges], dtype=np.int64)
+        self.edge_nodej = np.array([self.node_id[edge.nodej] for edge in self.edges], dtype=np.int64)
+        # edge time in hours
+        self.edge_t = np.array([edge.t for edge in self.edges], dtype=np.float64)
+        # edge frequency in [veh/hr]
+        self.edge_f = np.array([edge.f for edge in self.edges], dtype=np.float64)
+        # ExtendedEdgesType value of each edge
+        self.edge_type = np.array([edge.type.value for edge in self.edges], dtype=np.int8)
+
+        # edges that start in node i are out_edges[out_offsets[i]:out_offsets[i + 1]]
+        self.out_offsets, self.out_edges = self.build_csr(self.edge_nodei, len(self.nodes))
+        # edges that end in node j are in_edges[in_offsets[j]:in_offsets[j + 1]]
+        self.in_offsets, self.in_edges = self.build_csr(self.edge_nodej, len(self.nodes))
+
+    @staticmethod
+    def build_csr(edge_node: np.ndarray, n_nodes: int) -> (np.ndarray, np.ndarray):
+        """
+        to build compressed sparse row structure of edges grouped by a node
+        :param edge_node: node id of each edge used to group edges
+        :param n_nodes: number of nodes
+        :return: (offsets, edges). Edges of node i are edges[offsets[i]:offsets[i + 1]], in edge id order
+        """
+        offsets = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_node, minlength=n_nodes), out=offsets[1:])
+        edges = np.argsort(edge_node, kind="stable").astype(np.int64)
+        return offsets, edges
 
 
 class ExtendedGraph:
@@ -167,6 +264,51 @@ class ExtendedGraph:
         for edge in routes_edges:
             self.__extended_graph_edges.append(edge)
 
+        # edges grouped by the node where they end: dic[ExtendedNode][ExtendedEdgesType] = List[ExtendedEdge]
+        self.__incoming_edges = self.build_incoming_edges(self.__extended_graph_edges)
+        # edges grouped by the node where they start: dic[ExtendedNode][ExtendedEdgesType] = List[ExtendedEdge]
+        self.__outgoing_edges = self.build_outgoing_edges(self.__extended_graph_edges)
+        # boarding edges grouped by route: dic[route_id] = List[ExtendedEdge]
+        self.__route_boarding_edges = self.build_route_boarding_edges(self.__extended_graph_edges)
+        # edge between two nodes: dic[(ExtendedNode, ExtendedNode)] = ExtendedEdge
+        self.__edges_index = self.build_edges_index(self.__extended_graph_edges)
+
+        # compiled form of the extended graph, it is built when it is required
+        self.__compiled_graph = None
+
+    def __getstate__(self):
+        """
+        to pickle extended graph, dictionaries built with lambda functions can not be pickled. Nodes are saved as
+        plain dictionaries, edge indexes are built again when extended graph is unpickled and compiled graph when
+        it is required
+        :return: dictionary with nodes and edges of the extended graph
+        """
+        extended_graph_nodes = dict()
+        for city_node in self.__extended_graph_nodes:
+            extended_graph_nodes[city_node] = dict(self.__extended_graph_nodes[city_node])
+
+        return {"nodes": extended_graph_nodes, "edges": self.__extended_graph_edges}
+
+    def __setstate__(self, state):
+        """
+        to unpickle extended graph
+        :param state: dictionary with nodes and edges of the extended graph, see __getstate__
+        :return:
+        """
+        self.__extended_graph_nodes = defaultdict(lambda: defaultdict(list))
+        for city_node in state["nodes"]:
+            # CityNodes without StopNodes are kept
+            stop_nodes = self.__extended_graph_nodes[city_node]
+            for stop_node in state["nodes"][city_node]:
+                stop_nodes[stop_node] = state["nodes"][city_node][stop_node]
+
+        self.__extended_graph_edges = state["edges"]
+        self.__incoming_edges = self.build_incoming_edges(self.__extended_graph_edges)
+        self.__outgoing_edges = self.build_outgoing_edges(self.__extended_graph_edges)
+        self.__route_boarding_edges = self.build_route_boarding_edges(self.__extended_graph_edges)
+        self.__edges_index = self.build_edges_index(self.__extended_graph_edges)
+        self.__compiled_graph = None
+
     def __str__(self):
         """
         to print extended graph
@@ -177,22 +319,22 @@ class ExtendedGraph:
             line += "City node\n-Graph node name: {}\n".format(city_node.graph_node.name)
             for stop_node in self.__extended_graph_nodes[city_node]:
                 # information about access edge
-                for edge in self.__extended_graph_edges:
-                    if edge.nodei == city_node and edge.nodej == stop_node:
-                        line += "\tAccess edge\n\t-Access time: {:.2f} [min]\n".format(edge.t)
+                edge = self.get_edge(city_node, stop_node)
+                if edge is not None:
+                    line += "\tAccess edge\n\t-Access time: {:.2f} [min]\n".format(edge.t)
 
                 line += "\t\tStop node\n\t\t-Mode name: {}\n".format(stop_node.mode.name)
 
                 for route_node in self.__extended_graph_nodes[city_node][stop_node]:
                     # information about boarding edge
-                    for edge in self.__extended_graph_edges:
-                        if edge.nodei == stop_node and edge.nodej == route_node:
-                            line += "\t\t\tBoarding edge\n\t\t\t-Frequency: {:.2f} [veh/h]\n".format(edge.f)
+                    edge = self.get_edge(stop_node, route_node)
+                    if edge is not None:
+                        line += "\t\t\tBoarding edge\n\t\t\t-Frequency: {:.2f} [veh/h]\n".format(edge.f)
 
                     # information about boarding edge
-                    for edge in self.__extended_graph_edges:
-                        if edge.nodei == route_node and edge.nodej == stop_node:
-                            line += "\t\t\tAlighting edge\n\t\t\t-Penalty transfer: {:.2f} [min]\n".format(edge.t * 60)
+                    edge = self.get_edge(route_node, stop_node)
+                    if edge is not None:
+                        line += "\t\t\tAlighting edge\n\t\t\t-Penalty transfer: {:.2f} [min]\n".format(edge.t * 60)
 
                     # information about route node
                     if route_node.prev_route_node is None:
@@ -201,10 +343,9 @@ class ExtendedGraph:
                             route_node.direction, "no data", 0)
                     else:
                         t = 0
-                        for edge in self.__extended_graph_edges:
-                            if edge.nodei == route_node.prev_route_node and edge.nodej == route_node:
-                                t = edge.t
-                                break
+                        edge = self.get_edge(route_node.prev_route_node, route_node)
+                        if edge is not None:
+                            t = edge.t
                         line += "\t\t\t\tRoute node\n\t\t\t\t-Route_id: {}\n\t\t\t\t-Direction: {}\n\t\t\t\t-Previous stop: {}\n\t\t\t\t-Time to previous stop: {} [hrs]\n".format(
                             route_node.route.id,
                             route_node.direction,
@@ -226,6 +367,66 @@ class ExtendedGraph:
         """
         return self.__extended_graph_edges
 
+    def get_compiled_graph(self) -> CompiledExtendedGraph:
+        """
+        to get compiled form of the extended graph with integer ids and arrays
+        :return: CompiledExtendedGraph object
+        """
+        if self.__compiled_graph is None:
+            self.__compiled_graph = CompiledExtendedGraph(self.__extended_graph_nodes, self.__extended_graph_edges)
+        return self.__compiled_graph
+
+    def update_frequencies(self, frequency_routes: defaultdict_float) -> None:
+        """
+        to update frequency of boarding edges without building again the extended graph, edges are updated in place
+        :param frequency_routes: defauldict(float) with key: route_id and value: frequency [veh/hr] of the route_id
+        :return:
+        """
+        for route_id in self.__route_boarding_edges:
+            for edge in self.__route_boarding_edges[route_id]:
+                edge.f = frequency_routes[route_id] / edge.nodej.route.mode.d
+                if self.__compiled_graph is not None:
+                    self.__compiled_graph.edge_f[self.__compiled_graph.edge_id[edge]] = edge.f
+
+    def get_incoming_edges(self, node: ExtendedNode, edge_type: ExtendedEdgesType = None) -> List[ExtendedEdge]:
+        """
+        to get edges that end in a node
+        :param node: ExtendedNode
+        :param edge_type: ExtendedEdgesType to filter edges. Default value is None to get edges of all types
+        :return: List[ExtendedEdge], in the same order than in get_extended_graph_edges
+        """
+        if edge_type is not None:
+            return self.__incoming_edges[node][edge_type]
+
+        edges = []
+        for _type in ExtendedEdgesType:
+            edges.extend(self.__incoming_edges[node][_type])
+        return edges
+
+    def get_outgoing_edges(self, node: ExtendedNode, edge_type: ExtendedEdgesType = None) -> List[ExtendedEdge]:
+        """
+        to get edges that start in a node
+        :param node: ExtendedNode
+        :param edge_type: ExtendedEdgesType to filter edges. Default value is None to get edges of all types
+        :return: List[ExtendedEdge], in the same order than in get_extended_graph_edges
+        """
+        if edge_type is not None:
+            return self.__outgoing_edges[node][edge_type]
+
+        edges = []
+        for _type in ExtendedEdgesType:
+            edges.extend(self.__outgoing_edges[node][_type])
+        return edges
+
+    def get_edge(self, nodei: ExtendedNode, nodej: ExtendedNode) -> ExtendedEdge:
+        """
+        to get the edge between two nodes
+        :param nodei: ExtendedNode where the edge starts
+        :param nodej: ExtendedNode where the edge ends
+        :return: ExtendedEdge, None if there is not an edge between nodes
+        """
+        return self.__edges_index.get((nodei, nodej))
+
     @staticmethod
     def build_city_nodes(graph_obj: Graph) -> List[CityNode]:
         """
@@ -322,7 +523,8 @@ class ExtendedGraph:
                     if s.mode == mode and str(s.city_node.graph_node.id) == str(stop):
                         stop_node = s
                         break
-                route_node = RouteNode(len(route_nodes) + len(nodes), route, "I", stop_node, prev_route_node)
+                route_node = RouteNode(len(route_nodes) + len(nodes), route, "I", stop_node, prev_route_node,
+                                       route.stops_position_i.get(str(stop), 0))
                 prev_route_node = route_node
                 nodes.append(route_node)
             # add previous node_route in circular routes
@@ -351,7 +553,8 @@ class ExtendedGraph:
                     if s.mode == mode and str(s.city_node.graph_node.id) == str(stop):
                         stop_node = s
                         break
-                route_node = RouteNode(len(route_nodes) + len(nodes), route, "R", stop_node, prev_route_node)
+                route_node = RouteNode(len(route_nodes) + len(nodes), route, "R", stop_node, prev_route_node,
+                                       route.stops_position_i.get(str(stop), 0))
                 prev_route_node = route_node
                 nodes.append(route_node)
             # add previous node_route in circular routes
@@ -550,3 +753,52 @@ class ExtendedGraph:
                                     t, float('inf'), ExtendedEdgesType.ROUTE)
                 route_edges.append(edge)
         return route_edges
+
+    @staticmethod
+    def build_route_boarding_edges(extended_graph_edges: List[ExtendedEdge]) -> defaultdict_list_edge:
+        """
+        to build index of boarding edges of each route
+        :param extended_graph_edges: List[ExtendedEdge]
+        :return: dictionary: dic[route_id] = List[ExtendedEdge]
+        """
+        route_boarding_edges = defaultdict(list)
+        for edge in extended_graph_edges:
+            if edge.type == ExtendedEdgesType.BOARDING:
+                route_boarding_edges[edge.nodej.route.id].append(edge)
+        return route_boarding_edges
+
+    @staticmethod
+    def build_incoming_edges(extended_graph_edges: List[ExtendedEdge]) -> defaultdict2_edge_type:
+        """
+        to build index of edges that end in each node of the extended graph
+        :param extended_graph_edges: List[ExtendedEdge]
+        :return: dictionary: dic[ExtendedNode][ExtendedEdgesType] = List[ExtendedEdge]
+        """
+        incoming_edges = defaultdict(lambda: defaultdict(list))
+        for edge in extended_graph_edges:
+            incoming_edges[edge.nodej][edge.type].append(edge)
+        return incoming_edges
+
+    @staticmethod
+    def build_outgoing_edges(extended_graph_edges: List[ExtendedEdge]) -> defaultdict2_edge_type:
+        """
+        to build index of edges that start in each node of the extended graph
+        :param extended_graph_edges: List[ExtendedEdge]
+        :return: dictionary: dic[ExtendedNode][ExtendedEdgesType] = List[ExtendedEdge]
+        """
+        outgoing_edges = defaultdict(lambda: defaultdict(list))
+        for edge in extended_graph_edges:
+            outgoing_edges[edge.nodei][edge.type].append(edge)
+        return outgoing_edges
+
+    @staticmethod
+    def build_edges_index(extended_graph_edges: List[ExtendedEdge]) -> dict:
+        """
+        to build index of edges with the nodes where they start and end
+        :param extended_graph_edges: List[ExtendedEdge]
+        :return: dictionary: dic[(ExtendedNode, ExtendedNode)] = ExtendedEdge
+        """
+        edges_index = dict()
+        for edge in extended_graph_edges:
+            edges_index[(edge.nodei, edge.nodej)] = edge
+        return edges_index
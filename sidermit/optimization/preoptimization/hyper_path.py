@@ -1,12 +1,16 @@
-from collections import defaultdict
-from typing import List
+import heapq
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
 
 import networkx as nx
 from matplotlib import pyplot as plt
 
+from sidermit.city import Demand
 from sidermit.exceptions import *
 from sidermit.optimization.preoptimization import ExtendedGraph, CityNode, StopNode, RouteNode, ExtendedEdgesType, \
-    ExtendedEdge, ExtendedNode
+    ExtendedEdge, ExtendedNode, ExtendedNodesType
+from sidermit.optimization.preoptimization.hyperpaths_store import HyperpathsStore
 from sidermit.publictransportsystem import Passenger, TransportModeManager
 
 defaultdict2_float = defaultdict(lambda: defaultdict(float))
@@ -23,6 +27,89 @@ dic_frequency = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
 dic_Vij = defaultdict(lambda: defaultdict(float))
 
 
+class ElementalPaths:
+
+    def __init__(self, origin: CityNode, stop: StopNode, destination: CityNode, successors: list_suc):
+        """
+        elemental paths of a StopNode in origin. Only the successors graph is kept, elemental paths are built when
+        they are iterated
+        :param origin: CityNode origin
+        :param stop: StopNode in origin
+        :param destination: CityNode destination
+        :param successors: dic[ExtendedNode] = List[ExtendedEdge] of the OD pair
+        """
+        self.origin = origin
+        self.stop = stop
+        self.destination = destination
+        self.successors = successors
+        # number of elemental paths, it is calculated when it is required
+        self.__n_paths = None
+
+    def __iter__(self):
+        """
+        to iterate elemental paths in the order of successors lists
+        :return: generator of List[ExtendedNode], each one starts in origin and ends in destination
+        """
+        path = [self.origin, self.stop]
+        # stack with the iterator of successors of each node in path, except origin
+        stack = [iter(self.successors.get(self.stop, []))]
+
+        while stack:
+            suc = next(stack[-1], None)
+            if suc is None:
+                stack.pop()
+                path.pop()
+                continue
+            node = suc.nodej
+            path.append(node)
+            if node == self.destination:
+                yield list(path)
+                path.pop()
+            else:
+                stack.append(iter(self.successors.get(node, [])))
+
+    def __len__(self) -> int:
+        """
+        to get number of elemental paths without building them
+        :return: number of elemental paths
+        """
+        if self.__n_paths is None:
+            # dic[ExtendedNode] = number of paths from the node to destination
+            n_paths = {self.destination: 1}
+
+            # nodes are counted after all their successors (post order)
+            stack = [(self.stop, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if node in n_paths:
+                    continue
+                if expanded:
+                    n_paths[node] = sum(n_paths[suc.nodej] for suc in self.successors.get(node, []))
+                    continue
+                stack.append((node, True))
+                for suc in self.successors.get(node, []):
+                    if suc.nodej not in n_paths:
+                        stack.append((suc.nodej, False))
+
+            self.__n_paths = n_paths[self.stop]
+        return self.__n_paths
+
+    def __eq__(self, other) -> bool:
+        """
+        elemental paths are equals if they have the same paths in the same order
+        :param other: ElementalPaths or List[List[ExtendedNode]]
+        :return: bool
+        """
+        if isinstance(other, (ElementalPaths, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "ElementalPaths({})".format(list(self))
+
+
 class Hyperpath:
 
     def __init__(self, extended_graph_obj: ExtendedGraph, passenger_obj: Passenger):
@@ -34,6 +121,42 @@ class Hyperpath:
         self.extended_graph_obj = extended_graph_obj
         self.passenger_obj = passenger_obj
 
+        # compiled form of the extended graph, node ids are used to break ties between nodes with the same label
+        self.__compiled_graph = extended_graph_obj.get_compiled_graph()
+        # position of each node in the extended graph
+        self.__position = self.__compiled_graph.node_id
+        # nodes in position order
+        self.__nodes = self.__compiled_graph.nodes
+
+        # compiled graph as lists, elements of a list are faster to get than elements of a numpy array. Only edge
+        # frequencies change, see update_frequencies
+        self.__in_offsets = self.__compiled_graph.in_offsets.tolist()
+        self.__in_edges = self.__compiled_graph.in_edges.tolist()
+        self.__edge_nodei = self.__compiled_graph.edge_nodei.tolist()
+        self.__edge_nodej = self.__compiled_graph.edge_nodej.tolist()
+        self.__edge_t = self.__compiled_graph.edge_t.tolist()
+        self.__edge_f = self.__compiled_graph.edge_f.tolist()
+        self.__edge_type = self.__compiled_graph.edge_type.tolist()
+        self.__node_city = self.__compiled_graph.node_city.tolist()
+        self.__node_type = self.__compiled_graph.node_type.tolist()
+
+        # work buffers of the hyperpath algorithm, they are reused between OD pairs. Only nodes in touched are
+        # different from their initial values
+        n_nodes = len(self.__nodes)
+        self.__labels = [float('inf')] * n_nodes
+        self.__labels_inf = [float('inf')] * n_nodes
+        self.__frequencies = [0] * n_nodes
+        self.__successor_inf = [-1] * n_nodes
+        self.__settled = bytearray(n_nodes)
+        self.__touched = []
+
+    def update_frequencies(self) -> None:
+        """
+        to get frequencies of edges again after they are updated with ExtendedGraph.update_frequencies
+        :return:
+        """
+        self.__edge_f = self.__compiled_graph.edge_f.tolist()
+
     def network_validator(self, OD_matrix: defaultdict2_float) -> bool:
         """
         to check if Transport network is well defined for all pairs OD with trips. This must has at least a route for
@@ -42,30 +165,41 @@ class Hyperpath:
         :return: True if all OD pairs with trips have at least one path between origin and destination. False if not.
         """
         nodes = self.extended_graph_obj.get_extended_graph_nodes()
+
+        # dic[str(graph_node_id)] = CityNode
+        city_nodes = defaultdict(None)
+        for city_node in nodes:
+            city_nodes[str(city_node.graph_node.id)] = city_node
+
+        # dic[destination] = nodes with a path to the destination
+        reachable_nodes = dict()
+
         # to check a path between all OD pair with trips
+        disconnected_od = []
         for origin_id in OD_matrix:
             for destination_id in OD_matrix[origin_id]:
                 vij = OD_matrix[origin_id][destination_id]
                 if vij != 0:
-                    origin = None
-                    destination = None
-                    for city_node in nodes:
-                        if str(origin_id) == str(city_node.graph_node.id):
-                            origin = city_node
-                        if str(destination_id) == str(city_node.graph_node.id):
-                            destination = city_node
-
-                    _, label, _ = self.build_hyperpath_graph(origin, destination)
+                    origin = city_nodes.get(str(origin_id))
+                    destination = city_nodes.get(str(destination_id))
 
-                    # if there is a stop with a label != infinity, you can get from the origin to the destination
+                    # if there is a StopNode in origin with a path to the destination, you can get from the origin to
+                    # the destination. Hyperpath algorithm does not use the CityNode of origin, but a path through it
+                    # has a sub path from a StopNode in origin that does not use it
                     conection = False
-                    for stop in nodes[origin]:
-                        if label[stop] != float('inf'):
-                            conection = True
-                            break
+                    if origin is not None and destination is not None and origin != destination:
+                        if destination not in reachable_nodes:
+                            reachable_nodes[destination] = self.get_reachable_nodes(destination)
+                        for stop in nodes[origin]:
+                            if stop in reachable_nodes[destination]:
+                                conection = True
+                                break
                     if conection is False:
-                        raise TransportNetworkException(
-                            "par OD {}-{} without connection".format(origin_id, destination_id))
+                        disconnected_od.append("{}-{}".format(origin_id, destination_id))
+
+        if disconnected_od:
+            raise TransportNetworkException("par OD {} without connection".format(", ".join(disconnected_od)))
+
         # to check network must has until 2 TransportMode
         list_mode = []
         for city_node in nodes:
@@ -80,177 +214,308 @@ class Hyperpath:
 
         return mode_manager.is_valid_to_assignment_step()
 
-    def build_hyperpath_graph(self, node_city_origin: CityNode, node_city_destination: CityNode) -> (
-            list_suc, list_lab, list_f):
+    def get_reachable_nodes(self, node_city_destination: CityNode) -> set:
+        """
+        to get nodes with at least one path to the destination in the extended graph, with a reverse breadth first
+        search from the destination. Boarding edges without frequency are not considered
+        :param node_city_destination: destination CityNode
+        :return: Set[ExtendedNode]
+        """
+        reachable_nodes = {node_city_destination}
+        queue = deque([node_city_destination])
+
+        while queue:
+            j = queue.popleft()
+            for edge in self.extended_graph_obj.get_incoming_edges(j):
+                if edge.type == ExtendedEdgesType.BOARDING and edge.f == 0:
+                    continue
+                if edge.nodei not in reachable_nodes:
+                    reachable_nodes.add(edge.nodei)
+                    queue.append(edge.nodei)
+
+        return reachable_nodes
+
+    def build_hyperpath_graph(self, node_city_origin: CityNode, node_city_destination: CityNode,
+                              early_exit: bool = False) -> (list_suc, list_lab, list_f):
         """
         build the entire graph to connect the origin and destination with the hyperpath algorithm
-        :param node_city_origin: origin CityNode
+        :param node_city_origin: origin CityNode. If it is None, access edges are not removed in any CityNode and the
+        result is the hyperpath graph of the destination for all origins (destination tree)
         :param node_city_destination: destination CityNode
-        :return: successors , label, frequencies
+        :param early_exit: if it is True, the algorithm stops when all StopNodes in origin are processed. Labels,
+        successors and frequencies of nodes in hyperpaths of StopNodes in origin are the same, but other nodes could
+        be not processed. Default value is False to process the entire graph
+        :return: successors , label, frequencies. Only processed nodes are saved, other nodes have label infinity, no
+        successors and frequency 0
         """
 
-        nodes = self.extended_graph_obj.get_extended_graph_nodes()
-        edges = self.extended_graph_obj.get_extended_graph_edges()
+        graph = self.__compiled_graph
+        nodes = graph.nodes
+        edges = graph.edges
+
+        in_offsets = self.__in_offsets
+        in_edges = self.__in_edges
+        edge_nodei = self.__edge_nodei
+        edge_nodej = self.__edge_nodej
+        edge_t = self.__edge_t
+        edge_f = self.__edge_f
+        edge_type = self.__edge_type
+        node_city = self.__node_city
+        node_type = self.__node_type
+
+        stop = ExtendedNodesType.STOP.value
+        access = ExtendedEdgesType.ACCESS.value
+        alighting = ExtendedEdgesType.ALIGHTING.value
+        inf = float('inf')
+
+        # -1 if origin or destination are not in the extended graph
+        origin = graph.node_id.get(node_city_origin, -1)
+        destination = graph.node_id.get(node_city_destination, -1)
 
         # we initialize node labels at infinity except for the destination with label 0
-        labels = defaultdict(float)
-        labels_inf = defaultdict(float)
-        # successors will be initialized empty
+        labels = self.__labels
+        labels_inf = self.__labels_inf
+        # successors will be initialized empty, dic[node_id] = List[edge_id]
         successor = defaultdict(list)
-        successor_inf = defaultdict(None)
+        successor_inf = self.__successor_inf
         # frequency will be initialized to zero
-        frequencies = defaultdict(float)
-        # list of processed nodes (with calculated strategy)
-        S = []
-
-        # we initialize parameters
-        # number of nodes in the extended graph
-        n_nodes = 0
-        for city_node in nodes:
-            if city_node == node_city_destination:
-                labels[city_node] = 0
-                labels_inf[city_node] = 0
-                frequencies[city_node] = 0
-                n_nodes = n_nodes + 1
-            else:
-                labels[city_node] = float('inf')
-                labels_inf[city_node] = float('inf')
-                frequencies[city_node] = 0
-                n_nodes = n_nodes + 1
-            for stop_node in nodes[city_node]:
-                labels[stop_node] = float('inf')
-                labels_inf[stop_node] = float('inf')
-                frequencies[stop_node] = 0
-                n_nodes = n_nodes + 1
-                for route_node in nodes[city_node][stop_node]:
-                    labels[route_node] = float('inf')
-                    labels_inf[route_node] = float('inf')
-                    frequencies[route_node] = 0
-                    n_nodes = n_nodes + 1
-
-        # while there are nodes that have not been processed
-        while len(S) != n_nodes:
+        frequencies = self.__frequencies
+        # bitmap of processed nodes (with calculated strategy)
+        S = self.__settled
+        # only nodes touched by the previous run have to be initialized again
+        touched = self.__touched
+        for i in touched:
+            labels[i] = inf
+            labels_inf[i] = inf
+            successor_inf[i] = -1
+            frequencies[i] = 0
+            S[i] = 0
+        touched.clear()
+
+        # binary heap with tuples (label, node_id), node id is used to break ties between nodes with the same label.
+        # When a label decreases a new tuple is pushed and the previous one is discarded when it is popped (lazy
+        # decrease-key)
+        heap = []
+        if destination != -1:
+            labels[destination] = 0
+            labels_inf[destination] = 0
+            heap.append((0, destination))
+            touched.append(destination)
+
+        pa = self.passenger_obj.pa
+        pv = self.passenger_obj.pv
+        pw = self.passenger_obj.pw
+
+        # number of StopNodes in origin that have not been processed
+        origin_stops = 0
+        if early_exit and origin != -1:
+            origin_stops = len(self.extended_graph_obj.get_extended_graph_nodes()[node_city_origin])
+
+        # while there are nodes with finite label that have not been processed
+        while heap:
             # we find node with minimum label and that does not belong to S
-            min_label_node = None
-            min_label = float('inf')
-            for node in labels:
-                if node not in S:
-                    if min(labels[node], labels_inf[node]) < min_label:
-                        min_label = min(labels[node], labels_inf[node])
-                        min_label_node = node
-            # node to be processed, initially equals destination
-            j = min_label_node
+            min_label, j = heapq.heappop(heap)
+            label_j = min(labels[j], labels_inf[j])
+            if S[j] or min_label != label_j:
+                continue
             # update S
-            S.append(j)
-            # we must find all edges that end in j and whose beginning is not in S
-            edge_j = []
-            for edge in edges:
-                # we will remove the edges of access to the CityNode of origin
-                # because each StopNode in origin must have its own hyperpath
-                if edge.nodei == node_city_origin:
-                    continue
-                if edge.nodej == node_city_origin:
+            S[j] = 1
+            # strategies of StopNodes in origin only use nodes processed before them
+            if origin_stops and node_city[j] == origin and node_type[j] == stop:
+                origin_stops -= 1
+                if origin_stops == 0:
+                    break
+            # we will remove the edges of access to the CityNode of origin
+            # because each StopNode in origin must have its own hyperpath
+            if j == origin:
+                continue
+
+            # for all edges that end in j and whose beginning is not in S we update the label of the origin node as:
+            # labeli = labelj + time_arco ij
+            for edge in in_edges[in_offsets[j]:in_offsets[j + 1]]:
+                i = edge_nodei[edge]
+                if i == origin or S[i]:
                     continue
-                if edge.nodei not in S and edge.nodej == j:
-                    edge_j.append(edge)
 
-            # for edges we update the label of the origin node as: labeli = labelj + time_arco ij
-            for edge in edge_j:
                 # not to consider transfer penalty at origin and include a penalty of access time
-                edge_t = edge.t
-                if edge.type == ExtendedEdgesType.ALIGHTING:
-                    if edge.nodej.city_node == node_city_destination:
-                        edge_t = 0
-                if edge.type == ExtendedEdgesType.ACCESS:
-                    edge_t = edge.t * self.passenger_obj.pa / self.passenger_obj.pv
+                t = edge_t[edge]
+                if edge_type[edge] == alighting:
+                    if node_city[j] == destination:
+                        t = 0
+                elif edge_type[edge] == access:
+                    t = t * pa / pv
 
                 # equivalent to ~t_a
-                t_i = edge_t + min(labels[j], labels_inf[j])
-                i = edge.nodei
+                t_i = t + label_j
+                f = edge_f[edge]
+                # label of node i before being updated
+                label_i = min(labels[i], labels_inf[i])
 
                 # for all types of edges except boarding
-                if edge.f == float('inf') and t_i < labels_inf[i]:
+                if f == inf and t_i < labels_inf[i]:
                     successor_inf[i] = edge
                     labels_inf[i] = t_i
 
                 # for  boarding edges
-                if edge.f < float('inf') and t_i < labels[i]:
-                    theta = i.mode.theta
-
+                if f < inf and t_i < labels[i]:
                     # initial case
-                    if frequencies[i] == 0 and labels[i] == float('inf') and edge.f != 0:
-                        # print(edge.type)
+                    if frequencies[i] == 0 and labels[i] == inf and f != 0:
                         successor[i].append(edge)
-                        labels[i] = (theta * self.passenger_obj.pw / self.passenger_obj.pv + edge.f * t_i) / edge.f
-                        frequencies[i] = frequencies[i] + edge.f
+                        labels[i] = (nodes[i].mode.theta * pw / pv + f * t_i) / f
+                        frequencies[i] = frequencies[i] + f
                     # previously assigned label
                     else:
-                        if edge.f != 0:
+                        if f != 0:
                             successor[i].append(edge)
-                            labels[i] = (frequencies[i] * labels[i] + edge.f * t_i) / (frequencies[i] + edge.f)
-                            frequencies[i] = frequencies[i] + edge.f
+                            labels[i] = (frequencies[i] * labels[i] + f * t_i) / (frequencies[i] + f)
+                            frequencies[i] = frequencies[i] + f
 
                 # we verify that all the successors of i remain optimal
-                for edge_b in successor[i]:
-                    if edge_b == edge:
-                        continue
-                    # not to consider transfer penalty at origin and include a penalty of access time
-                    edge_b_t = edge_b.t
-                    if edge_b.type == ExtendedEdgesType.ALIGHTING:
-                        if edge.nodej.city_node == node_city_destination:
-                            edge_b_t = 0
-                    if edge_b.type == ExtendedEdgesType.ACCESS:
-                        edge_b_t = edge_b.t * self.passenger_obj.pa / self.passenger_obj.pv
+                successor_i = successor.get(i)
+                if successor_i:
+                    for edge_b in successor_i:
+                        if edge_b == edge:
+                            continue
+                        # not to consider transfer penalty at origin and include a penalty of access time
+                        t_b = edge_t[edge_b]
+                        if edge_type[edge_b] == alighting:
+                            if node_city[j] == destination:
+                                t_b = 0
+                        elif edge_type[edge_b] == access:
+                            t_b = t_b * pa / pv
+
+                        # equivalent to ~t_b
+                        t_ib = min(labels[edge_nodej[edge_b]], labels_inf[edge_nodej[edge_b]]) + t_b
+
+                        # remove sub optimal edge in the successors list
+                        if t_ib >= labels[i]:
+                            successor_i.remove(edge_b)
+                            f_b = edge_f[edge_b]
+                            labels[i] = (frequencies[i] * labels[i] - f_b * t_ib) / (frequencies[i] - f_b)
+                            frequencies[i] = frequencies[i] - f_b
+
+                # node i gets a new tuple in the heap if its label was improved
+                if min(labels[i], labels_inf[i]) < label_i:
+                    heapq.heappush(heap, (min(labels[i], labels_inf[i]), i))
+                    # values of a node are only changed when its label gets finite or it already had a finite label
+                    if label_i == inf:
+                        touched.append(i)
+
+        # we reduce successor lists and labels to a single list, only processed nodes are kept and other nodes have
+        # label infinity, no successors and frequency 0
+        successors = defaultdict(list)
+        label = defaultdict(lambda: float('inf'))
+        frequency = defaultdict(float)
+
+        for i in touched:
+            if not S[i]:
+                continue
+            node = nodes[i]
+            if labels[i] < labels_inf[i]:
+                label[node] = labels[i]
+                if successor.get(i):
+                    successors[node] = [edges[edge] for edge in successor[i]]
+            else:
+                label[node] = labels_inf[i]
+                if successor_inf[i] != -1:
+                    successors[node] = [edges[successor_inf[i]]]
+            # labels of StopNodes in origin include a penalty of access time
+            if node_city[i] == origin and node_type[i] == stop:
+                label[node] = label[node] + node.mode.tat / 60 * pa / pv
+            frequency[node] = frequencies[i]
+
+        return successors, label, frequency
+
+    def build_hyperpath_graph_from_tree(self, node_city_origin: CityNode, node_city_destination: CityNode,
+                                        hyperpath_tree: (list_suc, list_lab, list_f)) -> (list_suc, list_lab, list_f):
+        """
+        to get the graph that connects the origin and destination from the destination tree, it is the hyperpath graph
+        built with build_hyperpath_graph(None, node_city_destination). Only strategies of StopNodes in origin are
+        built again, without access edges to the CityNode of origin. If a strategy goes back to the origin, the
+        hyperpath graph of the OD pair is built with build_hyperpath_graph
+        :param node_city_origin: origin CityNode
+        :param node_city_destination: destination CityNode
+        :param hyperpath_tree: (successors, label, frequencies) of the destination tree
+        :return: successors , label, frequencies
+        """
+        successors_tree, label_tree, frequencies_tree = hyperpath_tree
 
-                    # equivalent to ~t_b
-                    t_ib = min(labels[edge_b.nodej], labels_inf[edge_b.nodej]) + edge_b_t
+        nodes = self.extended_graph_obj.get_extended_graph_nodes()
 
-                    # remove sub optimal edge in the successors list
-                    if t_ib >= labels[i]:
-                        successor[i].remove(edge_b)
-                        labels[i] = (frequencies[i] * labels[i] - edge_b.f * t_ib) / (frequencies[i] - edge_b.f)
-                        frequencies[i] = frequencies[i] - edge_b.f
+        successors = defaultdict(list, successors_tree)
+        label = label_tree.copy()
+        frequencies = defaultdict(float, frequencies_tree)
+
+        # CityNode of origin is not connected to the hyperpath graph of the OD pair
+        successors.pop(node_city_origin, None)
+        label[node_city_origin] = float('inf')
+        frequencies[node_city_origin] = 0
+
+        for stop_node in nodes[node_city_origin]:
+            theta = stop_node.mode.theta
+            label_stop = float('inf')
+            frequency_stop = 0
+            successor = []
+
+            # boarding edges are processed in the same order than build_hyperpath_graph, it is the order in which
+            # their RouteNodes are processed, until the StopNode is processed
+            boarding_edges = sorted(self.extended_graph_obj.get_outgoing_edges(stop_node, ExtendedEdgesType.BOARDING),
+                                    key=lambda e: (label_tree[e.nodej], self.__position[e.nodej]))
+            for edge in boarding_edges:
+                if (label_tree[edge.nodej], self.__position[edge.nodej]) >= (label_stop,
+                                                                              self.__position[stop_node]):
+                    break
 
-        # we reduce successor lists and labels to a single list
-        successors = defaultdict(list)
-        label = defaultdict(float)
+                t_i = edge.t + label_tree[edge.nodej]
 
-        for city_node in nodes:
-            if labels[city_node] < labels_inf[city_node]:
-                label[city_node] = labels[city_node]
-                for suc in successor[city_node]:
-                    successors[city_node].append(suc)
-            else:
-                label[city_node] = labels_inf[city_node]
-
-                if successor_inf.get(city_node):
-                    successors[city_node].append(successor_inf[city_node])
-
-            for stop_node in nodes[city_node]:
-                if labels[stop_node] < labels_inf[stop_node]:
-                    label[stop_node] = labels[stop_node]
-                    if city_node == node_city_origin:
-                        label[stop_node] = labels[
-                                               stop_node] + stop_node.mode.tat / 60 * self.passenger_obj.pa / self.passenger_obj.pv
-                    for suc in successor[stop_node]:
-                        successors[stop_node].append(suc)
-                else:
-                    label[stop_node] = labels_inf[stop_node]
-                    if city_node == node_city_origin:
-                        label[stop_node] = labels_inf[
-                                               stop_node] + stop_node.mode.tat / 60 * self.passenger_obj.pa / self.passenger_obj.pv
-
-                    if successor_inf.get(stop_node):
-                        successors[stop_node].append(successor_inf[stop_node])
-                for route_node in nodes[city_node][stop_node]:
-                    if labels[route_node] < labels_inf[route_node]:
-                        label[route_node] = labels[route_node]
-                        for suc in successor[route_node]:
-                            successors[route_node].append(suc)
+                if t_i < label_stop:
+                    # initial case
+                    if frequency_stop == 0 and label_stop == float('inf') and edge.f != 0:
+                        successor.append(edge)
+                        label_stop = (theta * self.passenger_obj.pw / self.passenger_obj.pv + edge.f * t_i) / edge.f
+                        frequency_stop = frequency_stop + edge.f
+                    # previously assigned label
                     else:
-                        label[route_node] = labels_inf[route_node]
-                        if successor_inf.get(route_node):
-                            successors[route_node].append(successor_inf[route_node])
+                        if edge.f != 0:
+                            successor.append(edge)
+                            label_stop = (frequency_stop * label_stop + edge.f * t_i) / (frequency_stop + edge.f)
+                            frequency_stop = frequency_stop + edge.f
+
+                # we verify that all the successors of the StopNode remain optimal
+                for edge_b in successor:
+                    if edge_b == edge:
+                        continue
+                    t_ib = label_tree[edge_b.nodej] + edge_b.t
+
+                    # remove sub optimal edge in the successors list
+                    if t_ib >= label_stop:
+                        successor.remove(edge_b)
+                        label_stop = (frequency_stop * label_stop - edge_b.f * t_ib) / (frequency_stop - edge_b.f)
+                        frequency_stop = frequency_stop - edge_b.f
+
+            # labels of StopNodes in origin include a penalty of access time
+            label[stop_node] = label_stop + stop_node.mode.tat / 60 * self.passenger_obj.pa / self.passenger_obj.pv
+            frequencies[stop_node] = frequency_stop
+            if successor:
+                successors[stop_node] = successor
+            else:
+                successors.pop(stop_node, None)
+
+        # strategies of the destination tree are valid while they do not go back to the origin
+        visited = set()
+        queue = []
+        for stop_node in nodes[node_city_origin]:
+            for suc in successors[stop_node]:
+                queue.append(suc.nodej)
+        while queue:
+            node = queue.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+            if node == node_city_origin or node in nodes[node_city_origin]:
+                return self.build_hyperpath_graph(node_city_origin, node_city_destination)
+            for suc in successors_tree[node]:
+                queue.append(suc.nodej)
 
         return successors, label, frequencies
 
@@ -307,59 +572,38 @@ class Hyperpath:
                     label[node], line_successor, line_frequency)
         return line
 
-    def get_hyperpath_OD(self, origin: CityNode, destination: CityNode) -> (
-            defaultdict_elemental_path, list_lab, list_suc):
+    def get_hyperpath_OD(self, origin: CityNode, destination: CityNode,
+                         hyperpath_tree: (list_suc, list_lab, list_f) = None, early_exit: bool = False) -> (
+            defaultdict_elemental_path, list_lab, list_suc, list_f):
         """
         to get all elemental path for each StopNode in Origin
         :param origin: CityNode origin
         :param destination: CityNode destination
-        :return: (Dic[TransportMode] = List[List[ExtendedNodes]], dic[ExtendedNode] = Label, dic[ExtendedNode] =
-        List[ExtendedEdge]). Each List[ExtendedNodes] represent a elemental path to connect origin and destination.
+        :param hyperpath_tree: (successors, label, frequencies) of the destination tree, built with
+        build_hyperpath_graph(None, destination). Default value is None to run hyperpath algorithm for the OD pair
+        :param early_exit: if it is True, hyperpath algorithm for the OD pair stops when all StopNodes in origin are
+        processed, values of nodes out of their hyperpaths could be different. Default value is False
+        :return: (hyperpaths_od, label, successors, frequencies) as (Dic[StopNode] = ElementalPaths,
+        dic[ExtendedNode] = Label, dic[ExtendedNode] = List[ExtendedEdge], dic[ExtendedNode] = frequency [veh/hr]).
+        ElementalPaths gives each elemental path to connect origin and destination as List[ExtendedNodes].
         List[ExtendedEdge] represent all successors edge for each ExtendedNode.
         """
         # we run hyperpath algorithm
-        successors, label, frequencies = self.build_hyperpath_graph(origin, destination)
+        if hyperpath_tree is None:
+            successors, label, frequencies = self.build_hyperpath_graph(origin, destination, early_exit)
+        else:
+            successors, label, frequencies = self.build_hyperpath_graph_from_tree(origin, destination, hyperpath_tree)
 
         nodes = self.extended_graph_obj.get_extended_graph_nodes()
 
-        # dictionary with key: TransportMode and value all elemental path associated
+        # dictionary with key: StopNode and value all elemental path associated
         hyperpaths_od = defaultdict(list)
 
-        # for each StopNode in Origin
+        # for each StopNode in Origin with at least one elemental path
         for stop in nodes[origin]:
-            # hyperpath in the StopNode
-            hyperpath_stop = [[origin, stop]]
-            # we initialize hyperpath
-
-            while True:
-                # stop condition that each elemental path has reached the destination
-                end = True
-                for path in hyperpath_stop:
-                    # there is a elemental path that has not reached the destination
-                    if path[len(path) - 1] != destination:
-                        end = False
-                        break
-                if end:
-                    break
-
-                new_hyperpath_stop = []
-                # we add successors of those paths that have not reached the destination
-                for path in hyperpath_stop:
-                    # elemental path that has not reached the destination
-                    if path[len(path) - 1] != destination:
-                        # we add new elemental path as successors have the last node of the path analyzed
-                        for suc in successors[path[len(path) - 1]]:
-                            new_path = []
-                            new_path.extend(path)
-                            new_path.append(suc.nodej)
-                            new_hyperpath_stop.append(new_path)
-                    # path that arrived at destination
-                    else:
-                        new_hyperpath_stop.append(path)
-                hyperpath_stop = new_hyperpath_stop
-
-            for elemental_path in hyperpath_stop:
-                hyperpaths_od[stop].append(elemental_path)
+            elemental_paths = ElementalPaths(origin, stop, destination, successors)
+            if len(elemental_paths) > 0:
+                hyperpaths_od[stop] = elemental_paths
 
         return hyperpaths_od, label, successors, frequencies
 
@@ -367,7 +611,7 @@ class Hyperpath:
     def string_hyperpaths_OD(hyperpaths_od: defaultdict_elemental_path, label: list_lab) -> str:
         """
         String with the representation of the hyperpath for a OD pair
-        :param hyperpaths_od: Dic[TransportMode] = List[List[ExtendedNodes]]. Each List[ExtendedNodes] represent a elemental
+        :param hyperpaths_od: Dic[StopNode] = ElementalPaths. Each List[ExtendedNodes] represent a elemental
         path to connect a origin and destination.
         :param label: dic[ExtendedNode] = label. Dictionary that gives the label for each ExtendedNode in hours
         with weight equivalent to the travel time
@@ -390,69 +634,175 @@ class Hyperpath:
                                                                                label[node])
         return line
 
-    def get_all_hyperpaths(self, OD_matrix: defaultdict2_float) -> (
-            dic_hyperpaths, dic_labels, dic_successors, dic_frequency, dic_Vij):
+    def get_encoded_hyperpaths_destination(self, destination_position: int, origins: List[Tuple[int, float]],
+                                           destination_rooted: bool = False, early_exit: bool = False) -> list:
+        """
+        to get hyperpaths of some origins to a destination in a format that can be transferred between processes.
+        ExtendedNodes and ExtendedEdges are replaced by their positions in the extended graph and only nodes in the
+        hyperpath of each OD pair are kept, in the format of HyperpathsStore
+        :param destination_position: position of destination CityNode
+        :param origins: List[(position of origin CityNode, vij)]
+        :param destination_rooted: if it is True, hyperpaths are built from the destination tree
+        :param early_exit: see get_hyperpath_OD
+        :return: List[(origin_position, vij, stops, encoded_hyperpath)]. stops as List[stop_position] with StopNodes
+        that have elemental paths and encoded_hyperpath as (node_ids, labels, frequencies, successor_offsets,
+        successor_edges), see HyperpathsStore.encode_hyperpath_OD
+        """
+        destination = self.__nodes[destination_position]
+        store = HyperpathsStore(self.__compiled_graph)
+
+        hyperpath_tree = None
+        if destination_rooted:
+            hyperpath_tree = self.build_hyperpath_graph(None, destination)
+
+        encoded_hyperpaths = []
+        for origin_position, vij in origins:
+            hyperpaths_od, label, successors, frequencies = self.get_hyperpath_OD(self.__nodes[origin_position],
+                                                                                  destination, hyperpath_tree,
+                                                                                  early_exit)
+
+            stops = list(hyperpaths_od)
+            encoded_hyperpaths.append((origin_position, vij, [self.__position[stop] for stop in stops],
+                                       store.encode_hyperpath_OD(stops, label, successors, frequencies)))
+        return encoded_hyperpaths
+
+    def decode_hyperpath_OD(self, origin: CityNode, destination: CityNode, stops: List[int],
+                            encoded_hyperpath: tuple) -> (defaultdict_elemental_path, list_lab, list_suc, list_f):
+        """
+        to get hyperpath of a OD pair from the format given by get_encoded_hyperpaths_destination
+        :param origin: CityNode origin
+        :param destination: CityNode destination
+        :param stops: List[stop_position] with StopNodes that have elemental paths
+        :param encoded_hyperpath: (node_ids, labels, frequencies, successor_offsets, successor_edges), see
+        HyperpathsStore.encode_hyperpath_OD
+        :return: (hyperpaths_od, label, successors, frequencies), see get_hyperpath_OD. Nodes out of hyperpath have
+        label infinity, no successors and frequency 0
+        """
+        store = HyperpathsStore(self.__compiled_graph)
+        label, successor, frequency = store.decode_hyperpath_OD(*encoded_hyperpath)
+
+        hyperpaths_od = defaultdict(list)
+        for stop_position in stops:
+            stop = self.__nodes[stop_position]
+            hyperpaths_od[stop] = ElementalPaths(origin, stop, destination, successor)
+
+        return hyperpaths_od, label, successor, frequency
+
+    def get_hyperpaths_OD(self, OD_matrix: defaultdict2_float, destination_rooted: bool = False,
+                          max_workers: int = 1, early_exit: bool = False):
+        """
+        generator with hyperpaths of all OD pairs with trips in OD matrix
+        :param OD_matrix: OD matrix get from Demand object
+        :param destination_rooted: if it is True, the hyperpath algorithm is run once for each destination and
+        hyperpaths of its origins are taken from the destination tree. Default value is False to run hyperpath
+        algorithm for each OD pair
+        :param max_workers: number of processes to build hyperpaths, OD pairs are grouped by destination in each
+        process. If it is None, it will default to the number of processors on the machine. Default value is 1 to
+        build hyperpaths in the current process. Processes only give back nodes in hyperpaths, see
+        decode_hyperpath_OD
+        :param early_exit: see get_hyperpath_OD
+        :return: (origin: CityNode, destination: CityNode, vij, (hyperpaths_od, label, successors, frequencies)) for
+        each OD pair with trips, see get_hyperpath_OD
+        """
+        nodes = self.extended_graph_obj.get_extended_graph_nodes()
+
+        # dic[str(graph_node_id)] = CityNode
+        city_nodes = defaultdict(None)
+        for city_node in nodes:
+            city_nodes[str(city_node.graph_node.id)] = city_node
+
+        # List[(origin: CityNode, destination: CityNode, vij)] in the order in which hyperpaths are given
+        od_pairs = []
+        if not destination_rooted:
+            for origin_id in OD_matrix:
+                for destination_id in OD_matrix[origin_id]:
+                    vij = OD_matrix[origin_id][destination_id]
+                    if vij != 0:
+                        od_pairs.append((city_nodes.get(str(origin_id)), city_nodes.get(str(destination_id)), vij))
+        else:
+            # OD matrix grouped by destination
+            transposed_matrix = Demand.transpose_matrix(OD_matrix)
+
+            for destination_id in transposed_matrix:
+                for origin_id in transposed_matrix[destination_id]:
+                    vij = transposed_matrix[destination_id][origin_id]
+                    if vij != 0:
+                        od_pairs.append((city_nodes.get(str(origin_id)), city_nodes.get(str(destination_id)), vij))
+
+        if max_workers == 1:
+            hyperpath_tree = None
+            tree_destination = None
+            for origin, destination, vij in od_pairs:
+                if destination_rooted and destination != tree_destination:
+                    hyperpath_tree = self.build_hyperpath_graph(None, destination)
+                    tree_destination = destination
+
+                yield origin, destination, vij, self.get_hyperpath_OD(origin, destination, hyperpath_tree, early_exit)
+        else:
+            # dic[destination] = List[(position of origin CityNode, vij)]
+            origins = defaultdict(list)
+            for origin, destination, vij in od_pairs:
+                origins[destination].append((self.__position[origin], vij))
+
+            # dic[(origin, destination)] = encoded hyperpath, see get_encoded_hyperpaths_destination
+            encoded_hyperpaths = dict()
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_hyperpath_worker,
+                                     initargs=(self,)) as executor:
+                futures = dict()
+                for destination in origins:
+                    futures[destination] = executor.submit(_get_encoded_hyperpaths_destination,
+                                                           self.__position[destination], origins[destination],
+                                                           destination_rooted, early_exit)
+                for destination in futures:
+                    for origin_position, _, *encoded_hyperpath_od in futures[destination].result():
+                        encoded_hyperpaths[(self.__nodes[origin_position], destination)] = encoded_hyperpath_od
+
+            for origin, destination, vij in od_pairs:
+                yield origin, destination, vij, self.decode_hyperpath_OD(origin, destination,
+                                                                         *encoded_hyperpaths[(origin, destination)])
+
+    def get_all_hyperpaths(self, OD_matrix: defaultdict2_float, destination_rooted: bool = False,
+                           max_workers: int = 1) -> (dic_hyperpaths, dic_labels, dic_successors, dic_frequency,
+                                                     dic_Vij):
         """
         get information about all hyperpath and label for all OD pair with trips in OD matrix
         :param OD_matrix:  OD matrix get from Demand object
-        :return: (Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]],
+        :param destination_rooted: if it is True, the hyperpath algorithm is run once for each destination instead
+        of once for each OD pair. Labels, successors and frequencies are the same in the hyperpaths of StopNodes in
+        origin, but nodes out of them keep values of the destination tree. Default value is False
+        :param max_workers: number of processes to build hyperpaths in a process pool. If it is None, it will default
+        to the number of processors on the machine. Default value is 1 to build hyperpaths without process pool
+        :return: (Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths,
         dic[origin: CityNode][destination: CityNode][ExtendedNode] = Label, dic[origin: CityNode][destination: CityNode]
         [ExtendedNode] = List[ExtendedEdge], dic[origin: CityNode][destination: CityNode][ExtendedNode] = float [veh/hr]
         , dic[origin][destination] = vij). Each List[ExtendedNodes] represent a elemental path to connect a origin
         and destination. List[ExtendedEdge] represent all successors edge for each ExtendedNode in a OD pair.
+        Labels, successors and frequencies are read only views of a HyperpathsStore with nodes in hyperpaths, nodes out
+        of them have label infinity, no successors and frequency 0
         """
         hyperpaths = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-        labels = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-        successors = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-        frequency = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
         Vij = defaultdict(lambda: defaultdict(list))
 
-        nodes = self.extended_graph_obj.get_extended_graph_nodes()
+        # labels, successors and frequencies are saved only for nodes in hyperpaths
+        store = HyperpathsStore(self.__compiled_graph)
+        labels = store.get_labels_view()
+        successors = store.get_successors_view()
+        frequency = store.get_frequencies_view()
 
         if self.network_validator(OD_matrix):
-            for origin_id in OD_matrix:
-                for destination_id in OD_matrix[origin_id]:
-                    vij = OD_matrix[origin_id][destination_id]
-                    if vij != 0:
-                        origin = None
-                        destination = None
-                        for city_node in nodes:
-                            if str(origin_id) == str(city_node.graph_node.id):
-                                origin = city_node
-                            if str(destination_id) == str(city_node.graph_node.id):
-                                destination = city_node
-
-                        hyperpaths_od, label, successor, frequencies = self.get_hyperpath_OD(origin, destination)
-
-                        for city_node in nodes:
-                            labels[origin][destination][city_node] = label[city_node]
-                            for stop_node in nodes[city_node]:
-                                labels[origin][destination][stop_node] = label[stop_node]
-                                for route_node in nodes[city_node][stop_node]:
-                                    labels[origin][destination][route_node] = label[route_node]
-
-                        for city_node in nodes:
-                            for suc in successor[city_node]:
-                                successors[origin][destination][city_node].append(suc)
-                            for stop_node in nodes[city_node]:
-                                for suc in successor[stop_node]:
-                                    successors[origin][destination][stop_node].append(suc)
-                                for route_node in nodes[city_node][stop_node]:
-                                    for suc in successor[route_node]:
-                                        successors[origin][destination][route_node].append(suc)
-
-                        for city_node in nodes:
-                            frequency[origin][destination][city_node] = frequencies[city_node]
-                            for stop_node in nodes[city_node]:
-                                frequency[origin][destination][stop_node] = frequencies[stop_node]
-                                for route_node in nodes[city_node][stop_node]:
-                                    frequency[origin][destination][route_node] = frequencies[route_node]
-
-                        for stop in hyperpaths_od:
-                            for elemental_path in hyperpaths_od[stop]:
-                                hyperpaths[origin][destination][stop].append(elemental_path)
-
-                        Vij[origin][destination] = vij
+            # only hyperpaths of StopNodes in origin are saved, so the hyperpath algorithm can stop when they are built
+            for origin, destination, vij, hyperpath_od in self.get_hyperpaths_OD(OD_matrix, destination_rooted,
+                                                                                    max_workers, early_exit=True):
+                hyperpaths_od, label, successor, frequencies = hyperpath_od
+
+                store.add_hyperpath_OD(origin, destination, list(hyperpaths_od), label, successor, frequencies)
+
+                # elemental paths are built from successors saved
+                for stop in hyperpaths_od:
+                    hyperpaths[origin][destination][stop] = ElementalPaths(origin, stop, destination,
+                                                                           successors[origin][destination])
+
+                Vij[origin][destination] = vij
 
         else:
             raise TransportNetworkIsNotValidException("Network is not valid")
@@ -464,7 +814,7 @@ class Hyperpath:
                               vij: dic_Vij) -> str:
         """
         to get a string with a summary of the all hyperpaths for all OD pair with trips.
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
         :param labels: dic[origin: CityNode][destination: CityNode][ExtendedNode] = Label
         :param successors: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge]
         :param vij: dic[origin: CityNode][destination: CityNode] = vij
@@ -490,7 +840,7 @@ class Hyperpath:
     def plot(hyperpaths_od: defaultdict_elemental_path):
         """
         plot alls hyperpaths for a OD pair
-        :param hyperpaths_od: Dic[TransportMode] = List[List[ExtendedNodes]]. Each List[ExtendedNodes] represent a
+        :param hyperpaths_od: Dic[StopNode] = ElementalPaths. Each List[ExtendedNodes] represent a
         elemental path to connect origin and destination.
         :return:
         """
@@ -557,3 +907,27 @@ class Hyperpath:
         plt.gca().set_aspect('equal')
         plt.show()
         # plt.savefig(file_path)
+
+
+# Hyperpath object of each process in the process pool of get_hyperpaths_OD
+_worker_hyperpath_obj = None
+
+
+def _init_hyperpath_worker(hyperpath_obj: Hyperpath) -> None:
+    """
+    to initialize a process of the process pool with the Hyperpath object
+    :param hyperpath_obj: Hyperpath object
+    :return:
+    """
+    global _worker_hyperpath_obj
+    _worker_hyperpath_obj = hyperpath_obj
+
+
+def _get_encoded_hyperpaths_destination(destination_position: int, origins: List[Tuple[int, float]],
+                                        destination_rooted: bool, early_exit: bool) -> list:
+    """
+    to get hyperpaths of some origins to a destination in a process of the process pool, see
+    Hyperpath.get_encoded_hyperpaths_destination
+    """
+    return _worker_hyperpath_obj.get_encoded_hyperpaths_destination(destination_position, origins,
+                                                                    destination_rooted, early_exit)
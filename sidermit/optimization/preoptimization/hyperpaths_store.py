@@ -0,0 +1,330 @@
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import List
+
+from sidermit.optimization.preoptimization.extended_graph import CompiledExtendedGraph, CityNode, StopNode, \
+    ExtendedEdge, ExtendedNode
+
+list_suc = defaultdict(List[ExtendedEdge])
+list_lab = defaultdict(float)
+list_f = defaultdict(float)
+
+
+class HyperpathsStore:
+
+    def __init__(self, compiled_graph: CompiledExtendedGraph):
+        """
+        sparse storage of labels, successors and frequencies of hyperpaths of all OD pairs. Only nodes in the hyperpath
+        of each OD pair are saved in flat arrays, values of OD pair k are between node_offsets[k] and
+        node_offsets[k + 1]
+        :param compiled_graph: CompiledExtendedGraph object, it gives ids of nodes and edges
+        """
+        self.__nodes = compiled_graph.nodes
+        self.__node_id = compiled_graph.node_id
+        self.__edges = compiled_graph.edges
+        self.__edge_id = compiled_graph.edge_id
+
+        # dic[origin][destination] = position of OD pair
+        self.__od_position = defaultdict(dict)
+
+        # ids of nodes in hyperpath of each OD pair in increasing order
+        self.node_offsets = array('q', [0])
+        self.node_ids = array('q')
+        self.labels = array('d')
+        self.frequencies = array('d')
+        # successors of node in position k are successor_edges[successor_offsets[k]:successor_offsets[k + 1]]
+        self.successor_offsets = array('q', [0])
+        self.successor_edges = array('q')
+
+    def encode_hyperpath_OD(self, stops: List[StopNode], label: list_lab, successors: list_suc,
+                            frequencies: list_f) -> (array, array, array, array, array):
+        """
+        to get hyperpath of a OD pair in the format of flat arrays, only nodes that can be reached from StopNodes of
+        origin through successors. It can be transferred between processes
+        :param stops: StopNodes in origin with elemental paths
+        :param label: dic[ExtendedNode] = label
+        :param successors: dic[ExtendedNode] = List[ExtendedEdge]
+        :param frequencies: dic[ExtendedNode] = frequency
+        :return: (node_ids, labels, frequencies, successor_offsets, successor_edges) of the OD pair, successor_offsets
+        start in 0
+        """
+        # nodes in hyperpath
+        hyperpath_nodes = set(stops)
+        queue = list(stops)
+        while queue:
+            node = queue.pop()
+            for suc in successors.get(node, []):
+                if suc.nodej not in hyperpath_nodes:
+                    hyperpath_nodes.add(suc.nodej)
+                    queue.append(suc.nodej)
+
+        node_ids = array('q', sorted(self.__node_id[node] for node in hyperpath_nodes))
+        labels = array('d')
+        node_frequencies = array('d')
+        successor_offsets = array('q', [0])
+        successor_edges = array('q')
+        for node_id in node_ids:
+            node = self.__nodes[node_id]
+            labels.append(label[node])
+            node_frequencies.append(frequencies[node])
+            for suc in successors.get(node, []):
+                successor_edges.append(self.__edge_id[suc])
+            successor_offsets.append(len(successor_edges))
+
+        return node_ids, labels, node_frequencies, successor_offsets, successor_edges
+
+    def decode_hyperpath_OD(self, node_ids: array, labels: array, frequencies: array, successor_offsets: array,
+                            successor_edges: array) -> (list_lab, list_suc, list_f):
+        """
+        to get dictionaries of a hyperpath of a OD pair from the format given by encode_hyperpath_OD
+        :param node_ids: ids of nodes in hyperpath in increasing order
+        :param labels: label of each node
+        :param frequencies: frequency of each node
+        :param successor_offsets: successors of node in position k are successor_edges[successor_offsets[k]:
+        successor_offsets[k + 1]]
+        :param successor_edges: ids of successor edges
+        :return: (dic[ExtendedNode] = label, dic[ExtendedNode] = List[ExtendedEdge], dic[ExtendedNode] = frequency).
+        Nodes out of hyperpath have label infinity, no successors and frequency 0
+        """
+        label = defaultdict(lambda: float('inf'))
+        successors = defaultdict(list)
+        frequency = defaultdict(float)
+        for k, node_id in enumerate(node_ids):
+            node = self.__nodes[node_id]
+            label[node] = labels[k]
+            frequency[node] = frequencies[k]
+            if successor_offsets[k] != successor_offsets[k + 1]:
+                successors[node] = [self.__edges[edge_id] for edge_id in
+                                    successor_edges[successor_offsets[k]:successor_offsets[k + 1]]]
+
+        return label, successors, frequency
+
+    def add_hyperpath_OD(self, origin: CityNode, destination: CityNode, stops: List[StopNode], label: list_lab,
+                         successors: list_suc, frequencies: list_f) -> None:
+        """
+        to save hyperpath of a OD pair, only nodes that can be reached from StopNodes of origin through successors
+        :param origin: CityNode origin
+        :param destination: CityNode destination
+        :param stops: StopNodes in origin with elemental paths
+        :param label: dic[ExtendedNode] = label
+        :param successors: dic[ExtendedNode] = List[ExtendedEdge]
+        :param frequencies: dic[ExtendedNode] = frequency
+        :return:
+        """
+        self.add_encoded_hyperpath_OD(origin, destination,
+                                      *self.encode_hyperpath_OD(stops, label, successors, frequencies))
+
+    def add_encoded_hyperpath_OD(self, origin: CityNode, destination: CityNode, node_ids: array, labels: array,
+                                 frequencies: array, successor_offsets: array, successor_edges: array) -> None:
+        """
+        to save hyperpath of a OD pair in the format given by encode_hyperpath_OD
+        :param origin: CityNode origin
+        :param destination: CityNode destination
+        :param node_ids: ids of nodes in hyperpath in increasing order, see decode_hyperpath_OD
+        :param labels: label of each node
+        :param frequencies: frequency of each node
+        :param successor_offsets: offsets of successors of each node, starting in 0
+        :param successor_edges: ids of successor edges
+        :return:
+        """
+        offset = len(self.successor_edges)
+        self.node_ids.extend(node_ids)
+        self.labels.extend(labels)
+        self.frequencies.extend(frequencies)
+        self.successor_offsets.extend(offset + successor_offset for successor_offset in successor_offsets[1:])
+        self.successor_edges.extend(successor_edges)
+
+        self.__od_position[origin][destination] = len(self.node_offsets) - 1
+        self.node_offsets.append(len(self.node_ids))
+
+    def get_node_id(self) -> dict:
+        """
+        to get ids of nodes
+        :return: dic[ExtendedNode] = id
+        """
+        return self.__node_id
+
+    def get_od_pairs(self) -> defaultdict:
+        """
+        to get OD pairs saved
+        :return: dic[origin][destination] = position of OD pair
+        """
+        return self.__od_position
+
+    def get_nodes(self, od: int) -> List[ExtendedNode]:
+        """
+        to get nodes in hyperpath of a OD pair
+        :param od: position of OD pair
+        :return: List[ExtendedNode] in increasing id order
+        """
+        return [self.__nodes[node_id] for node_id in self.node_ids[self.node_offsets[od]:self.node_offsets[od + 1]]]
+
+    def get_successors(self, position: int) -> List[ExtendedEdge]:
+        """
+        to get successors of a node
+        :param position: position of node in flat arrays
+        :return: List[ExtendedEdge]
+        """
+        return [self.__edges[edge_id] for edge_id in
+                self.successor_edges[self.successor_offsets[position]:self.successor_offsets[position + 1]]]
+
+    def get_labels_view(self):
+        """
+        to get labels with the same access than a dictionary
+        :return: dic[origin: CityNode][destination: CityNode][ExtendedNode] = label, infinity if node is not in
+        hyperpath
+        """
+        return StoreView(self, LabelsOD)
+
+    def get_successors_view(self):
+        """
+        to get successors with the same access than a dictionary
+        :return: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge], empty list if node is
+        not in hyperpath
+        """
+        return StoreView(self, SuccessorsOD)
+
+    def get_frequencies_view(self):
+        """
+        to get frequencies with the same access than a dictionary
+        :return: dic[origin: CityNode][destination: CityNode][ExtendedNode] = frequency, 0 if node is not in hyperpath
+        """
+        return StoreView(self, FrequenciesOD)
+
+
+class ODValues(Mapping, ABC):
+
+    def __init__(self, store: HyperpathsStore, od: int = None):
+        """
+        read only dictionary with values of nodes in hyperpath of a OD pair. Nodes out of hyperpath get a default value
+        :param store: HyperpathsStore object
+        :param od: position of OD pair. Default value is None to OD pairs without hyperpath
+        """
+        self.store = store
+        self.od = od
+        self.__nodes = None
+        self.__node_id = store.get_node_id()
+        # bounds of OD pair in flat arrays
+        self.__lo = 0 if od is None else store.node_offsets[od]
+        self.__hi = 0 if od is None else store.node_offsets[od + 1]
+
+    @abstractmethod
+    def value(self, position: int):
+        """
+        to get value of node in a position of flat arrays
+        :param position: position of node
+        """
+
+    @abstractmethod
+    def default(self):
+        """
+        to get value of nodes out of hyperpath
+        """
+
+    def __getitem__(self, node: ExtendedNode):
+        return self.get(node, self.default())
+
+    def position(self, node: ExtendedNode) -> int:
+        """
+        to get position of a node in flat arrays
+        :param node: ExtendedNode
+        :return: position of node, -1 if node is not in hyperpath of the OD pair
+        """
+        node_id = self.__node_id.get(node)
+        if node_id is None or self.__lo == self.__hi:
+            return -1
+        node_ids = self.store.node_ids
+        k = bisect_left(node_ids, node_id, self.__lo, self.__hi)
+        if k < self.__hi and node_ids[k] == node_id:
+            return k
+        return -1
+
+    def get(self, node: ExtendedNode, default=None):
+        k = self.position(node)
+        if k != -1:
+            return self.value(k)
+        return default
+
+    def __contains__(self, node: ExtendedNode) -> bool:
+        return self.position(node) != -1
+
+    def __iter__(self):
+        if self.od is None:
+            return iter([])
+        if self.__nodes is None:
+            self.__nodes = self.store.get_nodes(self.od)
+        return iter(self.__nodes)
+
+    def __len__(self) -> int:
+        return self.__hi - self.__lo
+
+
+class LabelsOD(ODValues):
+
+    def value(self, position: int) -> float:
+        return self.store.labels[position]
+
+    def default(self) -> float:
+        return float('inf')
+
+
+class FrequenciesOD(ODValues):
+
+    def value(self, position: int) -> float:
+        return self.store.frequencies[position]
+
+    def default(self) -> float:
+        return 0
+
+
+class SuccessorsOD(ODValues):
+
+    def value(self, position: int) -> List[ExtendedEdge]:
+        return self.store.get_successors(position)
+
+    def default(self) -> List[ExtendedEdge]:
+        return []
+
+
+class StoreView:
+
+    def __init__(self, store: HyperpathsStore, od_values_class, origin: CityNode = None):
+        """
+        view of a HyperpathsStore with access like dic[origin][destination][ExtendedNode]. OD views are kept to be
+        reused
+        :param store: HyperpathsStore object
+        :param od_values_class: subclass of ODValues that gives values of each OD pair
+        :param origin: CityNode origin. Default value is None to get view of all origins
+        """
+        self.store = store
+        self.od_values_class = od_values_class
+        self.origin = origin
+        self.__views = dict()
+
+    def __getitem__(self, key: CityNode):
+        view = self.__views.get(key)
+        if view is None:
+            if self.origin is None:
+                view = StoreView(self.store, self.od_values_class, key)
+            else:
+                view = self.od_values_class(self.store, self.store.get_od_pairs().get(self.origin, {}).get(key))
+            self.__views[key] = view
+        return view
+
+    def __contains__(self, key: CityNode) -> bool:
+        if self.origin is None:
+            return key in self.store.get_od_pairs()
+        return key in self.store.get_od_pairs().get(self.origin, {})
+
+    def __iter__(self):
+        if self.origin is None:
+            return iter(self.store.get_od_pairs())
+        return iter(self.store.get_od_pairs().get(self.origin, {}))
+
+    def __len__(self) -> int:
+        if self.origin is None:
+            return len(self.store.get_od_pairs())
+        return len(self.store.get_od_pairs().get(self.origin, {}))
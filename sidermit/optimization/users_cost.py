@@ -2,7 +2,7 @@ from collections import defaultdict
 from typing import List
 
 from sidermit.optimization.preoptimization import RouteNode, StopNode, ExtendedGraph, CityNode, ExtendedEdge, \
-    ExtendedNode
+    ExtendedNode, Assignment
 from sidermit.publictransportsystem import Passenger
 
 defaultdict_float = defaultdict(float)
@@ -34,7 +34,7 @@ class UsersCost:
         """
         to get resources consumer for all passenger in transport network access time, waiting time,
         time on board of vehicle, numbers of transfer
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
         :param Vij: dic[origin: CityNode][destination: CityNode] = vij
         :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
         :param successors: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge]
@@ -50,12 +50,17 @@ class UsersCost:
         te = 0
         t = 0
 
-        edges = extended_graph.get_extended_graph_edges()
-
         for origin in hyperpaths:
             for destination in hyperpaths[origin]:
                 # viajes del par OD
                 vod = Vij[origin][destination]
+                successors_od = successors[origin][destination]
+
+                # pasajeros que llegan a cada nodo
+                pax = defaultdict(float)
+                # numero de rutas elementales que llegan a cada nodo, el ta de los arcos de acceso no depende de los
+                # pasajeros
+                n_paths = defaultdict(int)
                 for stop in hyperpaths[origin][destination]:
                     # viajes de todas las rutas elementales que salen de esta parada
                     vod_s = vod * assignment[origin][destination][stop] / 100
@@ -63,45 +68,43 @@ class UsersCost:
                     if vod_s == 0:
                         continue
 
-                    paths = []
-
-                    for suc in successors[origin][destination][stop]:
-                        nodej = suc.nodej
-                        paths.append((stop, nodej, vod_s))
+                    pax[stop] += vod_s
+                    n_paths[stop] += 1
 
                     # reportar ta inicial (lateral y tecnologico)
                     ta += vod_s * (stop.mode.tat / 60 + assignment[origin][destination][
                         stop] / 100 * origin.graph_node.width / (4 * vp * stop.mode.d))
 
-                    while len(paths) != 0:
-                        nodei, nodej, pax = paths.pop(0)
+                # los nodos se recorren una vez, despues de todos sus predecesores
+                for nodei in Assignment.get_topological_order(destination, list(pax), successors_od):
+                    # evita continuar si llegaste a destino
+                    if isinstance(nodei, StopNode) and nodei.city_node == destination:
+                        continue
+
+                    successors_i = successors_od[nodei]
+
+                    f_acum = 0
+                    if isinstance(nodei, StopNode):
+                        for suc in successors_i:
+                            if isinstance(suc.nodej, RouteNode):
+                                f_acum += f[suc.nodej.route.id]
 
-                        # evita continuar si llegaste a destino
-                        if isinstance(nodei, StopNode) and nodei.city_node == destination:
-                            continue
+                    for suc in successors_i:
+                        nodej = suc.nodej
 
-                        dis_pax = pax
+                        dis_pax = pax[nodei]
 
                         # reportar te
                         if isinstance(nodei, StopNode):
                             if isinstance(nodej, RouteNode):
-
-                                f_acum = 0
-
-                                for suc in successors[origin][destination][nodei]:
-                                    f_acum += f[suc.nodej.route.id]
-
                                 dis_pax = dis_pax * (f[nodej.route.id] / f_acum)
 
                                 te += dis_pax * nodei.mode.theta / (f_acum / nodej.route.mode.d)
 
-                        # reportar tv
+                        # reportar tv, los sucesores son los arcos de ruta del grafo extendido
                         if isinstance(nodei, RouteNode):
                             if isinstance(nodej, RouteNode):
-                                for edge in edges:
-                                    if edge.nodei == nodei and edge.nodej == nodej:
-                                        tv += dis_pax * edge.t
-                                        break
+                                tv += dis_pax * suc.t
 
                         # reportar transbordos y tv de bajada
                         if isinstance(nodei, RouteNode):
@@ -111,25 +114,9 @@ class UsersCost:
                                     t += dis_pax
 
                                 # para tiempo de viaje adicional por esperar la bajada del vehiculo
-                                nodei_id = nodei.prev_route_node.stop_node.city_node.graph_node.id
-                                nodej_id = nodei.stop_node.city_node.graph_node.id
-
-                                stop_sequence_i = nodei.route.stops_sequence_i
-
-                                index = 0
-                                index_i = 0
-                                index_j = 0
-
-                                for node_id in stop_sequence_i:
-                                    if str(node_id) == str(nodei_id):
-                                        index_i = index
-                                    if str(node_id) == str(nodej_id):
-                                        index_j = index
-                                    index = index + 1
-
                                 tb = nodei.route.mode.t / 3600
                                 # verificamos si es del sentido de ida
-                                if index_i < index_j:
+                                if nodei.prev_route_node.get_direction(nodei) == "I":
                                     pax_b = v[nodei.route.id]["I"][nodej]
                                     tv += (pax_b * 0.5 * tb) * dis_pax
 
@@ -141,43 +128,25 @@ class UsersCost:
                         # reportar ta
                         if isinstance(nodei, StopNode):
                             if isinstance(nodej, CityNode):
-                                ta += nodei.mode.tat / 60
+                                ta += n_paths[nodei] * nodei.mode.tat / 60
                         if isinstance(nodej, StopNode):
                             if isinstance(nodei, CityNode):
-                                ta += nodej.mode.tat / 60
-
-                        # agregamos elementos faltantes a las rutas
-                        # si nodo i, nodo j y nodo k (new suc ) son de rutas entonces
-                        for suc in successors[origin][destination][nodej]:
-                            # agrega elementos para continuar rutas elementales
-                            paths.append((nodej, suc.nodej, dis_pax))
-
-                            # sumaremos tv producido por la espera de los que se bajan en paraderos cuando el ind sigue
-                            # en ruta
-                            # cbd                                 #SC                             #p
-                            if isinstance(nodei, RouteNode) and isinstance(nodej, RouteNode) and isinstance(suc.nodej,
-                                                                                                            RouteNode):
+                                ta += n_paths[nodei] * nodej.mode.tat / 60
+
+                        pax[nodej] += dis_pax
+                        n_paths[nodej] += n_paths[nodei]
+
+                        # sumaremos tv producido por la espera de los que se bajan en paraderos cuando el ind sigue
+                        # en ruta
+                        # cbd                                 #SC                             #p
+                        if isinstance(nodei, RouteNode) and isinstance(nodej, RouteNode):
+                            for suc_j in successors_od[nodej]:
+                                if not isinstance(suc_j.nodej, RouteNode):
+                                    continue
                                 bya = nodei.route.mode.bya
                                 tb = nodei.route.mode.t / 3600
-                                # determinamos dirección
-                                nodei_id = nodei.stop_node.city_node.graph_node.id
-                                nodej_id = nodej.stop_node.city_node.graph_node.id
-
-                                stop_sequence_i = nodei.route.stops_sequence_i
-
-                                index = 0
-                                index_i = 0
-                                index_j = 0
-
-                                for node_id in stop_sequence_i:
-                                    if str(node_id) == str(nodei_id):
-                                        index_i = index
-                                    if str(node_id) == str(nodej_id):
-                                        index_j = index
-                                    index = index + 1
-
                                 # verificamos si es del sentido de ida
-                                if index_i < index_j:
+                                if nodei.get_direction(nodej) == "I":
                                     # simultaneo
                                     if bya == 1:
                                         pasajeros = max(z[nodei.route.id]["I"][nodej.stop_node],
@@ -208,7 +177,7 @@ class UsersCost:
                        passenger_obj: Passenger, z: defaultdict3_float, v: defaultdict3_float) -> float:
         """
         to get users cost
-        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = List[List[ExtendedNodes]]
+        :param hyperpaths: Dic[origin: CityNode][destination: CityNode][StopNode] = ElementalPaths
         :param Vij: dic[origin: CityNode][destination: CityNode] = vij
         :param assignment: dic[origin: CityNode][destination: CityNode][Stop: StopNode] = %V_OD
         :param successors: dic[origin: CityNode][destination: CityNode][ExtendedNode] = List[ExtendedEdge]
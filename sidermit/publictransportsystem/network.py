@@ -1,7 +1,7 @@
 import math
 from collections import defaultdict
 from enum import Enum
-from typing import List
+from typing import List, Dict
 
 import networkx as nx
 import pandas as pd
@@ -74,6 +74,9 @@ class Route:
                 self.stops_sequence_i = self.sequences_to_list(stops_sequence_i)
                 self.stops_sequence_r = self.sequences_to_list(stops_sequence_r)
 
+        # position of each stop in forward direction, it is used to know the direction between two stops
+        self.stops_position_i = self.get_stops_position(self.stops_sequence_i)
+
     def parameters_validator(self, mode_obj: TransportMode, nodes_sequence_i: str, nodes_sequence_r: str,
                              stops_sequence_i: str, stops_sequence_r: str) -> bool:
         """
@@ -113,6 +116,20 @@ class Route:
                 line = line + "," + str(node)
         return line
 
+    @staticmethod
+    def get_stops_position(stops_sequence: List[int]) -> Dict[str, int]:
+        """
+        to get position of each stop in a stop sequence, if a stop appears more than once it has its last position
+        :param stops_sequence: List[node id]
+        :return: dic[str(node id)] = position
+        """
+        stops_position = dict()
+        if stops_sequence is None:
+            return stops_position
+        for position, node_id in enumerate(stops_sequence):
+            stops_position[str(node_id)] = position
+        return stops_position
+
     @staticmethod
     def sequences_to_list(sequence: str) -> List[int]:
         """
@@ -2,7 +2,7 @@ import unittest
 from collections import defaultdict
 
 from sidermit.city import Graph, Demand
-from sidermit.optimization.preoptimization import ExtendedGraph, Hyperpath, Assignment
+from sidermit.optimization.preoptimization import ExtendedGraph, Hyperpath, Assignment, AssignmentOperator
 from sidermit.publictransportsystem import Passenger, TransportMode, TransportNetwork
 
 
@@ -72,6 +72,25 @@ class test_graph(unittest.TestCase):
         self.assertEqual(round(self.OD_assignment[P1][SC1][stop_bus_p1], 2), 84.88)
         self.assertEqual(round(self.OD_assignment[P1][SC1][stop_metro_p1], 2), 15.12)
 
+    def test_get_assignment_matrix(self):
+        """
+        test get_assignment_matrix method of class Assignment
+        :return:
+        """
+        passenger_obj = Passenger.get_default_passenger()
+        od_pairs, stops, shares = Assignment.get_assignment_matrix(self.hyperpaths, self.labels, 2, passenger_obj.va,
+                                                                   passenger_obj.spa, passenger_obj.spv)
+
+        self.assertEqual(shares.shape, (len(od_pairs), 2))
+        self.assertEqual(len(stops), len(od_pairs))
+
+        for (origin, destination), (stop1, stop2), (share1, share2) in zip(od_pairs, stops, shares):
+            self.assertEqual(set(self.hyperpaths[origin][destination]), {stop for stop in (stop1, stop2) if stop})
+            self.assertAlmostEqual(share1 + share2, 100)
+            for stop, share in ((stop1, share1), (stop2, share2)):
+                if stop is not None:
+                    self.assertEqual(self.OD_assignment[origin][destination][stop], share)
+
     def test_get_alighting_and_boarding(self):
         """
         to test get_alighting_and_boarding of class get_alighting_and_boarding
@@ -141,3 +160,65 @@ class test_graph(unittest.TestCase):
         self.assertEqual(loaded_section['F_metro_1'], 0.044997165532879815)
         self.assertEqual(loaded_section['R_bus_1'], loaded_section['R_bus_2'])
         self.assertEqual(loaded_section['R_bus_1'], 1.4880952380952384)
+
+    def test_assignment_operator(self):
+        """
+        to test get_alighting_and_boarding of class AssignmentOperator
+        :return:
+        """
+
+        f = defaultdict(float)
+        for n, route in enumerate(self.network_obj.get_routes()):
+            f[route.id] = 20 + 4 * n
+
+        z, v, loaded_section_route = Assignment.get_alighting_and_boarding(Vij=self.Vij, hyperpaths=self.hyperpaths,
+                                                                           successors=self.successors,
+                                                                           assignment=self.OD_assignment, f=f)
+
+        assignment_operator = AssignmentOperator(Vij=self.Vij, hyperpaths=self.hyperpaths, successors=self.successors,
+                                                 assignment=self.OD_assignment)
+        z_op, v_op, loaded_section_route_op = assignment_operator.get_alighting_and_boarding(f)
+
+        for dic, dic_op in ((z, z_op), (v, v_op), (loaded_section_route, loaded_section_route_op)):
+            self.assertEqual(set(dic), set(dic_op))
+            for route_id in dic:
+                self.assertEqual(set(dic[route_id]), set(dic_op[route_id]))
+                for direction in dic[route_id]:
+                    self.assertEqual(set(dic[route_id][direction]), set(dic_op[route_id][direction]))
+                    for stop_node in dic[route_id][direction]:
+                        self.assertAlmostEqual(dic[route_id][direction][stop_node],
+                                               dic_op[route_id][direction][stop_node])
+
+        # the same operator is used with other frequencies
+        f[self.network_obj.get_routes()[0].id] = 40
+        z, v, loaded_section_route = Assignment.get_alighting_and_boarding(Vij=self.Vij, hyperpaths=self.hyperpaths,
+                                                                           successors=self.successors,
+                                                                           assignment=self.OD_assignment, f=f)
+        z_op, v_op, loaded_section_route_op = assignment_operator.get_alighting_and_boarding(f)
+        most_loaded_section = Assignment.most_loaded_section(loaded_section_route)
+        most_loaded_section_op = Assignment.most_loaded_section(loaded_section_route_op)
+        self.assertEqual(set(most_loaded_section), set(most_loaded_section_op))
+        for route_id in most_loaded_section:
+            self.assertAlmostEqual(most_loaded_section[route_id], most_loaded_section_op[route_id])
+
+    def test_get_topological_order(self):
+        """
+        to test get_topological_order of class Assignment
+        :return:
+        """
+
+        for origin in self.hyperpaths:
+            for destination in self.hyperpaths[origin]:
+                stops = list(self.hyperpaths[origin][destination])
+                successors_od = self.successors[origin][destination]
+
+                order = Assignment.get_topological_order(destination, stops, successors_od)
+                position = {node: n for n, node in enumerate(order)}
+
+                self.assertEqual(len(order), len(position))
+                # all nodes of elemental paths are sorted
+                for stop in stops:
+                    for path in self.hyperpaths[origin][destination][stop]:
+                        nodes = path[1:-1]
+                        for nodei, nodej in zip(nodes[:-1], nodes[1:]):
+                            self.assertLess(position[nodei], position[nodej])
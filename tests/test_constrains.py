@@ -63,7 +63,7 @@ class test_constrains(unittest.TestCase):
 
         ineq_f = Constrains.fmax_constrains(graph_obj, network_obj.get_routes(), network_obj.get_modes(), f)
 
-        self.assertEqual(ineq_f,
+        self.assertEqual(ineq_f.tolist(),
                          [-136.0,
                           -40.0,
                           -136.0,
@@ -85,3 +85,38 @@ class test_constrains(unittest.TestCase):
                           -143.0,
                           -12.0]
                          )
+
+    def test_fmax_constrains_matrix(self):
+
+        graph_obj = Graph.build_from_parameters(2, 10, 1, 2)
+
+        network_obj = TransportNetwork(graph_obj)
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+        radial_bus = network_obj.get_radial_routes(bus_obj)
+        feeder_bus = network_obj.get_feeder_routes(bus_obj)
+        radial_metro = network_obj.get_radial_routes(metro_obj, short=True)
+
+        for route in radial_bus:
+            network_obj.add_route(route)
+
+        for route in feeder_bus:
+            network_obj.add_route(route)
+
+        for route in radial_metro:
+            network_obj.add_route(route)
+
+        routes = network_obj.get_routes()
+        f = defaultdict(float)
+        for n, route in enumerate(routes):
+            f[route.id] = 10 + 4 * n
+
+        matrix, fmax = Constrains.fmax_constrains_matrix(graph_obj, routes, network_obj.get_modes())
+        ineq_f = Constrains.fmax_constrains(graph_obj, routes, network_obj.get_modes(), f)
+
+        self.assertEqual(matrix.shape, (len(ineq_f), len(routes)))
+        values = matrix @ [f[route.id] for route in routes] - fmax
+        for value, expected in zip(values, ineq_f):
+            self.assertAlmostEqual(value, expected)
+
+        ineq_f_matrix = Constrains.fmax_constrains(graph_obj, routes, network_obj.get_modes(), f, (matrix, fmax))
+        self.assertEqual(ineq_f_matrix.tolist(), ineq_f.tolist())
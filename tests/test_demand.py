@@ -1,5 +1,6 @@
 import filecmp
 import os
+import pickle
 import unittest
 from pathlib import Path
 
@@ -99,6 +100,42 @@ class test_graph(unittest.TestCase):
         # remove file
         os.remove(os.path.join(self.data_path, 'write_test.csv'))
 
+    def test_get_transposed_matrix(self):
+        """
+        to test get_transposed_matrix method
+        :return:
+        """
+        g = graph.Graph.build_from_parameters(3, 1000, 0.5, 2)
+        d = demand.Demand.build_from_file(g, os.path.join(self.data_path, 'test_matrix.csv'))
+
+        matrix = d.get_matrix()
+        transposed_matrix = d.get_transposed_matrix()
+
+        self.assertEqual(len(transposed_matrix), 7)
+
+        for origin_id in matrix:
+            for destination_id in matrix[origin_id]:
+                self.assertEqual(transposed_matrix[destination_id][origin_id], matrix[origin_id][destination_id])
+
+    def test_pickle(self):
+        """
+        to test pickle of demand
+        :return:
+        """
+        g = graph.Graph.build_from_parameters(3, 1000, 0.5, 2)
+        d = demand.Demand.build_from_file(g, os.path.join(self.data_path, 'test_matrix.csv'))
+
+        d_copy = pickle.loads(pickle.dumps(d))
+
+        self.assertEqual(d_copy.get_total_trips(), d.get_total_trips())
+        matrix = d.get_matrix()
+        matrix_copy = d_copy.get_matrix()
+        for origin_id in matrix:
+            for destination_id in matrix[origin_id]:
+                self.assertEqual(matrix_copy[origin_id][destination_id], matrix[origin_id][destination_id])
+        # matrix keeps default values
+        self.assertEqual(matrix_copy["unknown"]["unknown"], 0)
+
     def test_change_vij_exceptions(self):
         """
         to test exceptions of change_vij method
@@ -0,0 +1,125 @@
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+from sidermit.city import Demand
+from sidermit.city import Graph
+from sidermit.optimization import UsersCost, OperatorsCost, InfrastructureCost, Constrains, Evaluator
+from sidermit.optimization.preoptimization import ExtendedGraph, Hyperpath, Assignment, AssignmentOperator
+from sidermit.publictransportsystem import TransportMode, TransportNetwork, Passenger
+
+
+class test_evaluator(unittest.TestCase):
+
+    def test_evaluate(self):
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+        demand_obj = Demand.build_from_parameters(graph_obj=graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        passenger_obj = Passenger.get_default_passenger()
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        network_obj = TransportNetwork(graph_obj=graph_obj)
+
+        for route in network_obj.get_feeder_routes(mode_obj=metro_obj) + network_obj.get_radial_routes(
+                mode_obj=bus_obj) + network_obj.get_diametral_routes(mode_obj=bus_obj, jump=1):
+            network_obj.add_route(route_obj=route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj=graph_obj, routes=network_obj.get_routes(), TP=passenger_obj.pt,
+                                           frequency_routes=None)
+        hyperpath_obj = Hyperpath(extended_graph_obj=extended_graph_obj, passenger_obj=passenger_obj)
+
+        hyperpaths, labels, successors, frequency, Vij = hyperpath_obj.get_all_hyperpaths(
+            OD_matrix=demand_obj.get_matrix())
+
+        OD_assignment = Assignment.get_assignment(hyperpaths=hyperpaths, labels=labels, p=2,
+                                                  vp=passenger_obj.va, spa=passenger_obj.spa,
+                                                  spv=passenger_obj.spv)
+
+        assignment_operator = AssignmentOperator(Vij, hyperpaths, successors, OD_assignment)
+        evaluator = Evaluator(graph_obj, network_obj, passenger_obj, extended_graph_obj, hyperpaths, Vij,
+                              OD_assignment, successors, assignment_operator)
+
+        f = defaultdict(float)
+        for n, route in enumerate(network_obj.get_routes()):
+            f[route.id] = 20 + 3 * n
+
+        evaluation = evaluator.evaluate(f)
+
+        z, v, loaded_section_route = Assignment.get_alighting_and_boarding(Vij, hyperpaths, successors, OD_assignment,
+                                                                           f)
+        most_loaded_section = Assignment.most_loaded_section(loaded_section_route)
+
+        ta, te, tv, t = UsersCost.resources_consumer(hyperpaths, Vij, OD_assignment, successors, extended_graph_obj,
+                                                     passenger_obj.va, f, z, v)
+        self.assertAlmostEqual(evaluation.ta, ta)
+        self.assertAlmostEqual(evaluation.te, te)
+        self.assertAlmostEqual(evaluation.tv, tv)
+        self.assertAlmostEqual(evaluation.t, t)
+
+        routes = network_obj.get_routes()
+        operators_cost_obj = OperatorsCost()
+        line_travel_time = operators_cost_obj.lines_travel_time(routes, graph_obj.get_edges_distance())
+        cycle_time = operators_cost_obj.get_cycle_time(z, v, routes, line_travel_time)
+        CO = operators_cost_obj.get_operators_cost(routes, cycle_time, f, most_loaded_section)
+        CI = InfrastructureCost.get_infrastruture_cost(graph_obj, network_obj, f)
+        CU = UsersCost().get_users_cost(hyperpaths, Vij, OD_assignment, successors, extended_graph_obj, f,
+                                        passenger_obj, z, v)
+
+        self.assertAlmostEqual(evaluation.CO, CO)
+        self.assertAlmostEqual(evaluation.CI, CI)
+        self.assertAlmostEqual(evaluation.CU, CU)
+        self.assertAlmostEqual(evaluation.VRC, CO + CI + CU)
+
+        for route in routes:
+            self.assertAlmostEqual(evaluation.k[route.id], most_loaded_section[route.id])
+
+        ineq_k = Constrains.most_loaded_section_constrains(routes, most_loaded_section)
+        ineq_f = Constrains.fmax_constrains(graph_obj, routes, network_obj.get_modes(), f)
+        self.assertEqual(len(evaluation.constrains), len(ineq_k) + len(ineq_f))
+        for constrain, expected in zip(evaluation.constrains, ineq_k + ineq_f.tolist()):
+            self.assertAlmostEqual(constrain, expected)
+
+    def test_evaluate_batch(self):
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+        demand_obj = Demand.build_from_parameters(graph_obj=graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        passenger_obj = Passenger.get_default_passenger()
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        network_obj = TransportNetwork(graph_obj=graph_obj)
+
+        for route in network_obj.get_radial_routes(mode_obj=bus_obj) + network_obj.get_diametral_routes(
+                mode_obj=bus_obj, jump=1) + network_obj.get_diametral_routes(mode_obj=metro_obj, jump=1):
+            network_obj.add_route(route_obj=route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj=graph_obj, routes=network_obj.get_routes(), TP=passenger_obj.pt,
+                                           frequency_routes=None)
+        hyperpath_obj = Hyperpath(extended_graph_obj=extended_graph_obj, passenger_obj=passenger_obj)
+
+        hyperpaths, labels, successors, frequency, Vij = hyperpath_obj.get_all_hyperpaths(
+            OD_matrix=demand_obj.get_matrix())
+
+        OD_assignment = Assignment.get_assignment(hyperpaths=hyperpaths, labels=labels, p=2,
+                                                  vp=passenger_obj.va, spa=passenger_obj.spa,
+                                                  spv=passenger_obj.spv)
+
+        assignment_operator = AssignmentOperator(Vij, hyperpaths, successors, OD_assignment)
+        evaluator = Evaluator(graph_obj, network_obj, passenger_obj, extended_graph_obj, hyperpaths, Vij,
+                              OD_assignment, successors, assignment_operator)
+
+        routes = network_obj.get_routes()
+        # the last row does not operate the first route
+        f_batch = np.array([[20 + 3 * n + 5 * row for n in range(len(routes))] for row in range(3)], dtype=float)
+        f_batch[2][0] = 0
+
+        VRC, CO, CI, CU = evaluator.evaluate_batch(f_batch)
+        self.assertEqual(len(VRC), 3)
+
+        for row in range(3):
+            f = defaultdict(float)
+            for route, f_route in zip(routes, f_batch[row]):
+                f[route.id] = f_route
+            evaluation = evaluator.evaluate(f)
+            self.assertAlmostEqual(VRC[row], evaluation.VRC)
+            self.assertAlmostEqual(CO[row], evaluation.CO)
+            self.assertAlmostEqual(CI[row], evaluation.CI)
+            self.assertAlmostEqual(CU[row], evaluation.CU)
@@ -1,8 +1,10 @@
+import pickle
 import unittest
 from collections import defaultdict
 
 from sidermit.city import graph
-from sidermit.optimization.preoptimization import ExtendedGraph, ExtendedEdgesType
+from sidermit.optimization.preoptimization import ExtendedGraph, ExtendedEdgesType, ExtendedNodesType, CityNode, \
+    StopNode
 from sidermit.publictransportsystem import *
 
 
@@ -122,6 +124,22 @@ class test_extended_graph(unittest.TestCase):
         self.assertEqual(len(stop_nodes), 21)
         self.assertEqual(len(route_nodes), 60)
 
+        for route_node in route_nodes:
+            stops_sequence_i = [str(stop) for stop in route_node.route.stops_sequence_i]
+            stop = str(route_node.stop_node.city_node.graph_node.id)
+            if stop in stops_sequence_i:
+                # last position of the stop in forward direction
+                self.assertEqual(route_node.position, len(stops_sequence_i) - 1 - stops_sequence_i[::-1].index(stop))
+            else:
+                self.assertEqual(route_node.position, 0)
+
+            prev_route_node = route_node.prev_route_node
+            if prev_route_node is not None:
+                if prev_route_node.position < route_node.position:
+                    self.assertEqual(prev_route_node.get_direction(route_node), "I")
+                else:
+                    self.assertEqual(prev_route_node.get_direction(route_node), "R")
+
     def test_extended_graph_nodes(self):
 
         graph_obj = graph.Graph.build_from_parameters(n=5, l=1000, g=0.5, p=2)
@@ -258,3 +276,188 @@ class test_extended_graph(unittest.TestCase):
         self.assertEqual(n_boarding, 30)
         self.assertEqual(n_alighting, 30)
         self.assertEqual(n_route, 30)
+
+    def test_get_incoming_and_outgoing_edges(self):
+
+        graph_obj = graph.Graph.build_from_parameters(n=5, l=1000, g=0.5, p=2)
+        network = TransportNetwork(graph_obj)
+
+        passenger_obj = Passenger(4, 2, 2, 2, 2, 2, 2, 2, 2)
+
+        mode_manager = TransportModeManager()
+        bus_obj = mode_manager.get_mode("bus")
+        metro_obj = mode_manager.get_mode("metro")
+
+        feeder_routes = network.get_feeder_routes(bus_obj)
+        radial_routes = network.get_radial_routes(metro_obj, express=True)
+        circular_routes = network.get_circular_routes(bus_obj)
+
+        for route in feeder_routes:
+            network.add_route(route)
+
+        for route in radial_routes:
+            network.add_route(route)
+
+        for route in circular_routes:
+            network.add_route(route)
+
+        extended_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt)
+        extended_graph_nodes = extended_graph.get_extended_graph_nodes()
+        extended_graph_edges = extended_graph.get_extended_graph_edges()
+
+        for city_node in extended_graph_nodes:
+            nodes = [city_node]
+            for stop_node in extended_graph_nodes[city_node]:
+                nodes.append(stop_node)
+                for route_node in extended_graph_nodes[city_node][stop_node]:
+                    nodes.append(route_node)
+
+            for node in nodes:
+                incoming_edges = [edge for edge in extended_graph_edges if edge.nodej == node]
+                outgoing_edges = [edge for edge in extended_graph_edges if edge.nodei == node]
+
+                self.assertEqual(extended_graph.get_incoming_edges(node), incoming_edges)
+                self.assertEqual(extended_graph.get_outgoing_edges(node), outgoing_edges)
+
+                for edge_type in ExtendedEdgesType:
+                    self.assertEqual(extended_graph.get_incoming_edges(node, edge_type),
+                                     [edge for edge in incoming_edges if edge.type == edge_type])
+                    self.assertEqual(extended_graph.get_outgoing_edges(node, edge_type),
+                                     [edge for edge in outgoing_edges if edge.type == edge_type])
+
+    def test_get_edge(self):
+
+        graph_obj = graph.Graph.build_from_parameters(n=2, l=1000, g=0.5, p=2)
+        network = TransportNetwork(graph_obj)
+
+        passenger_obj = Passenger(4, 2, 2, 2, 2, 2, 2, 2, 2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        for route in network.get_feeder_routes(bus_obj) + network.get_radial_routes(metro_obj):
+            network.add_route(route)
+
+        extended_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt)
+
+        for edge in extended_graph.get_extended_graph_edges():
+            self.assertIs(extended_graph.get_edge(edge.nodei, edge.nodej), edge)
+
+        # nodes without edge between them
+        for edge in extended_graph.get_extended_graph_edges():
+            if edge.type == ExtendedEdgesType.ROUTE:
+                self.assertIsNone(extended_graph.get_edge(edge.nodej, edge.nodei))
+
+    def test_pickle(self):
+
+        graph_obj = graph.Graph.build_from_parameters(n=2, l=1000, g=0.5, p=2)
+        network = TransportNetwork(graph_obj)
+
+        passenger_obj = Passenger(4, 2, 2, 2, 2, 2, 2, 2, 2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        for route in network.get_feeder_routes(bus_obj) + network.get_radial_routes(metro_obj):
+            network.add_route(route)
+
+        extended_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt)
+        extended_graph_copy = pickle.loads(pickle.dumps(extended_graph))
+
+        self.assertEqual(str(extended_graph), str(extended_graph_copy))
+        self.assertEqual(len(extended_graph.get_extended_graph_edges()),
+                         len(extended_graph_copy.get_extended_graph_edges()))
+
+        for edge in extended_graph_copy.get_extended_graph_edges():
+            self.assertIn(edge, extended_graph_copy.get_outgoing_edges(edge.nodei, edge.type))
+            self.assertIn(edge, extended_graph_copy.get_incoming_edges(edge.nodej, edge.type))
+            self.assertIs(extended_graph_copy.get_edge(edge.nodei, edge.nodej), edge)
+
+    def test_get_compiled_graph(self):
+
+        graph_obj = graph.Graph.build_from_parameters(n=3, l=1000, g=0.5, p=2)
+        network = TransportNetwork(graph_obj)
+
+        passenger_obj = Passenger(4, 2, 2, 2, 2, 2, 2, 2, 2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        for route in network.get_feeder_routes(bus_obj) + network.get_radial_routes(metro_obj) + \
+                network.get_circular_routes(bus_obj):
+            network.add_route(route)
+
+        extended_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt)
+        compiled_graph = extended_graph.get_compiled_graph()
+
+        self.assertIs(compiled_graph, extended_graph.get_compiled_graph())
+
+        extended_graph_nodes = extended_graph.get_extended_graph_nodes()
+        nodes = []
+        for city_node in extended_graph_nodes:
+            nodes.append(city_node)
+            for stop_node in extended_graph_nodes[city_node]:
+                nodes.append(stop_node)
+                for route_node in extended_graph_nodes[city_node][stop_node]:
+                    nodes.append(route_node)
+
+        self.assertEqual(compiled_graph.nodes, nodes)
+        for node_id, node in enumerate(nodes):
+            self.assertEqual(compiled_graph.node_id[node], node_id)
+            if isinstance(node, CityNode):
+                self.assertEqual(compiled_graph.node_type[node_id], ExtendedNodesType.CITY.value)
+                self.assertEqual(compiled_graph.nodes[compiled_graph.node_city[node_id]], node)
+            elif isinstance(node, StopNode):
+                self.assertEqual(compiled_graph.node_type[node_id], ExtendedNodesType.STOP.value)
+                self.assertEqual(compiled_graph.nodes[compiled_graph.node_city[node_id]], node.city_node)
+            else:
+                self.assertEqual(compiled_graph.node_type[node_id], ExtendedNodesType.ROUTE.value)
+                self.assertEqual(compiled_graph.nodes[compiled_graph.node_city[node_id]], node.stop_node.city_node)
+
+            out_edges = compiled_graph.out_edges[compiled_graph.out_offsets[node_id]:
+                                                 compiled_graph.out_offsets[node_id + 1]]
+            in_edges = compiled_graph.in_edges[compiled_graph.in_offsets[node_id]:
+                                               compiled_graph.in_offsets[node_id + 1]]
+            self.assertEqual([compiled_graph.edges[edge_id] for edge_id in out_edges],
+                             extended_graph.get_outgoing_edges(node))
+            self.assertEqual([compiled_graph.edges[edge_id] for edge_id in in_edges],
+                             extended_graph.get_incoming_edges(node))
+
+        self.assertEqual(compiled_graph.edges, extended_graph.get_extended_graph_edges())
+        for edge_id, edge in enumerate(compiled_graph.edges):
+            self.assertEqual(compiled_graph.edge_id[edge], edge_id)
+            self.assertEqual(compiled_graph.nodes[compiled_graph.edge_nodei[edge_id]], edge.nodei)
+            self.assertEqual(compiled_graph.nodes[compiled_graph.edge_nodej[edge_id]], edge.nodej)
+            self.assertEqual(compiled_graph.edge_t[edge_id], edge.t)
+            self.assertEqual(compiled_graph.edge_f[edge_id], edge.f)
+            self.assertEqual(compiled_graph.edge_type[edge_id], edge.type.value)
+
+    def test_update_frequencies(self):
+
+        graph_obj = graph.Graph.build_from_parameters(n=3, l=1000, g=0.5, p=2)
+        network = TransportNetwork(graph_obj)
+
+        passenger_obj = Passenger(4, 2, 2, 2, 2, 2, 2, 2, 2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        for route in network.get_feeder_routes(bus_obj) + network.get_radial_routes(metro_obj) + \
+                network.get_circular_routes(bus_obj):
+            network.add_route(route)
+
+        frequency_routes = defaultdict(float)
+        for i, route in enumerate(network.get_routes()):
+            frequency_routes[route.id] = 10 + i
+
+        extended_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt)
+        compiled_graph = extended_graph.get_compiled_graph()
+        extended_graph.update_frequencies(frequency_routes)
+
+        expected_graph = ExtendedGraph(graph_obj, network.get_routes(), passenger_obj.spt, frequency_routes)
+
+        edges = extended_graph.get_extended_graph_edges()
+        expected_edges = expected_graph.get_extended_graph_edges()
+        self.assertEqual(len(edges), len(expected_edges))
+        for edge, expected_edge in zip(edges, expected_edges):
+            self.assertEqual(edge.type, expected_edge.type)
+            self.assertEqual(edge.f, expected_edge.f)
+
+        self.assertEqual(compiled_graph.edge_f.tolist(), [edge.f for edge in edges])
+        self.assertEqual(str(extended_graph), str(expected_graph))
@@ -1,7 +1,7 @@
 import unittest
 
 from sidermit.city import Graph, Demand
-from sidermit.optimization.preoptimization import ExtendedGraph, Hyperpath
+from sidermit.optimization.preoptimization import ExtendedGraph, Hyperpath, CityNode, StopNode
 from sidermit.publictransportsystem import *
 from sidermit.exceptions import TransportNetworkException
 
@@ -42,6 +42,44 @@ class test_hyper_path(unittest.TestCase):
 
         self.assertTrue(hyper_path_obj.network_validator(OD_matrix))
 
+    def test_network_validator_disconnected_od(self):
+        """
+        to test that network_validator method in class Hyperpath reports all OD pairs without connection
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10000, g=0.5, p=2000)
+
+        demand_obj = Demand.build_from_parameters(graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        OD_matrix = demand_obj.get_matrix()
+
+        [bus_obj, _] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        # only zone 1 is connected with CBD
+        for route in network_obj.get_radial_routes(bus_obj)[:1]:
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        with self.assertRaises(TransportNetworkException) as context:
+            hyper_path_obj.network_validator(OD_matrix)
+
+        disconnected_od = str(context.exception)
+        for origin_id in OD_matrix:
+            for destination_id in OD_matrix[origin_id]:
+                if OD_matrix[origin_id][destination_id] != 0:
+                    od = " {}-{}".format(origin_id, destination_id)
+                    # P_1, SC_1 and CBD are connected
+                    if origin_id in [0, 1, 2] and destination_id in [0, 1, 2]:
+                        self.assertNotIn(od, disconnected_od)
+                    else:
+                        self.assertIn(od, disconnected_od)
+
     def test_build_hyperpath_graph(self):
         """
         to test build_hyperpath_graph method of class Hyperpath
@@ -143,6 +181,18 @@ class test_hyper_path(unittest.TestCase):
         self.assertEqual(len(hyperpaths_od[stop_bus]), 2)
         self.assertEqual(len(hyperpaths_od[stop_metro]), 1)
 
+        # elemental paths are built following successors from StopNode to destination
+        for stop in hyperpaths_od:
+            paths = list(hyperpaths_od[stop])
+            self.assertEqual(len(paths), len(hyperpaths_od[stop]))
+            for path in paths:
+                self.assertEqual(path[:2], [P1, stop])
+                self.assertEqual(path[-1], P2)
+                for nodei, nodej in zip(path[1:-1], path[2:]):
+                    self.assertIn(nodej, [suc.nodej for suc in successors[nodei]])
+            for i in range(len(paths)):
+                self.assertNotIn(paths[i], paths[i + 1:])
+
     def test_get_all_hyperpaths(self):
 
         """
@@ -200,3 +250,240 @@ class test_hyper_path(unittest.TestCase):
         self.assertEqual(len(hyperpaths), 4)
         self.assertEqual(len(hyperpaths[P1]), 3)
         self.assertEqual(len(hyperpaths[SC2]), 2)
+
+    def test_get_all_hyperpaths_destination_rooted(self):
+        """
+        to test get_all_hyperpaths method of class Hyperpath with destination rooted trees
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        demand_obj = Demand.build_from_parameters(graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        OD_matrix = demand_obj.get_matrix()
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(bus_obj, jump=1) + \
+                network_obj.get_diametral_routes(metro_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        hyperpaths, labels, successors, frequencies, vij = hyper_path_obj.get_all_hyperpaths(OD_matrix)
+        hyperpaths_d, labels_d, successors_d, frequencies_d, vij_d = hyper_path_obj.get_all_hyperpaths(
+            OD_matrix, destination_rooted=True)
+
+        self.assertEqual(vij, vij_d)
+        for origin in hyperpaths:
+            for destination in hyperpaths[origin]:
+                self.assertEqual(hyperpaths[origin][destination], hyperpaths_d[origin][destination])
+                for stop in hyperpaths[origin][destination]:
+                    self.assertAlmostEqual(labels[origin][destination][stop], labels_d[origin][destination][stop])
+                    self.assertEqual(successors[origin][destination][stop],
+                                     successors_d[origin][destination][stop])
+
+    def test_get_all_hyperpaths_process_pool(self):
+        """
+        to test get_all_hyperpaths method of class Hyperpath with a process pool
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        demand_obj = Demand.build_from_parameters(graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        OD_matrix = demand_obj.get_matrix()
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(bus_obj, jump=1) + \
+                network_obj.get_diametral_routes(metro_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        hyperpaths, labels, successors, frequencies, vij = hyper_path_obj.get_all_hyperpaths(OD_matrix)
+        hyperpaths_p, labels_p, successors_p, frequencies_p, vij_p = hyper_path_obj.get_all_hyperpaths(
+            OD_matrix, max_workers=2)
+
+        self.assertEqual(vij, vij_p)
+        self.assertEqual(list(hyperpaths), list(hyperpaths_p))
+        for origin in hyperpaths:
+            self.assertEqual(list(hyperpaths[origin]), list(hyperpaths_p[origin]))
+            for destination in hyperpaths[origin]:
+                self.assertEqual(hyperpaths[origin][destination], hyperpaths_p[origin][destination])
+                self.assertEqual(labels[origin][destination], labels_p[origin][destination])
+                self.assertEqual(frequencies[origin][destination], frequencies_p[origin][destination])
+                self.assertEqual(successors[origin][destination], successors_p[origin][destination])
+
+    def test_get_all_hyperpaths_store(self):
+        """
+        to test values of get_all_hyperpaths method of class Hyperpath against get_hyperpath_OD
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        demand_obj = Demand.build_from_parameters(graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        OD_matrix = demand_obj.get_matrix()
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(bus_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        hyperpaths, labels, successors, frequencies, vij = hyper_path_obj.get_all_hyperpaths(OD_matrix)
+
+        route_nodes = [node for node in extended_graph_obj.get_extended_graph_nodes() if
+                       not isinstance(node, CityNode) and not isinstance(node, StopNode)]
+
+        for origin in hyperpaths:
+            for destination in hyperpaths[origin]:
+                hyperpaths_od, label, successor, frequency = hyper_path_obj.get_hyperpath_OD(origin, destination)
+                for stop in hyperpaths[origin][destination]:
+                    self.assertEqual(labels[origin][destination][stop], label[stop])
+                    self.assertEqual(frequencies[origin][destination][stop], frequency[stop])
+                    self.assertEqual(successors[origin][destination][stop], successor[stop])
+                # nodes out of hyperpath get default values
+                for node in route_nodes:
+                    if node not in labels[origin][destination]:
+                        self.assertEqual(labels[origin][destination][node], float('inf'))
+                        self.assertEqual(frequencies[origin][destination][node], 0)
+                        self.assertEqual(successors[origin][destination][node], [])
+                    else:
+                        self.assertEqual(labels[origin][destination][node], label[node])
+                        self.assertEqual(successors[origin][destination][node], successor[node])
+
+    def test_get_encoded_hyperpaths_destination(self):
+        """
+        to test that hyperpaths given by processes of the process pool only have nodes in hyperpaths
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(bus_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        compiled_graph = extended_graph_obj.get_compiled_graph()
+        city_nodes = list(extended_graph_obj.get_extended_graph_nodes())
+        destination = city_nodes[0]
+        origins = [(compiled_graph.node_id[origin], 1) for origin in city_nodes[1:]]
+
+        encoded_hyperpaths = hyper_path_obj.get_encoded_hyperpaths_destination(compiled_graph.node_id[destination],
+                                                                               origins)
+        self.assertEqual(len(encoded_hyperpaths), len(origins))
+
+        for origin_position, vij, stops, encoded_hyperpath in encoded_hyperpaths:
+            origin = compiled_graph.nodes[origin_position]
+            node_ids, labels, frequencies, successor_offsets, successor_edges = encoded_hyperpath
+            self.assertLess(len(node_ids), len(compiled_graph.nodes))
+            self.assertEqual(len(successor_offsets), len(node_ids) + 1)
+
+            hyperpaths_od, label, successors, frequency = hyper_path_obj.get_hyperpath_OD(origin, destination)
+            hyperpaths_od_d, label_d, successors_d, frequency_d = hyper_path_obj.decode_hyperpath_OD(
+                origin, destination, stops, encoded_hyperpath)
+
+            self.assertEqual(list(hyperpaths_od), list(hyperpaths_od_d))
+            for stop in hyperpaths_od:
+                self.assertEqual(hyperpaths_od[stop], hyperpaths_od_d[stop])
+            for node_id in node_ids:
+                node = compiled_graph.nodes[node_id]
+                self.assertEqual(label_d[node], label[node])
+                self.assertEqual(frequency_d[node], frequency[node])
+                self.assertEqual(successors_d[node], successors[node])
+
+    def test_build_hyperpath_graph_early_exit(self):
+        """
+        to test build_hyperpath_graph method of class Hyperpath when it stops after processing StopNodes in origin
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(bus_obj, jump=1) + \
+                network_obj.get_diametral_routes(metro_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        city_nodes = list(extended_graph_obj.get_extended_graph_nodes())
+        for origin in city_nodes:
+            for destination in city_nodes:
+                if origin == destination:
+                    continue
+                hyperpaths_od, label, successors, frequencies = hyper_path_obj.get_hyperpath_OD(origin, destination)
+                hyperpaths_od_e, label_e, successors_e, frequencies_e = hyper_path_obj.get_hyperpath_OD(
+                    origin, destination, early_exit=True)
+
+                self.assertEqual(list(hyperpaths_od), list(hyperpaths_od_e))
+                for stop in hyperpaths_od:
+                    self.assertEqual(hyperpaths_od[stop], hyperpaths_od_e[stop])
+                    for path in hyperpaths_od[stop]:
+                        for node in path:
+                            self.assertEqual(label[node], label_e[node])
+                            self.assertEqual(successors[node], successors_e[node])
+                            self.assertEqual(frequencies[node], frequencies_e[node])
+
+    def test_update_frequencies(self):
+        """
+        to test that a Hyperpath object gives the same hyperpaths than a new one after frequencies of the extended
+        graph are updated
+        :return:
+        """
+
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        passenger_obj = Passenger.get_default_passenger()
+
+        network_obj = TransportNetwork(graph_obj)
+        for route in network_obj.get_radial_routes(bus_obj) + network_obj.get_diametral_routes(metro_obj, jump=1):
+            network_obj.add_route(route)
+
+        extended_graph_obj = ExtendedGraph(graph_obj, network_obj.get_routes(), 16)
+        hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        city_nodes = list(extended_graph_obj.get_extended_graph_nodes())
+        hyper_path_obj.build_hyperpath_graph(city_nodes[1], city_nodes[0])
+
+        frequency_routes = {route.id: 10 * (n + 1) for n, route in enumerate(network_obj.get_routes())}
+        extended_graph_obj.update_frequencies(frequency_routes)
+        hyper_path_obj.update_frequencies()
+        new_hyper_path_obj = Hyperpath(extended_graph_obj, passenger_obj)
+
+        for origin in city_nodes:
+            for destination in city_nodes:
+                if origin == destination:
+                    continue
+                self.assertEqual(hyper_path_obj.build_hyperpath_graph(origin, destination),
+                                 new_hyper_path_obj.build_hyperpath_graph(origin, destination))
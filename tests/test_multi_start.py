@@ -0,0 +1,92 @@
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+from sidermit.city import Graph, Demand
+from sidermit.optimization import MultiStartOptimizer, Optimizer
+from sidermit.optimization.preoptimization import ExtendedEdgesType
+from sidermit.publictransportsystem import TransportMode, TransportNetwork, Passenger
+
+
+class test_multi_start(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+        self.demand_obj = Demand.build_from_parameters(graph_obj=self.graph_obj, y=1000, a=0.5, alpha=1 / 3,
+                                                       beta=1 / 3)
+        self.passenger_obj = Passenger.get_default_passenger()
+        [self.bus_obj, self.metro_obj] = TransportMode.get_default_modes()
+
+        self.network_obj = TransportNetwork(graph_obj=self.graph_obj)
+        for route in self.network_obj.get_feeder_routes(mode_obj=self.metro_obj) + \
+                self.network_obj.get_radial_routes(mode_obj=self.bus_obj):
+            self.network_obj.add_route(route_obj=route)
+
+    def test_latin_hypercube(self):
+        sample = MultiStartOptimizer.latin_hypercube(5, 3, seed=1)
+
+        self.assertEqual(sample.shape, (5, 3))
+        # one sample in each interval of each dimension
+        for dimension in range(3):
+            self.assertEqual(sorted(np.floor(sample[:, dimension] * 5).tolist()), [0, 1, 2, 3, 4])
+
+        np.testing.assert_array_equal(sample, MultiStartOptimizer.latin_hypercube(5, 3, seed=1))
+
+    def test_get_starting_frequencies(self):
+        routes = self.network_obj.get_routes()
+
+        list_f = MultiStartOptimizer.get_starting_frequencies(self.network_obj, 3, method="mode", scale=(0.5, 2),
+                                                              seed=1)
+        self.assertEqual(len(list_f), 3)
+        for f in list_f:
+            # routes of the same mode have the same factor of fini
+            factors = {}
+            for route in routes:
+                factor = f[route.id] / route.mode.fini
+                self.assertTrue(0.5 <= factor <= 2)
+                self.assertAlmostEqual(factors.setdefault(route.mode, factor), factor)
+
+    def test_multi_start_optimization(self):
+        routes = self.network_obj.get_routes()
+        # the last start does not operate any route, so the network is not valid
+        list_f = MultiStartOptimizer.get_starting_frequencies(self.network_obj, 2, seed=1) + [defaultdict(float)]
+
+        opt_obj = MultiStartOptimizer.multi_start_optimization(self.graph_obj, self.demand_obj, self.passenger_obj,
+                                                               self.network_obj, list_f, workers=2,
+                                                               max_number_of_iteration=2)
+
+        self.assertEqual(len(opt_obj.multi_start_results), 3)
+        list_res = []
+        for f, better_res, external_results, error in opt_obj.multi_start_results[:2]:
+            # first result of each trajectory is the starting frequency
+            fopt, _, _, _, _, _ = external_results[0]
+            self.assertEqual(fopt, [f[route.id] for route in routes])
+            if better_res is not None:
+                list_res.append(better_res)
+
+        # failure of a start is saved
+        f, better_res, external_results, error = opt_obj.multi_start_results[2]
+        self.assertIsNone(better_res)
+        self.assertEqual(external_results, [])
+        self.assertTrue(error.startswith("TransportNetworkException"))
+
+        fopt, _, _, _, _, vrc = Optimizer.get_better_result(list_res)
+        self.assertEqual(opt_obj.get_optimization_value()[5], vrc)
+        self.assertEqual(opt_obj.multi_start_results[opt_obj.better_start][1][5], vrc)
+
+        # returned optimizer has frequencies of the better result
+        self.assertEqual([opt_obj.f[route.id] for route in routes], list(opt_obj.get_optimization_value()[0]))
+        for edge in opt_obj.extended_graph_obj.get_extended_graph_edges():
+            if edge.type == ExtendedEdgesType.BOARDING:
+                route = edge.nodej.route
+                self.assertAlmostEqual(edge.f, opt_obj.f[route.id] / route.mode.d)
+
+    def test_run_start_programming_error(self):
+        """
+        to test that only invalid starts are saved as errors, programming errors are raised
+        :return:
+        """
+        f = {route.id: "1" for route in self.network_obj.get_routes()}
+        with self.assertRaises(TypeError):
+            MultiStartOptimizer.run_start(self.graph_obj, self.demand_obj, self.passenger_obj, self.network_obj, f)
@@ -0,0 +1,72 @@
+import unittest
+from collections import defaultdict
+
+from sidermit.city import Graph
+from sidermit.optimization import InfrastructureCost, OperatorsCost, NetworkPrecomputation
+from sidermit.publictransportsystem import TransportMode, TransportNetwork
+
+
+class test_network_precomputation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.graph_obj = Graph.build_from_parameters(2, 10, 1, 2)
+        self.network_obj = TransportNetwork(self.graph_obj)
+        [self.bus_obj, self.metro_obj] = TransportMode.get_default_modes()
+
+        for route in self.network_obj.get_circular_routes(mode_obj=self.metro_obj) + \
+                self.network_obj.get_radial_routes(mode_obj=self.bus_obj) + \
+                self.network_obj.get_diametral_routes(mode_obj=self.bus_obj, jump=1):
+            self.network_obj.add_route(route)
+
+        self.network_precomputation = NetworkPrecomputation(self.graph_obj, self.network_obj)
+
+    def test_line_travel_time(self):
+        routes = self.network_obj.get_routes()
+        line_travel_time = OperatorsCost.lines_travel_time(routes, self.graph_obj.get_edges_distance())
+
+        self.assertEqual(len(self.network_precomputation.travel_time), len(routes))
+        for n, route in enumerate(routes):
+            self.assertEqual(self.network_precomputation.line_travel_time[route.id], line_travel_time[route.id])
+            self.assertEqual(self.network_precomputation.travel_time[n], line_travel_time[route.id])
+            self.assertEqual(self.network_precomputation.c2[n], route.mode.c2)
+            self.assertEqual(self.network_precomputation.bya[n], route.mode.bya)
+
+    def test_get_mode_network_distance(self):
+        routes = self.network_obj.get_routes()
+
+        f = defaultdict(float)
+        for route in routes:
+            f[route.id] = 28
+
+        # all routes, without the circular route and only with a diametral route
+        for without in ([], [routes[0].id], [route.id for route in routes[:-1]]):
+            for route_id in without:
+                f[route_id] = 0
+
+            mode_distance = self.network_precomputation.get_mode_network_distance(f)
+            expected = InfrastructureCost.get_mode_network_distance(self.graph_obj, self.network_obj, f)
+            self.assertEqual(dict(mode_distance), dict(expected))
+
+            self.assertEqual(InfrastructureCost.get_infrastruture_cost(self.graph_obj, self.network_obj, f,
+                                                                       self.network_precomputation),
+                             InfrastructureCost.get_infrastruture_cost(self.graph_obj, self.network_obj, f))
+
+    def test_get_infrastructure_cost(self):
+        routes = self.network_obj.get_routes()
+
+        f = defaultdict(float)
+        for route in routes:
+            f[route.id] = 28
+
+        for n, route in enumerate(routes):
+            f[route.id] = 0
+            f_routes = self.network_precomputation.get_frequencies(f)
+            self.assertEqual(self.network_precomputation.get_infrastructure_cost(f_routes),
+                             InfrastructureCost.get_infrastruture_cost(self.graph_obj, self.network_obj, f))
+
+        # the same routes operate with other frequencies, so infrastructure is not computed again
+        f_routes = self.network_precomputation.get_frequencies(f)
+        f_routes[0] = 28
+        infrastructure = self.network_precomputation.get_infrastructure(f_routes)
+        f_routes[0] = 14
+        self.assertIs(self.network_precomputation.get_infrastructure(f_routes), infrastructure)
@@ -0,0 +1,170 @@
+import unittest
+
+import numpy as np
+
+from sidermit.city import Graph, Demand
+from sidermit.optimization import Optimizer
+from sidermit.publictransportsystem import TransportMode, TransportNetwork, Passenger
+
+
+class test_optimizer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        graph_obj = Graph.build_from_parameters(n=2, l=10, g=0.5, p=2)
+        demand_obj = Demand.build_from_parameters(graph_obj=graph_obj, y=1000, a=0.5, alpha=1 / 3, beta=1 / 3)
+        passenger_obj = Passenger.get_default_passenger()
+        [bus_obj, metro_obj] = TransportMode.get_default_modes()
+
+        network_obj = TransportNetwork(graph_obj=graph_obj)
+        for route in network_obj.get_feeder_routes(mode_obj=metro_obj) + network_obj.get_radial_routes(
+                mode_obj=bus_obj):
+            network_obj.add_route(route_obj=route)
+
+        self.opt_obj = Optimizer(graph_obj, demand_obj, passenger_obj, network_obj, evaluation_cache_size=2)
+        self.parameters = (graph_obj, demand_obj, passenger_obj, network_obj)
+
+    def test_evaluation_cache(self):
+        """
+        to test cache of evaluations of class Optimizer
+        :return:
+        """
+        opt_obj = self.opt_obj
+        # initialization does not evaluate
+        self.assertEqual(opt_obj.get_evaluation_cache_info(), (0, 0, 0))
+
+        fopt = [f + 1 for f in opt_obj.f_opt]
+        vrc = opt_obj.VRC(fopt)
+        constrains = opt_obj.get_constrains(fopt)
+        self.assertEqual(opt_obj.get_evaluation_cache_info(), (1, 1, 1))
+        self.assertEqual(opt_obj.get_evaluation(fopt).VRC, vrc)
+        self.assertEqual(opt_obj.get_evaluation(fopt).constrains, constrains)
+
+        # least recently used evaluation is removed
+        opt_obj.VRC([f + 2 for f in opt_obj.f_opt])
+        self.assertEqual(opt_obj.get_evaluation_cache_info(), (3, 2, 2))
+        opt_obj.VRC(opt_obj.f_opt)
+        self.assertEqual(opt_obj.get_evaluation_cache_info(), (3, 3, 2))
+        opt_obj.VRC(fopt)
+        self.assertEqual(opt_obj.get_evaluation_cache_info(), (3, 4, 2))
+
+    def test_update_frequencies(self):
+        """
+        to test that an Optimizer updated with new frequencies evaluates as a new Optimizer with that frequencies
+        :return:
+        """
+        opt_obj = self.opt_obj
+        opt_obj.VRC(opt_obj.f_opt)
+        self.assertEqual(opt_obj.get_evaluation_cache_info()[2], 1)
+
+        f = opt_obj.fopt_to_f([f + 3 * n for n, f in enumerate(opt_obj.f_opt)])
+        opt_obj.update_frequencies(f)
+        # evaluations with previous hyperpaths are removed
+        self.assertEqual(opt_obj.get_evaluation_cache_info()[2], 0)
+
+        new_opt_obj = Optimizer(*self.parameters, f)
+        fopt = [f + 1 for f in opt_obj.f_opt]
+        self.assertAlmostEqual(opt_obj.VRC(fopt), new_opt_obj.VRC(fopt))
+        self.assertEqual(opt_obj.get_constrains(fopt), new_opt_obj.get_constrains(fopt))
+
+    def test_last_iteration(self):
+        """
+        to test that the final Optimizer reuses frequency-independent values and is built with the given frequencies
+        :return:
+        """
+        fopt = [f + 1 for f in self.opt_obj.f_opt]
+        final_optimizer, _, _, _, _ = self.opt_obj.last_iteration((fopt, True, 1, "", 0, self.opt_obj.VRC(fopt)))
+        self.assertIs(final_optimizer.network_precomputation, self.opt_obj.network_precomputation)
+        self.assertEqual(final_optimizer.f, self.opt_obj.fopt_to_f(fopt))
+
+    def test_max_workers(self):
+        """
+        to test that hyperpaths built in a process pool give the same evaluation
+        :return:
+        """
+        opt_obj = Optimizer(*self.parameters, max_workers=2)
+        fopt = [f + 1 for f in self.opt_obj.f_opt]
+        self.assertAlmostEqual(opt_obj.VRC(fopt), self.opt_obj.VRC(fopt))
+        self.assertEqual(opt_obj.get_constrains(fopt), self.opt_obj.get_constrains(fopt))
+
+    def test_destination_rooted(self):
+        """
+        to test that hyperpaths built once for each destination give the same evaluation
+        :return:
+        """
+        opt_obj = Optimizer(*self.parameters, destination_rooted=True)
+        fopt = [f + 1 for f in self.opt_obj.f_opt]
+        self.assertAlmostEqual(opt_obj.VRC(fopt), self.opt_obj.VRC(fopt))
+        self.assertEqual(opt_obj.get_constrains(fopt), self.opt_obj.get_constrains(fopt))
+
+    def test_internal_optimization_warm_start(self):
+        """
+        to test that internal optimization with warm start begins in the solution of the previous one
+        :return:
+        """
+        opt_obj = self.opt_obj
+        self.assertEqual(opt_obj.get_initial_point(warm_start=True), opt_obj.f_opt)
+
+        res = opt_obj.internal_optimization()
+        self.assertIs(opt_obj.last_internal_res, res)
+        self.assertEqual(opt_obj.get_initial_point(), opt_obj.f_opt)
+
+        # routes that do not operate in the previous solution start from f_opt
+        x = [f + 1 for f in res.x]
+        x[0] = 1 / 48
+        res.x = np.array(x)
+        expected = [opt_obj.f_opt[0]] + x[1:]
+        self.assertEqual(opt_obj.get_initial_point(warm_start=True), expected)
+
+        # first point evaluated in the optimization
+        points = []
+        vrc = opt_obj.VRC
+
+        def VRC(fopt):
+            points.append(list(fopt))
+            return vrc(fopt)
+
+        opt_obj.VRC = VRC
+        opt_obj.internal_optimization(warm_start=True)
+        for value, expected_value in zip(points[0], expected):
+            self.assertAlmostEqual(value, expected_value)
+
+    def test_VRC_gradient(self):
+        """
+        to test gradient of VRC of class Optimizer with finite differences
+        :return:
+        """
+        opt_obj = self.opt_obj
+        fopt = [f * (1 + 0.1 * n) for n, f in enumerate(opt_obj.f_opt)]
+        gradient = opt_obj.VRC_gradient(fopt)
+        self.assertEqual(len(gradient), len(fopt))
+
+        h = 1e-5
+        for i in range(len(fopt)):
+            fopt_plus = list(fopt)
+            fopt_plus[i] += h
+            fopt_minus = list(fopt)
+            fopt_minus[i] -= h
+            finite_difference = (opt_obj.VRC(fopt_plus) - opt_obj.VRC(fopt_minus)) / (2 * h)
+            self.assertAlmostEqual(gradient[i], finite_difference, delta=1e-4 * max(1, abs(finite_difference)))
+
+    def test_most_loaded_section_jacobian(self):
+        """
+        to test jacobian of most loaded section constrains of class Optimizer with finite differences
+        :return:
+        """
+        opt_obj = self.opt_obj
+        fopt = [f * (1 + 0.1 * n) for n, f in enumerate(opt_obj.f_opt)]
+        jacobian = opt_obj.get_most_loaded_section_jacobian(fopt).toarray()
+        self.assertEqual(jacobian.shape, (len(fopt), len(fopt)))
+
+        h = 1e-5
+        for i in range(len(fopt)):
+            fopt_plus = list(fopt)
+            fopt_plus[i] += h
+            fopt_minus = list(fopt)
+            fopt_minus[i] -= h
+            finite_difference = (opt_obj.get_most_loaded_section_constrains(fopt_plus) -
+                                 opt_obj.get_most_loaded_section_constrains(fopt_minus)) / (2 * h)
+            for j in range(len(fopt)):
+                self.assertAlmostEqual(jacobian[j][i], finite_difference[j],
+                                       delta=1e-4 * max(1, abs(finite_difference[j])))
@@ -28,6 +28,7 @@ class TransportNetworkTest(unittest.TestCase):
         r = Route("r1", bus_obj, "1,2,0,4,3", "3,4,0,2,1", "1,0,3", "3,0,1")
 
         self.assertTrue(isinstance(r, Route))
+        self.assertEqual(r.stops_position_i, {"1": 0, "0": 1, "3": 2})
 
     def test_raises_routes_exceptions(self):
         """